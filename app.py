@@ -1,9 +1,20 @@
-from flask import Flask, render_template, request, jsonify
-from rag_answer import search_rag
+import json
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from rag_answer import search_rag, search_rag_batch, search_rag_stream, warmup
+from core.collection_stats import collection_stats
 from core.database import db_manager
+from core.embeddings.voyage_embedder import voyage_embedder
+from core.observability import configure_logging, metrics_payload
+from core.search.filters import filters_from_params
+from config.config import RERANK_MODES, WARMUP_ON_START
 
+configure_logging()
 app = Flask(__name__)
 
+if WARMUP_ON_START:
+    # Sin --preload cada worker importa la app después del fork, así que abre sus propias conexiones
+    warmup()
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     before_str = after_str = rag_answer = ""
@@ -11,11 +22,17 @@ def index():
     top_k = 10
     query = ""
     ann_limit = 100
+    filter_values = {}
 
     if request.method == "POST":
         query = request.form.get("query")
         top_k = int(request.form.get("top_k"))
-        rag_answer, before_str, after_str, performance_metrics = search_rag(query, context_k=top_k, ann_k=ann_limit)
+        filter_values = request.form
+        try:
+            filters = filters_from_params(request.form)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid filters: {e}"}), 400
+        rag_answer, before_str, after_str, performance_metrics = search_rag(query, context_k=top_k, ann_k=ann_limit, filters=filters)
 
     return render_template("index.html",
                            before=before_str,
@@ -24,20 +41,80 @@ def index():
                            query=query,
                            top_k=top_k,
                            ann_limit=ann_limit,
+                           filter_values=filter_values,
                            performance_metrics=performance_metrics)
 
+@app.route("/stream")
+def stream():
+    query = request.args.get("query", "").strip()
+    if not query:
+        return jsonify({"error": "Missing query"}), 400
+    top_k = int(request.args.get("top_k", 10))
+    ann_limit = int(request.args.get("ann_limit", 100))
+    deadline_ms = request.args.get("deadline_ms", type=int)
+    rerank_mode = request.args.get("rerank_mode") or None
+    if rerank_mode is not None and rerank_mode not in RERANK_MODES:
+        return jsonify({"error": f"Invalid rerank_mode; allowed: {', '.join(RERANK_MODES)}"}), 400
+    try:
+        filters = filters_from_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filters: {e}"}), 400
+
+    def events():
+        try:
+            for event, payload in search_rag_stream(query, context_k=top_k, ann_k=ann_limit, filters=filters,
+                                                      deadline_ms=deadline_ms, rerank_mode=rerank_mode):
+                yield f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/api/batch", methods=["POST"])
+def api_batch():
+    # {"queries": [...], "top_k": 10, "ann_limit": 100, "filters": {...}, "deadline_ms": 5000, "rerank_mode": "local"} → una respuesta por pregunta + métricas del batch
+    try:
+        payload = request.get_json(force=True) or {}
+        queries = payload["queries"]
+        if not isinstance(queries, list):
+            raise ValueError("queries must be a list")
+        deadline_ms = payload.get("deadline_ms")
+        result = search_rag_batch(queries, context_k=int(payload.get("top_k", 10)),
+                                  ann_k=int(payload.get("ann_limit", 100)), filters=payload.get("filters"),
+                                  deadline_ms=None if deadline_ms is None else int(deadline_ms),
+                                  rerank_mode=payload.get("rerank_mode"))
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"Invalid request: {e}"}), 400
+    return Response(json.dumps(result, default=str), mimetype="application/json")
+
 @app.route("/stats")
 def stats():
-    return jsonify(db_manager.get_collection_stats())
+    try:
+        stats = collection_stats.get()
+    except Exception as e:
+        return jsonify({"error": f"Collection stats unavailable: {e}"}), 503
+    stats["embedding_cache"] = voyage_embedder.cache_stats()
+    stats["embedding_batcher"] = voyage_embedder.batcher_stats()
+    return jsonify(stats)
+
+@app.route("/metrics")
+def metrics():
+    payload, content_type = metrics_payload()
+    return Response(payload, mimetype=content_type)
 
 @app.route("/health")
 def health():
+    # Solo un ping: nunca recorre la colección (las estadísticas están en /stats)
     try:
-        stats = db_manager.get_collection_stats()
+        db_manager.warmup()
         return jsonify({
             "status": "healthy",
-            "database_connected": True,
-            "collection_stats": stats
+            "database_connected": True
         })
     except Exception as e:
         return jsonify({
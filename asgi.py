@@ -0,0 +1,120 @@
+import asyncio
+import json
+from rag_answer import asearch_rag, asearch_rag_batch, awarmup
+from core.database import db_manager
+from core.observability import configure_logging, metrics_payload
+from core.search.filters import validate_filters
+from config.config import RERANK_MODES, WARMUP_ON_START
+
+# Servidor async para alta concurrencia:
+#   uvicorn asgi:app --port 8000
+# Un solo proceso mantiene cientos de requests en vuelo mientras esperan a Voyage, Atlas y OpenAI.
+
+configure_logging()
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+async def _send_bytes(send, body: bytes, content_type: str, status: int = 200):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def _send_json(send, payload: dict, status: int = 200):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    await _send_bytes(send, body, "application/json", status)
+
+def _rerank_mode(payload: dict):
+    # Ausente: RERANK_MODE
+    value = payload.get("rerank_mode")
+    if value is not None and value not in RERANK_MODES:
+        raise ValueError(f"rerank_mode must be one of: {', '.join(RERANK_MODES)}")
+    return value
+
+def _deadline_ms(payload: dict):
+    # Ausente: REQUEST_DEADLINE_MS; 0 = sin límite
+    value = payload.get("deadline_ms")
+    return None if value is None else int(value)
+
+async def api_search(receive, send):
+    try:
+        payload = json.loads(await _read_body(receive) or b"{}")
+        query = payload["query"]
+        context_k = int(payload.get("top_k", 10))
+        ann_k = int(payload.get("ann_limit", 100))
+        # {"type": "PDF", "source": {"$in": [...]}, "ts": {"$gte": ...}}: pre-filtro de $vectorSearch
+        filters = validate_filters(payload.get("filters"))
+        deadline_ms = _deadline_ms(payload)
+        rerank_mode = _rerank_mode(payload)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        await _send_json(send, {"error": f"Invalid request: {e}"}, status=400)
+        return
+
+    answer, before, after, performance_metrics = await asearch_rag(query, context_k=context_k, ann_k=ann_k, filters=filters,
+                                                                   deadline_ms=deadline_ms, rerank_mode=rerank_mode)
+    await _send_json(send, {
+        "answer": answer,
+        "before": before,
+        "after": after,
+        "performance_metrics": performance_metrics
+    })
+
+async def api_batch(receive, send):
+    try:
+        payload = json.loads(await _read_body(receive) or b"{}")
+        queries = payload["queries"]
+        if not isinstance(queries, list):
+            raise ValueError("queries must be a list")
+        context_k = int(payload.get("top_k", 10))
+        ann_k = int(payload.get("ann_limit", 100))
+        filters = validate_filters(payload.get("filters"))
+        result = await asearch_rag_batch(queries, context_k=context_k, ann_k=ann_k, filters=filters,
+                                         deadline_ms=_deadline_ms(payload), rerank_mode=_rerank_mode(payload))
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        await _send_json(send, {"error": f"Invalid request: {e}"}, status=400)
+        return
+    await _send_json(send, result)
+
+async def health(send):
+    # Solo un ping, como /health de app.py; en un hilo para no bloquear el event loop
+    try:
+        await asyncio.to_thread(db_manager.warmup)
+    except Exception as e:
+        await _send_json(send, {"status": "unhealthy", "database_connected": False, "error": str(e)}, status=500)
+        return
+    await _send_json(send, {"status": "healthy", "database_connected": True})
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if WARMUP_ON_START:
+                    await awarmup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    if scope["path"] == "/api/search" and scope["method"] == "POST":
+        await api_search(receive, send)
+    elif scope["path"] == "/api/batch" and scope["method"] == "POST":
+        await api_batch(receive, send)
+    elif scope["path"] == "/metrics":
+        await _send_bytes(send, *metrics_payload())
+    elif scope["path"] == "/health":
+        await health(send)
+    else:
+        await _send_json(send, {"error": "Not found"}, status=404)
@@ -0,0 +1,155 @@
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from bench.dataset import load_jsonl, synthetic_corpus
+from ingest.chunker import StreamingChunker, approx_tokens
+
+# Micro-benchmark del chunking: python -m bench.chunking --pdf-dir ../pdfs --rounds 3
+# Compara RecursiveCharacterTextSplitter (lo que usaban los ingesters) con ingest.chunker.StreamingChunker,
+# midiendo en caracteres (deben salir chunks idénticos) y en tokens aproximados.
+
+
+def load_texts(args) -> List[List[str]]:
+    """Una lista de partes (páginas o rangos de páginas) por documento."""
+    if args.pdf_dir:
+        from ingest.pdf_extract import extract_range, page_count, page_ranges, resolve_backend
+
+        backend = resolve_backend("pymupdf")
+        docs = []
+        for path in sorted(Path(args.pdf_dir).glob("*.pdf")):
+            ranges = page_ranges(page_count(str(path), backend), args.pages_per_part)
+            docs.append([extract_range(str(path), start, end, backend)["text"] for start, end in ranges])
+        return docs
+    texts = [doc["text"] for doc in load_jsonl(args.corpus)] if args.corpus else \
+        [doc["text"] for doc in synthetic_corpus(args.docs, words_per_doc=args.words_per_doc, seed=args.seed)]
+    # Sin páginas reales: partes de ~3000 caracteres cortadas en un salto de párrafo
+    docs = []
+    for text in texts:
+        parts, current = [], ""
+        for paragraph in text.split("\n\n"):
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+            if len(current) >= 3000:
+                parts.append(current)
+                current = ""
+        docs.append(parts + ([current] if current else []))
+    return docs
+
+
+def throughput(split: Callable[[str], List[str]], texts: List[str], rounds: int) -> Dict:
+    chars = sum(map(len, texts))
+    best, chunks = float("inf"), []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        chunks = [split(text) for text in texts]
+        best = min(best, time.perf_counter() - start)
+    flat = [chunk for doc in chunks for chunk in doc]
+    tokens = np.asarray([approx_tokens(chunk) for chunk in flat] or [0])
+    return {
+        "seconds": best,
+        "mb_per_s": chars / best / 1e6 if best else 0.0,
+        "chunks": len(flat),
+        "chunks_per_s": len(flat) / best if best else 0.0,
+        "tokens_mean": float(tokens.mean()),
+        "tokens_p95": float(np.percentile(tokens, 95)),
+        "tokens_max": int(tokens.max()),
+        "chars_mean": float(np.mean([len(chunk) for chunk in flat])) if flat else 0.0,
+        "output": chunks
+    }
+
+
+def peak_memory(run: Callable[[], Iterable[str]]) -> Dict:
+    tracemalloc.start()
+    try:
+        count = sum(1 for _ in run())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"chunks": count, "peak_kb": peak / 1024}
+
+
+def main(argv=None):
+    from config.config import CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    parser = argparse.ArgumentParser(description="Chunking throughput and output: LangChain splitter vs ingest.chunker")
+    parser.add_argument("--pdf-dir", help="chunk the PDFs in this directory (one part per --pages-per-part pages)")
+    parser.add_argument("--pages-per-part", type=int, default=1)
+    parser.add_argument("--corpus", help="JSONL with {text}; default: synthetic corpus")
+    parser.add_argument("--docs", type=int, default=200, help="synthetic corpus size")
+    parser.add_argument("--words-per-doc", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=3, help="best of N timed passes")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="characters")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP, help="characters")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS)
+    parser.add_argument("--chunk-overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS)
+    parser.add_argument("--out", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    # Con length_function por token LangChain avisa de cada chunk que no puede partir más
+    logging.getLogger("langchain_text_splitters").setLevel(logging.ERROR)
+    docs = load_texts(args)
+    texts = ["\n\n".join(parts) for parts in docs]
+    print(f"[INFO] Chunking bench: {len(texts):,} documents, {sum(map(len, texts)) / 1e6:.1f} MB", file=sys.stderr)
+
+    splitters = {
+        "langchain_chars": RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap),
+        "chunker_chars": StreamingChunker(args.chunk_size, args.chunk_overlap, length_function=len),
+        "langchain_tokens": RecursiveCharacterTextSplitter(chunk_size=args.chunk_tokens, chunk_overlap=args.chunk_overlap_tokens,
+                                                           length_function=approx_tokens),
+        "chunker_tokens": StreamingChunker(args.chunk_tokens, args.chunk_overlap_tokens)
+    }
+    results = {name: throughput(splitter.split_text, texts, args.rounds) for name, splitter in splitters.items()}
+
+    # Salida: el chunker debe reproducir al splitter de LangChain con la misma medida
+    for kind in ("chars", "tokens"):
+        reference, candidate = results[f"langchain_{kind}"]["output"], results[f"chunker_{kind}"]["output"]
+        results[f"chunker_{kind}"]["identical_docs"] = sum(a == b for a, b in zip(reference, candidate)) / len(texts)
+    limit = args.chunk_tokens
+    for result in results.values():
+        result["over_token_limit"] = sum(approx_tokens(chunk) > limit for doc in result.pop("output") for chunk in doc)
+
+    # Memoria: lista completa del documento más grande frente al generador sobre sus partes
+    largest = max(range(len(docs)), key=lambda i: len(texts[i]))
+    tokens = splitters["chunker_tokens"]
+    memory = {
+        "document_mb": len(texts[largest]) / 1e6,
+        "langchain_tokens_split_text": peak_memory(lambda: splitters["langchain_tokens"].split_text(texts[largest])),
+        "chunker_tokens_split_text": peak_memory(lambda: tokens.split_text(texts[largest])),
+        "chunker_tokens_stream": peak_memory(lambda: tokens.stream(docs[largest]))
+    }
+
+    for name, result in results.items():
+        print(
+            f"[BENCH] {name}: {result['mb_per_s']:.1f} MB/s, {result['chunks']:,} chunks, "
+            f"tokens mean={result['tokens_mean']:.0f} max={result['tokens_max']} over {limit}={result['over_token_limit']}"
+            + (f", identical={result['identical_docs']:.0%}" if "identical_docs" in result else ""),
+            file=sys.stderr
+        )
+    report = {
+        "args": {k: v for k, v in vars(args).items() if k != "out"},
+        "documents": len(texts),
+        "results": results,
+        "memory": memory
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(output)
+        print(f"[INFO] Results written to {args.out}", file=sys.stderr)
+    else:
+        print(output)
+    return report
+
+# ─── EXECUTE ───
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import json
+import random
+from typing import Dict, List, Optional
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Corpus y preguntas etiquetadas:
+#   corpus  JSONL: {"_id": ..., "text": ..., "source": ...}   (documentos completos, se trocean con CHUNK_SIZE)
+#   queries JSONL: {"query": ..., "relevant": [source, ...]}  ("relevant" es opcional)
+
+COMMON_WORDS = (
+    "the of and to in for with on by from as is are be this that it at or an which "
+    "their can will also more other into about these than has its may only over such"
+).split()
+
+
+def load_jsonl(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_corpus(n_docs: int = 500, n_topics: int = 40, words_per_doc: int = 600, seed: int = 0) -> List[dict]:
+    """Documentos con vocabulario propio por tema más palabras comunes, para que la similitud tenga estructura."""
+    rng = random.Random(seed)
+    topics = [[f"t{t}w{w}" for w in range(60)] for t in range(n_topics)]
+    docs = []
+    for i in range(n_docs):
+        topic = topics[i % n_topics]
+        own = [f"d{i}k{k}" for k in range(8)]  # términos exclusivos del documento
+        words = []
+        for _ in range(words_per_doc):
+            roll = rng.random()
+            pool = own if roll < 0.1 else topic if roll < 0.55 else COMMON_WORDS
+            words.append(rng.choice(pool))
+        sentences = [" ".join(words[j:j + 15]) + "." for j in range(0, len(words), 15)]
+        text = "\n\n".join(" ".join(sentences[j:j + 4]) for j in range(0, len(sentences), 4))
+        docs.append({"_id": f"doc-{i}", "text": text, "source": f"https://bench.local/doc/{i}"})
+    return docs
+
+
+def synthetic_queries(docs: List[dict], n_queries: int = 100, words: int = 6, seed: int = 1) -> List[dict]:
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n_queries):
+        doc = rng.choice(docs)
+        tokens = [t.strip(".") for t in doc["text"].split() if t.strip(".") not in COMMON_WORDS]
+        start = rng.randrange(max(1, len(tokens) - words))
+        queries.append({"query": " ".join(tokens[start:start + words]), "relevant": [doc["source"]]})
+    return queries
+
+
+def chunk_corpus(docs: List[dict], chunk_size: int, chunk_overlap: int) -> List[dict]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = []
+    for doc in docs:
+        for idx, text in enumerate(splitter.split_text(doc["text"])):
+            chunks.append({
+                "_id": f"{doc['_id']}:{idx}",
+                "text": text,
+                "source": doc.get("source", "https://unknown-source"),
+                "chunk_idx": idx,
+                "type": doc.get("type", "PDF"),
+                **{field: doc[field] for field in ("username", "ts") if field in doc}
+            })
+    return chunks
+
+
+def load_dataset(corpus_path: Optional[str], queries_path: Optional[str],
+                 n_docs: int, n_queries: int, seed: int) -> Dict[str, List[dict]]:
+    docs = load_jsonl(corpus_path) if corpus_path else synthetic_corpus(n_docs, seed=seed)
+    queries = load_jsonl(queries_path) if queries_path else synthetic_queries(docs, n_queries, seed=seed + 1)
+    return {"docs": docs, "queries": queries}
@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from core.embeddings.vector_codec import decode_vector
+from core.search.filters import column_mask, filter_columns, matches
+from core.search.text_index import BM25Index
+
+# Sustitutos deterministas de Voyage, Atlas $vectorSearch/$search y OpenAI para medir sin llamar a APIs
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def hashed_embedding(text: str, dim: int = 256) -> np.ndarray:
+    """Bag-of-words con feature hashing, normalizado: textos con palabras en común quedan cerca."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for token in tokenize(text):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        vec[value % dim] += 1.0 if (value >> 63) else -1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class Latency:
+    """Latencia simulada: base + por item, con jitter determinista."""
+
+    def __init__(self, base_ms: float = 0.0, per_item_ms: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.base = base_ms / 1000
+        self.per_item = per_item_ms / 1000
+        self.jitter = jitter
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, items: int = 1) -> float:
+        seconds = self.base + self.per_item * items
+        if self.jitter and seconds:
+            with self._lock:
+                seconds *= 1 + self._rng.uniform(-self.jitter, self.jitter)
+        return seconds
+
+    def sleep(self, items: int = 1):
+        seconds = self.delay(items)
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class FakeVoyageClient:
+    """Misma interfaz que voyageai.Client para embed() y rerank()."""
+
+    def __init__(self, dim: int = 256, embed_latency: Optional[Latency] = None,
+                 rerank_latency: Optional[Latency] = None, rerank_noise: float = 0.05, seed: int = 0):
+        self.dim = dim
+        self.embed_latency = embed_latency or Latency()
+        self.rerank_latency = rerank_latency or Latency()
+        self.rerank_noise = rerank_noise
+        self.seed = seed
+        self.embed_calls = 0
+        self.rerank_calls = 0
+
+    def _embeddings(self, texts: List[str]):
+        self.embed_calls += 1
+        return SimpleNamespace(embeddings=[hashed_embedding(t, self.dim).tolist() for t in texts])
+
+    def embed(self, texts: List[str], model: str = "", **kwargs):
+        self.embed_latency.sleep(len(texts))
+        return self._embeddings(texts)
+
+    def _relevance(self, query: str, document: str) -> float:
+        # Solapamiento léxico + ruido fijo por par: un reranker "bueno pero no perfecto"
+        q, d = set(tokenize(query)), set(tokenize(document))
+        overlap = len(q & d) / (len(q) or 1)
+        digest = hashlib.blake2b(f"{self.seed}\x00{query}\x00{document}".encode("utf-8"), digest_size=4).digest()
+        noise = (int.from_bytes(digest, "little") / 0xFFFFFFFF - 0.5) * 2 * self.rerank_noise
+        return min(1.0, max(0.0, overlap + noise))
+
+    def _rerank_results(self, query: str, documents: List[str], top_k: Optional[int]):
+        self.rerank_calls += 1
+        scored = sorted(
+            ((i, self._relevance(query, doc)) for i, doc in enumerate(documents)),
+            key=lambda item: item[1], reverse=True
+        )[:top_k or len(documents)]
+        return SimpleNamespace(results=[SimpleNamespace(index=i, relevance_score=s) for i, s in scored])
+
+    def rerank(self, query: str, documents: List[str], model: str = "", top_k: Optional[int] = None, **kwargs):
+        self.rerank_latency.sleep(len(documents))
+        return self._rerank_results(query, documents, top_k)
+
+
+class FakeAsyncVoyageClient:
+    def __init__(self, client: FakeVoyageClient):
+        self.client = client
+
+    async def embed(self, texts: List[str], model: str = "", **kwargs):
+        await asyncio.sleep(self.client.embed_latency.delay(len(texts)))
+        return self.client._embeddings(texts)
+
+    async def rerank(self, query: str, documents: List[str], model: str = "", top_k: Optional[int] = None, **kwargs):
+        await asyncio.sleep(self.client.rerank_latency.delay(len(documents)))
+        return self.client._rerank_results(query, documents, top_k)
+
+
+class FakeVectorCollection:
+    """Colección en memoria que emula $vectorSearch.
+
+    Igual que un índice ANN, numCandidates limita cuántos vecinos se evalúan con exactitud:
+    los candidatos salen de una proyección aleatoria de baja dimensión y solo esos se puntúan
+    con el coseno completo. Con numCandidates >= tamaño de la colección la búsqueda es exacta.
+    """
+
+    def __init__(self, docs: Iterable[dict], dim: int = 256, coarse_dim: int = 32,
+                 latency: Optional[Latency] = None, seed: int = 0):
+        self.docs = list(docs)
+        self.dim = dim
+        self.latency = latency or Latency()
+        self.sources = {doc["_id"]: doc.get("source") for doc in self.docs}
+        self.matrix = np.vstack([hashed_embedding(doc["text"], dim) for doc in self.docs]).astype(np.float32)
+        for doc, vector in zip(self.docs, self.matrix):
+            # El embedding guardado, para el rerank local ($project o find por _id)
+            doc.setdefault("embedding", vector)
+        rng = np.random.default_rng(seed)
+        self.projection = rng.standard_normal((dim, coarse_dim)).astype(np.float32)
+        self.coarse = self.matrix @ self.projection
+        self.columns = filter_columns(self.docs)
+        self._text_index: Optional[BM25Index] = None
+
+    # ─── Búsqueda ───
+    def exact_search(self, query_vector, limit: int) -> List[str]:
+        scores = self.matrix @ np.asarray(query_vector, dtype=np.float32)
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return [self.docs[i]["_id"] for i in order]
+
+    def _vector_search(self, stage: dict) -> List[dict]:
+        query = np.asarray(decode_vector(stage["queryVector"]), dtype=np.float32)
+        limit = stage["limit"]
+        num_candidates = max(stage.get("numCandidates", limit), limit)
+        # El filtro se aplica antes de elegir candidatos, como el pre-filtro de Atlas
+        mask = column_mask(self.columns, stage.get("filter"), len(self.docs))
+        eligible = np.arange(len(self.docs)) if mask is None else np.flatnonzero(mask)
+        if num_candidates >= len(eligible):
+            candidates = eligible
+        else:
+            coarse_scores = self.coarse[eligible] @ (query @ self.projection)
+            candidates = eligible[np.argpartition(-coarse_scores, num_candidates - 1)[:num_candidates]]
+        scores = self.matrix[candidates] @ query
+        order = np.argsort(-scores, kind="stable")[:limit]
+        self.latency.sleep(len(candidates))
+        return [
+            {**self.docs[candidates[i]], "score": float((1 + scores[i]) / 2)}
+            for i in order
+        ]
+
+    def _text_search(self, stage: dict, limit: int) -> List[dict]:
+        # $search con BM25 local; el texto se indexa en la primera consulta full-text
+        if self._text_index is None:
+            self._text_index = BM25Index(self.docs)
+        self.latency.sleep(0)
+        by_id = {doc["_id"]: doc for doc in self.docs}
+        compound = stage.get("compound")
+        text = compound["must"][0]["text"] if compound else stage["text"]
+        clauses = compound.get("filter", []) if compound else []
+        results = self._text_index.search(text["query"], limit=len(self.docs) if clauses else limit)
+        return [
+            {**by_id[r["_id"]], "score": r["score"]}
+            for r in results if all(_clause_matches(by_id[r["_id"]], c) for c in clauses)
+        ][:limit]
+
+    def aggregate(self, pipeline: List[dict]) -> List[dict]:
+        results: List[dict] = []
+        for stage in pipeline:
+            if "$vectorSearch" in stage:
+                results = self._vector_search(stage["$vectorSearch"])
+            elif "$search" in stage:
+                limit = next((s["$limit"] for s in pipeline if "$limit" in s), len(self.docs))
+                results = self._text_search(stage["$search"], limit)
+            elif "$match" in stage:
+                results = [doc for doc in results if matches(doc, stage["$match"])]
+            elif "$project" in stage:
+                fields = stage["$project"]
+                results = [{key: doc.get(key) for key in fields if key in doc} for doc in results]
+            elif "$limit" in stage:
+                results = results[:stage["$limit"]]
+        return results
+
+    # ─── Lo que usan el semantic cache y /stats ───
+    def estimated_document_count(self) -> int:
+        return len(self.docs)
+
+    def count_documents(self, query: dict) -> int:
+        return sum(1 for doc in self.docs if matches(doc, query))
+
+    def find_one(self, query: dict, projection: Optional[dict] = None) -> Optional[dict]:
+        return next((doc for doc in self.docs if matches(doc, query)), None)
+
+    def find(self, query: dict, projection: Optional[dict] = None) -> List[dict]:
+        fields = [key for key, keep in (projection or {}).items() if keep]
+        found = [doc for doc in self.docs if matches(doc, query)]
+        if not fields:
+            return found
+        return [{"_id": doc["_id"], **{key: doc[key] for key in fields if key in doc}} for doc in found]
+
+
+def _clause_matches(doc: dict, clause: Dict) -> bool:
+    # Las cláusulas compound.filter que genera to_search_filter
+    if "equals" in clause:
+        return doc.get(clause["equals"]["path"]) == clause["equals"]["value"]
+    if "in" in clause:
+        return doc.get(clause["in"]["path"]) in clause["in"]["value"]
+    if "range" in clause:
+        bounds = dict(clause["range"])
+        path = bounds.pop("path")
+        return matches(doc, {path: {f"${op}": value for op, value in bounds.items()}})
+    if "compound" in clause:
+        return not any(_clause_matches(doc, c) for c in clause["compound"].get("mustNot", []))
+    return True
+
+
+class FakeQAChain:
+    """Sustituye al chain de LangChain: devuelve una respuesta armada con las fuentes del contexto."""
+
+    def __init__(self, latency: Optional[Latency] = None, tokens: int = 120, token_latency: Optional[Latency] = None):
+        self.latency = latency or Latency()
+        self.tokens = tokens
+        self.token_latency = token_latency or Latency()
+
+    def _answer_tokens(self, inputs: dict) -> List[str]:
+        sources = [doc.metadata.get("source", "") for doc in inputs["context"]]
+        words = [f"w{i}" for i in range(self.tokens)]
+        return [f"{word} " for word in words] + [f"(Source: {s}) " for s in sources[:3]]
+
+    def invoke(self, inputs: dict) -> str:
+        self.latency.sleep()
+        tokens = self._answer_tokens(inputs)
+        time.sleep(self.token_latency.delay(len(tokens)))
+        return "".join(tokens)
+
+    def stream(self, inputs: dict):
+        self.latency.sleep()
+        for token in self._answer_tokens(inputs):
+            self.token_latency.sleep()
+            yield token
+
+    async def ainvoke(self, inputs: dict) -> str:
+        await asyncio.sleep(self.latency.delay())
+        tokens = self._answer_tokens(inputs)
+        await asyncio.sleep(self.token_latency.delay(len(tokens)))
+        return "".join(tokens)
@@ -0,0 +1,134 @@
+import contextvars
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+from core.aio import LoopLocal
+from bench.fakes import FakeAsyncVoyageClient, FakeQAChain, FakeVectorCollection, FakeVoyageClient
+
+# Conecta los módulos reales del pipeline (retriever, rerank, generator, rag_answer) a los sustitutos.
+# core.database no abre conexiones al importarse (cliente perezoso): basta con asignar la colección falsa
+# a db_manager antes del primer uso.
+
+
+class StageRecorder:
+    """Tiempos por etapa de la pregunta en curso, más los _id vistos en cada etapa.
+
+    El registro va en un ContextVar (no threading.local): lo que el deadline corre en otro hilo con
+    copy_context() (la espera del primer token del streaming) sigue anotando en la pregunta que lo lanzó."""
+
+    def __init__(self):
+        self._record: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("bench_record", default=None)
+
+    def begin(self) -> dict:
+        record = {"timings": defaultdict(float), "ann_ids": [], "final_ids": []}
+        self._record.set(record)
+        return record
+
+    @property
+    def record(self) -> Optional[dict]:
+        return self._record.get()
+
+    def wrap(self, name: str, fn, capture=None):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                record = self.record
+                if record is not None:
+                    record["timings"][name] += time.perf_counter() - start
+            if capture is not None and self.record is not None:
+                capture(self.record, result)
+            return result
+        return timed
+
+
+class BenchHarness:
+    def __init__(self, collection: FakeVectorCollection, voyage: FakeVoyageClient, chain: FakeQAChain,
+                 keep_caches: bool = False):
+        self.voyage = voyage
+        self.chain = chain
+        self.recorder = StageRecorder()
+        self._install(collection, keep_caches)
+
+    def _install(self, collection: FakeVectorCollection, keep_caches: bool):
+        from core.database import db_manager
+        db_manager.collection = collection
+        self.db_manager = db_manager
+
+        import rag_answer
+        from core.embeddings.voyage_embedder import voyage_embedder
+        from core.search.vector_search import vector_search
+        from core.rag.retriever import rag_retriever
+        from core.rag.generator import rag_generator
+
+        self.rag_answer = rag_answer
+        self.embedder = voyage_embedder
+        self.search_engine = vector_search
+        self.retriever = rag_retriever
+        self.generator = rag_generator
+
+        voyage_embedder.client = self.voyage
+        voyage_embedder._timed_client = lambda timeout=None: self.voyage
+        voyage_embedder.async_client = LoopLocal(lambda: FakeAsyncVoyageClient(self.voyage))
+        if voyage_embedder.batcher is not None:
+            voyage_embedder.batcher.client = self.voyage
+        vector_search.backend = "atlas"
+        rag_generator.qa_chain = self.chain
+        # Con deadline el embedder y el generador arman clientes con timeout por llamada: también los falsos
+        rag_generator._chain = lambda timeout=None: self.chain
+
+        if not keep_caches:
+            # Sin caches cada pregunta recorre el pipeline completo
+            voyage_embedder.cache = None
+            rag_retriever.rerank_cache = None
+            rag_answer.semantic_cache = None
+
+        rec = self.recorder
+        voyage_embedder.embed_text = rec.wrap("embed", voyage_embedder.embed_text)
+        vector_search.search = rec.wrap(
+            "vector_search", vector_search.search,
+            lambda record, results: record.__setitem__("ann_ids", [r["_id"] for r in results])
+        )
+        rag_retriever._rerank_documents = rec.wrap(
+            "rerank", rag_retriever._rerank_documents,
+            lambda record, docs: record.__setitem__("final_ids", [d.metadata["id"] for d in docs])
+        )
+        rag_generator.generate_answer = rec.wrap("generate", rag_generator.generate_answer)
+
+    def use_collection(self, collection: FakeVectorCollection):
+        self.db_manager.collection = collection
+        self.search_engine.collection = collection
+        semantic_cache = self.rag_answer.semantic_cache
+        if semantic_cache is not None:
+            semantic_cache.collection = collection
+            semantic_cache.version_fn = collection.estimated_document_count
+            semantic_cache.invalidate()
+
+    def set_num_candidates_factor(self, factor: int):
+        self.search_engine.num_candidates_factor = factor
+
+    def set_search_mode(self, mode: str):
+        self.search_engine.mode = mode
+
+    def set_rerank_mode(self, mode: str):
+        self.retriever.rerank_mode = mode
+
+    def run_query(self, query: str, context_k: int, ann_k: int) -> Dict:
+        record = self.recorder.begin()
+        start = time.perf_counter()
+        answer, _, _, metrics = self.rag_answer.search_rag(query, context_k, ann_k)
+        total = time.perf_counter() - start
+        timings: Dict[str, float] = dict(record["timings"])
+        timings["total"] = total
+        return {
+            "timings": timings,
+            "ann_ids": list(record["ann_ids"]),
+            "final_ids": list(record["final_ids"]),
+            "answer_length": len(answer),
+            "metrics": metrics
+        }
+
+
+def recall(found: List, expected: List) -> float:
+    return len(set(found) & set(expected)) / len(expected) if expected else 1.0
@@ -0,0 +1,216 @@
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from bench.dataset import chunk_corpus, load_dataset
+from bench.fakes import FakeQAChain, FakeVectorCollection, FakeVoyageClient, Latency, hashed_embedding
+from bench.harness import BenchHarness, recall
+
+# Benchmark offline de recuperación: python -m bench.run --ann-k 50,100 --context-k 5,10 --out bench.json
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    arr = np.asarray(values) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99))
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def quality_pass(harness: BenchHarness, collection: FakeVectorCollection, queries: List[dict],
+                 context_k: int, ann_k: int, dim: int) -> Dict:
+    """Una pasada secuencial: latencia por etapa y recall contra la búsqueda exacta."""
+    stages: Dict[str, List[float]] = {}
+    ann_recall, final_recall, label_recall = [], [], []
+    prompt_tokens, prompt_saved = [], []
+    for item in queries:
+        run = harness.run_query(item["query"], context_k, ann_k)
+        for stage, seconds in run["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+        if "context_tokens" in run["metrics"]:
+            prompt_tokens.append(run["metrics"]["context_tokens"])
+            prompt_saved.append(run["metrics"]["context_tokens_saved"])
+
+        q_vec = hashed_embedding(item["query"], dim)
+        ann_recall.append(recall(run["ann_ids"], collection.exact_search(q_vec, ann_k)))
+        final_recall.append(recall(run["final_ids"], collection.exact_search(q_vec, context_k)))
+        if item.get("relevant"):
+            sources = {collection.sources.get(_id) for _id in run["final_ids"]}
+            label_recall.append(len(sources & set(item["relevant"])) / len(item["relevant"]))
+
+    quality = {
+        f"ann_recall@{ann_k}": float(np.mean(ann_recall)),
+        f"recall@{context_k}": float(np.mean(final_recall)),
+    }
+    if label_recall:
+        quality[f"label_recall@{context_k}"] = float(np.mean(label_recall))
+    result = {"stages": {stage: summarize(values) for stage, values in stages.items()}, "quality": quality}
+    if prompt_tokens:
+        result["prompt"] = {"context_tokens_mean": float(np.mean(prompt_tokens)), "tokens_saved_mean": float(np.mean(prompt_saved))}
+    return result
+
+
+def throughput_pass(harness: BenchHarness, queries: List[dict], context_k: int, ann_k: int,
+                    concurrency: int, rounds: int) -> Dict:
+    work = [item["query"] for item in queries] * rounds
+    latencies: List[float] = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for run in pool.map(lambda q: harness.run_query(q, context_k, ann_k), work):
+            latencies.append(run["timings"]["total"])
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "queries": len(work),
+        "elapsed_s": elapsed,
+        "qps": len(work) / elapsed if elapsed else 0.0,
+        "latency": summarize(latencies)
+    }
+
+
+def main(argv=None):
+    from config.config import CHUNK_SIZE, CHUNK_OVERLAP, NUM_CANDIDATES_FACTOR, RERANK_MODE, SEARCH_MODE
+
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark with local stand-ins for Voyage, Atlas and OpenAI")
+    parser.add_argument("--corpus", help="JSONL with {_id, text, source}; default: synthetic corpus")
+    parser.add_argument("--queries", help="JSONL with {query, relevant?}; default: sampled from the corpus")
+    parser.add_argument("--docs", type=int, default=500, help="synthetic corpus size")
+    parser.add_argument("--n-queries", type=int, default=100, help="synthetic query count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ann-k", type=_int_list, default=[100])
+    parser.add_argument("--context-k", type=_int_list, default=[10])
+    parser.add_argument("--num-candidates-factor", type=_int_list, default=[NUM_CANDIDATES_FACTOR])
+    parser.add_argument("--search-mode", type=lambda v: [m.strip() for m in v.split(",") if m.strip()],
+                        default=[SEARCH_MODE], help="vector, hybrid or both: vector,hybrid")
+    parser.add_argument("--rerank-mode", type=lambda v: [m.strip() for m in v.split(",") if m.strip()],
+                        default=[RERANK_MODE], help="voyage, local or both: voyage,local")
+    parser.add_argument("--chunk-size", type=_int_list, default=[CHUNK_SIZE])
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8])
+    parser.add_argument("--rounds", type=int, default=1, help="repetitions of the query set per concurrency level")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--embed-latency-ms", type=float, default=30.0)
+    parser.add_argument("--search-latency-ms", type=float, default=20.0)
+    parser.add_argument("--search-per-candidate-us", type=float, default=2.0)
+    parser.add_argument("--rerank-latency-ms", type=float, default=80.0)
+    parser.add_argument("--rerank-per-doc-ms", type=float, default=0.5)
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--llm-token-ms", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.1, help="relative jitter applied to every simulated latency")
+    parser.add_argument("--keep-caches", action="store_true", help="keep embedding/rerank/semantic caches enabled")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline logs")
+    parser.add_argument("--out", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    voyage = FakeVoyageClient(
+        dim=args.dim,
+        embed_latency=Latency(args.embed_latency_ms, jitter=args.jitter, seed=args.seed),
+        rerank_latency=Latency(args.rerank_latency_ms, args.rerank_per_doc_ms, jitter=args.jitter, seed=args.seed + 1),
+        seed=args.seed
+    )
+    chain = FakeQAChain(
+        latency=Latency(args.llm_latency_ms, jitter=args.jitter, seed=args.seed + 2),
+        token_latency=Latency(0, args.llm_token_ms)
+    )
+    search_latency = Latency(args.search_latency_ms, args.search_per_candidate_us / 1000, jitter=args.jitter, seed=args.seed + 3)
+
+    dataset = load_dataset(args.corpus, args.queries, args.docs, args.n_queries, args.seed)
+    print(f"[INFO] Bench dataset: {len(dataset['docs']):,} documents, {len(dataset['queries']):,} queries", file=sys.stderr)
+
+    collections = {}
+    for chunk_size in args.chunk_size:
+        chunks = chunk_corpus(dataset["docs"], chunk_size, min(args.chunk_overlap, chunk_size // 2))
+        collections[chunk_size] = FakeVectorCollection(chunks, dim=args.dim, latency=search_latency, seed=args.seed)
+        print(f"[INFO] chunk_size={chunk_size}: {len(chunks):,} chunks", file=sys.stderr)
+
+    # El pipeline registra con logging (stderr): sin --verbose solo se ven avisos
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    devnull = open(os.devnull, "w")
+    logs = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+    results = []
+    with devnull, logs:
+        harness = BenchHarness(collections[args.chunk_size[0]], voyage, chain, keep_caches=args.keep_caches)
+        grid = itertools.product(args.chunk_size, args.search_mode, args.rerank_mode, args.num_candidates_factor,
+                                 args.ann_k, args.context_k)
+        for chunk_size, mode, rerank_mode, factor, ann_k, context_k in grid:
+            collection = collections[chunk_size]
+            harness.use_collection(collection)
+            harness.set_num_candidates_factor(factor)
+            harness.set_search_mode(mode)
+            harness.set_rerank_mode(rerank_mode)
+            config = {
+                "chunk_size": chunk_size,
+                "search_mode": mode,
+                "rerank_mode": rerank_mode,
+                "num_candidates_factor": factor,
+                "num_candidates": harness.search_engine.num_candidates(ann_k),
+                "ann_k": ann_k,
+                "context_k": context_k,
+                "chunks": len(collection.docs)
+            }
+            entry = {"config": config, **quality_pass(harness, collection, dataset["queries"], context_k, ann_k, args.dim)}
+            entry["throughput"] = [
+                throughput_pass(harness, dataset["queries"], context_k, ann_k, c, args.rounds) for c in args.concurrency
+            ]
+            results.append(entry)
+            print(
+                f"[BENCH] {config} | total p50={entry['stages']['total']['p50_ms']:.1f}ms "
+                f"p95={entry['stages']['total']['p95_ms']:.1f}ms | {entry['quality']} | "
+                + " ".join(f"c{t['concurrency']}={t['qps']:.1f}qps" for t in entry["throughput"]),
+                file=sys.stderr
+            )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "documents": len(dataset["docs"]),
+            "queries": len(dataset["queries"]),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "verbose")}
+        },
+        "results": results
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        Path(args.out).write_text(output + "\n", encoding="utf-8")
+        print(f"[INFO] Bench results written to {args.out}", file=sys.stderr)
+    else:
+        print(output)
+    return report
+
+# ─── EXECUTE ───
+if __name__ == "__main__":
+    main()
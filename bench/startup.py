@@ -0,0 +1,67 @@
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+
+# Tiempo de arranque en procesos nuevos: python -m bench.startup --modules app,asgi --runs 5
+# Importar no debe tocar la red; con --warmup se mide aparte lo que cuesta abrir clientes y conexiones.
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter() - start
+result = {{"import_s": imported}}
+if {warmup}:
+    import rag_answer
+    start = time.perf_counter()
+    result["warmup"] = rag_answer.warmup()
+    result["warmup_s"] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+
+def measure(module: str, runs: int, warmup: bool, timeout: float) -> Dict:
+    samples: List[dict] = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, warmup=warmup)],
+            cwd=project_root, capture_output=True, text=True, timeout=timeout
+        )
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"}
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    imports = np.asarray([s["import_s"] for s in samples]) * 1000
+    result = {
+        "runs": runs,
+        "import_ms": {"min": float(imports.min()), "mean": float(imports.mean()), "max": float(imports.max())}
+    }
+    if warmup:
+        result["warmup_ms"] = float(np.mean([s["warmup_s"] for s in samples]) * 1000)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import (and optional warmup) time of the app entry points")
+    parser.add_argument("--modules", default="app,asgi,rag_answer")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", action="store_true", help="also time rag_answer.warmup() (opens real connections)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args(argv)
+
+    report = {}
+    for module in [m.strip() for m in args.modules.split(",") if m.strip()]:
+        report[module] = measure(module, args.runs, args.warmup, args.timeout)
+        print(f"[STARTUP] {module}: {report[module]}", file=sys.stderr)
+    print(json.dumps(report, indent=2, sort_keys=True))
+    return report
+
+# ─── EXECUTE ───
+if __name__ == "__main__":
+    main()
@@ -12,18 +12,107 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "YOUR_OPENAI_KEY")
 DB_NAME = "demoDB"
 COLL_NAME = "data"
 INDEX_NAME = "ragIndex"
+TEXT_INDEX_NAME = "ragTextIndex"  # Atlas Search (full-text) para el modo híbrido
+STATS_COLL_NAME = f"{COLL_NAME}_stats"  # contadores por type que mantienen los ingesters
+
+# ────────────────── COLLECTION STATS ──────────────────
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "60"))  # segundos que /stats sirve la misma foto
+STATS_REFRESH_INTERVAL = float(os.getenv("STATS_REFRESH_INTERVAL", "60"))  # refresco en segundo plano; 0 = solo bajo demanda
+STATS_RECOUNT_INTERVAL = float(os.getenv("STATS_RECOUNT_INTERVAL", "3600"))  # recuento completo que corrige los contadores; 0 = nunca
+
+# ────────────────── SEARCH BACKEND ──────────────────
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "atlas")  # "atlas" ($vectorSearch) o "local" (índice NumPy)
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", ".cache/local_index")
+LOCAL_INDEX_NLIST = int(os.getenv("LOCAL_INDEX_NLIST", "0"))  # 0 = búsqueda exacta; >0 = clusters IVF
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+NUM_CANDIDATES_FACTOR = int(os.getenv("NUM_CANDIDATES_FACTOR", "5"))  # numCandidates = limit * factor ($vectorSearch)
+
+# ────────────────── HYBRID SEARCH ──────────────────
+SEARCH_MODE = os.getenv("SEARCH_MODE", "vector")  # "vector" o "hybrid" ($search full-text + $vectorSearch, fusión RRF)
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_TEXT_WEIGHT = float(os.getenv("HYBRID_TEXT_WEIGHT", "1.0"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))  # constante k de RRF: score = peso / (k + rank)
+HYBRID_TEXT_WORKERS = int(os.getenv("HYBRID_TEXT_WORKERS", "16"))  # hilos para $search en paralelo (API síncrona)
 
 # ────────────────── EMBEDDING CONFIG ──────────────────
 EMBED_MODEL = "voyage-3.5-lite"
+EMBED_DIMENSIONS = 1024
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "array")  # "array" (doubles), "float32" o "int8" (binData vector)
 LLM_MODEL = "gpt-4o"
 
+# ────────────────── QUERY EMBEDDING CACHE ──────────────────
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "86400"))  # segundos
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH") or None  # ej: ".cache/query_embeddings.sqlite"; None = solo memoria
+EMBED_CACHE_DISK_SIZE = int(os.getenv("EMBED_CACHE_DISK_SIZE", "200000"))
+
+# ────────────────── QUERY EMBEDDING MICRO-BATCHING ──────────────────
+EMBED_BATCH_ENABLED = os.getenv("EMBED_BATCH_ENABLED", "false").lower() == "true"
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_MAX_INFLIGHT = int(os.getenv("EMBED_BATCH_MAX_INFLIGHT", "4"))
+
+# ────────────────── SEMANTIC ANSWER CACHE ──────────────────
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # similitud coseno mínima
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))  # segundos
+SEMANTIC_CACHE_CHECK_INTERVAL = float(os.getenv("SEMANTIC_CACHE_CHECK_INTERVAL", "30"))  # segundos entre chequeos de la colección
+
+# ────────────────── RERANK ──────────────────
+RERANK_CACHE_ENABLED = os.getenv("RERANK_CACHE_ENABLED", "true").lower() == "true"
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "100000"))  # pares (pregunta, chunk)
+RERANK_CACHE_TTL = float(os.getenv("RERANK_CACHE_TTL", "86400"))  # segundos
+RERANK_ADAPTIVE = os.getenv("RERANK_ADAPTIVE", "false").lower() == "true"
+RERANK_MIN_CANDIDATES = int(os.getenv("RERANK_MIN_CANDIDATES", "20"))  # piso de candidatos (además de context_k)
+RERANK_SCORE_MARGIN = float(os.getenv("RERANK_SCORE_MARGIN", "0.04"))  # máx. distancia al mejor vectorSearchScore
+RERANK_GAP_THRESHOLD = float(os.getenv("RERANK_GAP_THRESHOLD", "0.02"))  # salto entre vecinos que corta la cola
+RERANK_MODES = ("voyage", "local")
+RERANK_MODE = os.getenv("RERANK_MODE", "voyage")  # voyage (rerank-2) o local (coseno exacto + MMR, sin red)
+RERANK_LOCAL_FALLBACK = os.getenv("RERANK_LOCAL_FALLBACK", "true").lower() == "true"  # si rerank-2 falla, rerank local
+RERANK_MMR_LAMBDA = float(os.getenv("RERANK_MMR_LAMBDA", "0.7"))  # 1 = solo relevancia, 0 = solo diversidad
+RERANK_DUPLICATE_THRESHOLD = float(os.getenv("RERANK_DUPLICATE_THRESHOLD", "0.97"))  # coseno a un chunk ya elegido que lo descarta
+
+# ────────────────── REQUEST DEADLINE ──────────────────
+REQUEST_DEADLINE_MS = int(os.getenv("REQUEST_DEADLINE_MS", "30000"))  # presupuesto de latencia por request; 0 = sin límite
+DEADLINE_SHARES = {"embed": 0.1, "search": 0.2, "rerank": 0.2, "generate": 0.5}  # reparto del presupuesto por etapa
+DEADLINE_MIN_STAGE_MS = int(os.getenv("DEADLINE_MIN_STAGE_MS", "50"))  # con menos que esto, rerank/LLM se saltan sin llamar
+DEADLINE_STREAM_WORKERS = int(os.getenv("DEADLINE_STREAM_WORKERS", "16"))  # esperas de primer token en curso; más, degradan
+
+# ────────────────── PROMPT CONTEXT ──────────────────
+CONTEXT_PACKING_ENABLED = os.getenv("CONTEXT_PACKING_ENABLED", "true").lower() == "true"  # unir vecinos y quitar solapamiento
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))  # tokens de contexto en el prompt; 0 = sin límite
+
 # ────────────────── APP CONFIG ──────────────────
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")  # DEBUG, INFO, WARNING, ERROR
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "false").lower() == "true"  # abrir conexiones al arrancar el worker
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "256"))  # preguntas por request en /api/batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))  # preguntas de un batch en vuelo a la vez (búsqueda, rerank, LLM)
 USERNAME = os.getenv("USERNAME", "anon")
 CHUNK_SIZE = 800
 CHUNK_OVERLAP = 100
+CHUNKER = os.getenv("CHUNKER", "characters")  # characters (CHUNK_SIZE caracteres) o tokens (CHUNK_TOKENS); los dos con ingest.chunker
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "200"))  # tamaño en tokens aproximados con CHUNKER=tokens (~800 caracteres)
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "25"))
 BATCH_SIZE = 64
 
 # ────────────────── INGESTION CONFIG ──────────────────
 PDF_DIR = "../pdfs"
+PDF_BACKEND = "pymupdf"  # "pymupdf" (más rápido) o "pypdf2"
+PDF_WORKERS = os.cpu_count() or 4  # procesos de extracción
+PDF_PAGES_PER_TASK = 25  # páginas por tarea del pool
 SITEMAP_INDEX = "https://www.yoururl.com/sitemap.xml"
-MAX_URLS = None #set up to none if you want to procees all. Be memory and time sensitive
\ No newline at end of file
+MAX_URLS = None #set up to none if you want to procees all. Be memory and time sensitive
+SCRAPE_WORKERS = 16  # descargas concurrentes
+SCRAPE_PER_HOST = 4  # máximo de requests simultáneos por host
+SCRAPE_MIN_DELAY = 0.0  # segundos entre requests al mismo host
+SCRAPE_MAX_RETRIES = 3  # reintentos en 429/5xx/timeouts
+SCRAPE_TIMEOUT = 15
+SCRAPE_MAX_BACKOFF = 60  # espera máxima entre reintentos, también si Retry-After pide más
+PIPELINE_EMBED_WORKERS = 3  # batches de embedding en vuelo
+PIPELINE_QUEUE_SIZE = 4  # batches máximos en cada cola entre etapas
+PIPELINE_LOG_INTERVAL = 10  # segundos entre logs de utilización
+INGEST_EMBED_CACHE_ENABLED = True  # cache de embeddings por contenido compartido por los ingesters
+INGEST_EMBED_CACHE_PATH = ".cache/ingest_embeddings.sqlite"
+INGEST_EMBED_CACHE_SIZE = 200000  # vectores máximos en disco (float32, LRU)
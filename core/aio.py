@@ -0,0 +1,26 @@
+import asyncio
+import threading
+import weakref
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class LoopLocal(Generic[T]):
+    """Una instancia por event loop: los clientes async quedan atados al loop que los creó."""
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._instances: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, T]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        loop = asyncio.get_running_loop()
+        instance = self._instances.get(loop)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(loop)
+                if instance is None:
+                    instance = self._factory()
+                    self._instances[loop] = instance
+        return instance
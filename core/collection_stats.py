@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+from core.database import db_manager
+from core.lazy import lazy_property
+from config.config import (
+    COLL_NAME,
+    STATS_COLL_NAME,
+    STATS_CACHE_TTL,
+    STATS_REFRESH_INTERVAL,
+    STATS_RECOUNT_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+# Estadísticas de la colección sin recorrerla en cada request:
+#   - los conteos por type viven en un documento de STATS_COLL_NAME que los ingesters ajustan con $inc
+#   - un recuento completo (una agregación) lo crea y corrige la deriva cada STATS_RECOUNT_INTERVAL
+#   - /stats sirve una foto cacheada que un hilo en segundo plano refresca cada STATS_REFRESH_INTERVAL
+#   - generation sube con cada escritura de un ingester, aunque no cambie el conteo (re-ingestas):
+#     es la versión de la colección para el cache semántico
+
+
+def increment_counts(db, doc_type: str, delta: int):
+    """Ajusta el contador de un type y sube la generación (ingesters, tras cada escritura).
+    Sin documento de contadores lo crea (upsert) para que la generación avance siempre; sus conteos
+    parciales no se usan hasta el primer recuento."""
+    db[STATS_COLL_NAME].update_one(
+        {"_id": COLL_NAME},
+        {"$inc": {f"counts.{doc_type}": delta, "generation": 1}, "$set": {"updated_at": time.time()}},
+        upsert=True
+    )
+
+
+class CollectionStats:
+    def __init__(self, ttl: float = 60, refresh_interval: float = 60, recount_interval: float = 3600):
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.recount_interval = recount_interval
+        self._snapshot: Optional[Dict] = None
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.refreshes = 0
+        self.recounts = 0
+
+    @lazy_property
+    def counters(self):
+        return db_manager.db[STATS_COLL_NAME]
+
+    def recount(self) -> Dict[str, int]:
+        """Conteo exacto en una sola agregación; reescribe el documento de contadores."""
+        counts = db_manager.count_by_type()
+        now = time.time()
+        # $set y no replace: la generación se conserva
+        self.counters.update_one(
+            {"_id": COLL_NAME},
+            {"$set": {"counts": counts, "recounted_at": now, "updated_at": now}},
+            upsert=True
+        )
+        self.recounts += 1
+        logger.info("Collection stats recounted: %s", counts)
+        return counts
+
+    def _counts(self) -> Dict[str, int]:
+        doc = self.counters.find_one({"_id": COLL_NAME})
+        # Sin recounted_at el documento lo creó un $inc de un ingester: sus conteos son parciales
+        if doc is None or "recounted_at" not in doc or (
+                self.recount_interval and time.time() - doc["recounted_at"] > self.recount_interval):
+            return self.recount()
+        return {doc_type: count for doc_type, count in doc.get("counts", {}).items() if count}
+
+    def generation(self) -> int:
+        """Generación de la colección (escrituras de los ingesters); 0 antes de la primera escritura."""
+        doc = self.counters.find_one({"_id": COLL_NAME}, {"generation": 1})
+        return (doc or {}).get("generation", 0)
+
+    def refresh(self, max_age: Optional[float] = None) -> Dict:
+        """Lee contadores y collStats (ambos baratos) y actualiza la foto; un solo refresco a la vez."""
+        with self._refresh_lock:
+            with self._lock:
+                if max_age is not None and self._snapshot is not None and time.time() - self._refreshed_at <= max_age:
+                    # Otro hilo la refrescó mientras esperábamos
+                    return self._snapshot
+            snapshot = db_manager.format_stats(self._counts(), db_manager.storage_stats())
+            now = time.time()
+            snapshot["refreshed_at"] = now
+            with self._lock:
+                self._snapshot = snapshot
+                self._refreshed_at = now
+                self.refreshes += 1
+            return snapshot
+
+    def get(self) -> Dict:
+        self._ensure_thread()
+        with self._lock:
+            snapshot, age = self._snapshot, time.time() - self._refreshed_at
+        if snapshot is not None and (age <= self.ttl or self._refresh_lock.locked()):
+            # Fresca, o ya hay otro refresco en curso: se sirve la foto actual
+            return {**snapshot, "age_seconds": round(age, 1)}
+        try:
+            snapshot = self.refresh(max_age=self.ttl)
+            return {**snapshot, "age_seconds": round(time.time() - snapshot["refreshed_at"], 1)}
+        except Exception as e:
+            logger.error("Failed to refresh collection stats: %s", e)
+            if snapshot is None:
+                raise
+            return {**snapshot, "age_seconds": round(age, 1), "stale": True}
+
+    # ─── Refresco en segundo plano ───
+    def _ensure_thread(self):
+        # Se arranca en el primer uso, ya dentro del worker (después del fork)
+        if not self.refresh_interval or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="collection-stats", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Background collection stats refresh failed: %s", e)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+# Instancia global
+collection_stats = CollectionStats(
+    ttl=STATS_CACHE_TTL,
+    refresh_interval=STATS_REFRESH_INTERVAL,
+    recount_interval=STATS_RECOUNT_INTERVAL
+)
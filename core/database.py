@@ -1,3 +1,4 @@
+import logging
 from pymongo import MongoClient
 from pymongo.errors import OperationFailure
 from pathlib import Path
@@ -5,128 +6,199 @@ from pymongo.operations import SearchIndexModel
 import sys
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
-from config.config import MONGODB_URI, DB_NAME, COLL_NAME, INDEX_NAME
+from config.config import MONGODB_URI, DB_NAME, COLL_NAME, INDEX_NAME, TEXT_INDEX_NAME, EMBED_DIMENSIONS, VECTOR_STORAGE, SEARCH_MODE
+from core.lazy import is_loaded, lazy_property
+from core.search.filters import FILTER_FIELDS
+
+logger = logging.getLogger(__name__)
 
 class DatabaseManager:
-    def __init__(self):
-        self.client = None
-        self.db = None
-        self.collection = None
-        self.connect()
-    
-    def connect(self):
-        print(f"[DEBUG] Connecting to MongoDB: {MONGODB_URI[:20]}...")
-        self.client = MongoClient(MONGODB_URI)
-        
-        # Create DB 
-        self.db = self.client[DB_NAME]
-        print(f"[DEBUG] Using database: {DB_NAME}")
-        
+    """Conexión perezosa: importar el módulo no toca la red; el cliente se crea en el primer uso
+    (ya dentro del worker, después del fork). Colección e índice se crean con setup()."""
+
+    @lazy_property
+    def client(self) -> MongoClient:
+        logger.debug("Connecting to MongoDB: %s...", MONGODB_URI[:20])
+        return MongoClient(MONGODB_URI)
+
+    @lazy_property
+    def db(self):
+        return self.client[DB_NAME]
+
+    @lazy_property
+    def collection(self):
+        return self.db[COLL_NAME]
+
+    def setup(self):
+        """Crea la colección y el índice vectorial si faltan: python -m core.database"""
         # Create collection
         if COLL_NAME not in self.db.list_collection_names():
             self.db.create_collection(COLL_NAME)
-            print(f"[INFO] Collection '{COLL_NAME}' created successfully.")
+            logger.info("Collection '%s' created successfully.", COLL_NAME)
         else:
-            print(f"[DEBUG] Collection '{COLL_NAME}' already exists.")
+            logger.debug("Collection '%s' already exists.", COLL_NAME)
         
-        self.collection = self.db[COLL_NAME]
-        print(f"[DEBUG] Connected to database: {DB_NAME}, collection: {COLL_NAME}")
+        logger.debug("Connected to database: %s, collection: %s", DB_NAME, COLL_NAME)
         
+        # Índice regular sobre type: el recuento de estadísticas lo recorre sin leer documentos
+        self.collection.create_index("type")
+
         # Create index
         self.vector_index()
+        if SEARCH_MODE == "hybrid":
+            self.text_index()
+
+    def warmup(self):
+        """Abre el pool de conexiones por adelantado (post-fork / startup)."""
+        self.client.admin.command('ping')
     
+    def vector_index_definition(self) -> dict:
+        # Mismo tipo "vector" para arrays y binData float32/int8; los campos "filter" habilitan el pre-filtro
+        return {
+            "fields": [
+                {
+                    "type": "vector",
+                    "path": "embedding",
+                    "numDimensions": EMBED_DIMENSIONS,
+                    "similarity": "cosine"
+                }
+            ] + [{"type": "filter", "path": field} for field in FILTER_FIELDS]
+        }
+
     def vector_index(self):
         try:
             # Verify index
             existing_indexes = list(self.collection.list_search_indexes())
-            index_exists = any(index.get('name') == INDEX_NAME for index in existing_indexes)
+            existing = next((index for index in existing_indexes if index.get('name') == INDEX_NAME), None)
             
-            if index_exists:
-                print(f"[INFO] Vector search index '{INDEX_NAME}' already exists.")
+            if existing is not None:
+                # Índices creados antes de los filtros: se actualizan en el lugar
+                fields = existing.get('latestDefinition', {}).get('fields', [])
+                filter_paths = {f.get('path') for f in fields if f.get('type') == 'filter'}
+                missing = [field for field in FILTER_FIELDS if field not in filter_paths]
+                if missing:
+                    self.collection.update_search_index(INDEX_NAME, self.vector_index_definition())
+                    logger.info("Vector search index '%s' updated with filter fields: %s", INDEX_NAME, ", ".join(missing))
+                else:
+                    logger.info("Vector search index '%s' already exists.", INDEX_NAME)
                 return
             
             # Create index
             search_index_model = SearchIndexModel(
-            definition={
-                "fields": [
-                    {
-                        "type": "vector",
-                        "path": "embedding",
-                        "numDimensions": 1024,
-                        "similarity": "cosine"
-                    }
-                ]
-            },
+            definition=self.vector_index_definition(),
             name=INDEX_NAME,
             type="vectorSearch"
         )
             result = self.collection.create_search_index(model=search_index_model)
-            print(f"[INFO] Vector search index '{INDEX_NAME}' created successfully with dynamic mapping.")
+            logger.info("Vector search index '%s' created successfully for %s vectors.", INDEX_NAME, VECTOR_STORAGE)
             
         except OperationFailure as e:
             error_msg = str(e)
             if "already exists" in error_msg.lower():
-                print(f"[INFO] Vector search index '{INDEX_NAME}' already exists.")
+                logger.info("Vector search index '%s' already exists.", INDEX_NAME)
+            else:
+                logger.error("Failed to create vector search index: %s", e)
+                logger.debug("Error details: %s", e.details if hasattr(e, 'details') else 'No details')
+        except Exception as e:
+            logger.error("Unexpected error creating vector index: %s", e)
+    
+    def text_index(self):
+        """Índice Atlas Search sobre 'text' para la parte full-text del modo híbrido."""
+        try:
+            if any(index.get('name') == TEXT_INDEX_NAME for index in self.collection.list_search_indexes()):
+                logger.info("Full-text search index '%s' already exists.", TEXT_INDEX_NAME)
+                return
+
+            search_index_model = SearchIndexModel(
+                definition={
+                    "mappings": {
+                        "dynamic": False,
+                        "fields": {
+                            "text": {"type": "string"},
+                            # Campos de filtro para compound.filter (equals/in/range)
+                            "type": {"type": "token"},
+                            "source": {"type": "token"},
+                            "username": {"type": "token"},
+                            "ts": {"type": "number"}
+                        }
+                    }
+                },
+                name=TEXT_INDEX_NAME,
+                type="search"
+            )
+            self.collection.create_search_index(model=search_index_model)
+            logger.info("Full-text search index '%s' created successfully.", TEXT_INDEX_NAME)
+        except OperationFailure as e:
+            if "already exists" in str(e).lower():
+                logger.info("Full-text search index '%s' already exists.", TEXT_INDEX_NAME)
             else:
-                print(f"[ERROR] Failed to create vector search index: {e}")
-                print(f"[DEBUG] Error details: {e.details if hasattr(e, 'details') else 'No details'}")
+                logger.error("Failed to create full-text search index: %s", e)
         except Exception as e:
-            print(f"[ERROR] Unexpected error creating vector index: {e}")
+            logger.error("Unexpected error creating full-text index: %s", e)
     
     def ensure_database_setup(self):
         try:
             self.client.admin.command('ping')
-            print("[INFO] MongoDB connection is healthy.")
+            logger.info("MongoDB connection is healthy.")
             
             db_list = self.client.list_database_names()
             if DB_NAME in db_list:
-                print(f"[INFO] Database '{DB_NAME}' exists.")
+                logger.info("Database '%s' exists.", DB_NAME)
             else:
-                print(f"[INFO] Database '{DB_NAME}' will be created on first write.")
+                logger.info("Database '%s' will be created on first write.", DB_NAME)
             
             collections = self.db.list_collection_names()
             if COLL_NAME in collections:
-                print(f"[INFO] Collection '{COLL_NAME}' exists.")
+                logger.info("Collection '%s' exists.", COLL_NAME)
             else:
-                print(f"[INFO] Collection '{COLL_NAME}' will be created on first write.")
+                logger.info("Collection '%s' will be created on first write.", COLL_NAME)
             
             indexes = list(self.collection.list_search_indexes())
             vector_index_exists = any(idx.get('name') == INDEX_NAME for idx in indexes)
             
             if vector_index_exists:
-                print(f"[INFO] Vector search index '{INDEX_NAME}' is ready.")
+                logger.info("Vector search index '%s' is ready.", INDEX_NAME)
             else:
-                print(f"[WARN] Vector search index '{INDEX_NAME}' not found.")
+                logger.warning("Vector search index '%s' not found.", INDEX_NAME)
             
             return True
             
         except Exception as e:
-            print(f"[ERROR] Database setup verification failed: {e}")
+            logger.error("Database setup verification failed: %s", e)
             return False
     
-    def get_collection_stats(self):
-        try:
+    def count_by_type(self) -> dict:
+        """Chunks por type en una sola agregación; con el índice de type ($sort primero) es un recorrido del índice."""
+        pipeline = [{"$sort": {"type": 1}}, {"$group": {"_id": "$type", "count": {"$sum": 1}}}]
+        return {row["_id"] or "unknown": row["count"] for row in self.collection.aggregate(pipeline)}
 
-            total_documents = self.collection.count_documents({})
-            pdf_documents = self.collection.count_documents({"type": "PDF"})
-            url_documents = self.collection.count_documents({"type": "URL"})
-            
+    def storage_stats(self) -> dict:
+        # collStats lee metadatos, no recorre la colección
+        collection_stats = self.db.command("collStats", COLL_NAME)
+        return {
+            "storage_size": collection_stats.get("storageSize", 0),
+            "total_index_size": collection_stats.get("totalIndexSize", 0),
+            "avg_obj_size": collection_stats.get("avgObjSize", 0)
+        }
 
-            collection_stats = self.collection.database.command("collStats", COLL_NAME)
-            
-            return {
-                "total_documents": total_documents,
-                "pdf_documents": pdf_documents,
-                "url_documents": url_documents,
-                "database_name": DB_NAME,
-                "collection_name": COLL_NAME,
-                "index_name": INDEX_NAME,
-                "storage_size": collection_stats.get("storageSize", 0),
-                "total_index_size": collection_stats.get("totalIndexSize", 0),
-                "avg_obj_size": collection_stats.get("avgObjSize", 0)
-            }
+    @staticmethod
+    def format_stats(counts: dict, storage: dict) -> dict:
+        return {
+            "total_documents": sum(counts.values()),
+            "pdf_documents": counts.get("PDF", 0),
+            "url_documents": counts.get("URL", 0),
+            "database_name": DB_NAME,
+            "collection_name": COLL_NAME,
+            "index_name": INDEX_NAME,
+            **storage
+        }
+
+    def get_collection_stats(self):
+        """Recuento exacto (una agregación + collStats). La app sirve la versión cacheada de core.collection_stats."""
+        try:
+            return self.format_stats(self.count_by_type(), self.storage_stats())
         except Exception as e:
-            print(f"[ERROR] Failed to get collection stats: {e}")
+            logger.error("Failed to get collection stats: %s", e)
             return {
                 "total_documents": 0,
                 "pdf_documents": 0,
@@ -138,9 +210,25 @@ class DatabaseManager:
     
     def close_connection(self):
         """Cerrar la conexión a MongoDB"""
-        if self.client:
+        if is_loaded(self, "client"):
             self.client.close()
-            print("[INFO] MongoDB connection closed.")
+            for name in ("collection", "db", "client"):
+                self.__dict__.pop(name, None)
+            logger.info("MongoDB connection closed.")
+
+# Instancia global para usar en otros módulos (sin conexión hasta el primer uso)
+db_manager = DatabaseManager()
+
+
+def main():
+    from core.observability import configure_logging
+
+    configure_logging()
+    db_manager.setup()
+    ok = db_manager.ensure_database_setup()
+    db_manager.close_connection()
+    sys.exit(0 if ok else 1)
 
-# Instancia global para usar en otros módulos
-db_manager = DatabaseManager()
\ No newline at end of file
+# ─── EXECUTE ───
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Set, TypeVar
+import pymongo
+from core.observability import DEGRADATIONS
+from config.config import DEADLINE_SHARES, DEADLINE_MIN_STAGE_MS, DEADLINE_STREAM_WORKERS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Presupuesto de latencia por request, repartido entre embed → search → rerank → generate.
+# Cada etapa recibe su parte de lo que queda (si una termina antes, las siguientes heredan el sobrante).
+# Cuando una etapa se pasa, el pipeline degrada en vez de esperar:
+#   skip_rerank     → orden de la búsqueda vectorial
+#   shrink_context  → menos chunks en el prompt si queda menos tiempo del previsto para el LLM
+#   retrieval_only  → sin respuesta del LLM, solo las fuentes
+#   truncate_answer → el streaming se corta al llegar al límite
+#   no_results      → sin vector de la pregunta o sin resultados de búsqueda a tiempo
+
+STAGES = ("embed", "search", "rerank", "generate")
+
+# Solo la espera del primer token del streaming corre en otro hilo: un next() no se puede limitar de otra forma.
+# Pool acotado que no encola: sin hilo libre la request degrada enseguida. La llamada abandonada termina sola
+# porque el cliente del LLM lleva el mismo presupuesto como timeout de httpx
+_stream_executor = ThreadPoolExecutor(max_workers=DEADLINE_STREAM_WORKERS, thread_name_prefix="deadline-stream")
+_stream_slots = threading.BoundedSemaphore(DEADLINE_STREAM_WORKERS)
+_END = object()
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    def __init__(self, total: Optional[float] = None, shares: Optional[Dict[str, float]] = None,
+                 min_stage: float = DEADLINE_MIN_STAGE_MS / 1000):
+        self.total = total
+        self.shares = shares or DEADLINE_SHARES
+        self.min_stage = min_stage
+        self.start = time.perf_counter()
+        self.degradations: List[Dict] = []
+        self.timed_out: Set[str] = set()
+
+    @classmethod
+    def from_ms(cls, deadline_ms: Optional[int]) -> "Deadline":
+        # 0 o None: sin límite (las etapas se llaman sin timeout)
+        return cls(deadline_ms / 1000 if deadline_ms else None)
+
+    @property
+    def enabled(self) -> bool:
+        return self.total is not None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def remaining(self) -> Optional[float]:
+        return None if self.total is None else max(0.0, self.total - self.elapsed())
+
+    def planned(self, stage: str) -> Optional[float]:
+        return None if self.total is None else self.total * self.shares.get(stage, 0.0)
+
+    def budget(self, stage: str) -> Optional[float]:
+        """Parte de lo que queda que le toca a la etapa según su peso frente a las etapas pendientes."""
+        if self.total is None:
+            return None
+        pending = STAGES[STAGES.index(stage):] if stage in STAGES else (stage,)
+        weight = sum(self.shares.get(s, 0.0) for s in pending)
+        share = self.shares.get(stage, 0.0) / weight if weight else 1.0
+        return self.remaining() * share
+
+    def can_run(self, stage: str) -> bool:
+        budget = self.budget(stage)
+        return budget is None or (stage not in self.timed_out and budget >= self.min_stage)
+
+    def degrade(self, step: str, stage: str, **details):
+        if any(d["step"] == step and d["stage"] == stage for d in self.degradations):
+            return
+        entry = {"step": step, "stage": stage, "at_ms": round(self.elapsed() * 1000, 1), **details}
+        self.degradations.append(entry)
+        DEGRADATIONS.labels(step).inc()
+        logger.warning("Deadline: %s at %s after %.0fms %s", step, stage, entry["at_ms"], details or "")
+
+    def _exceeded(self, stage: str, budget: float) -> DeadlineExceeded:
+        self.timed_out.add(stage)
+        return DeadlineExceeded(f"{stage} exceeded its {budget * 1000:.0f}ms budget")
+
+    def run(self, stage: str, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Llama fn(..., timeout=presupuesto de la etapa) en el hilo actual: es el cliente (Voyage, OpenAI/httpx)
+        el que corta la llamada, así que al agotarse el plazo no queda nada corriendo. DeadlineExceeded si se pasó."""
+        budget = self.budget(stage)
+        if budget is None:
+            return fn(*args, **kwargs)
+        if stage in self.timed_out or budget <= 0:
+            raise self._exceeded(stage, max(budget, 0.0))
+        start = time.perf_counter()
+        try:
+            result = fn(*args, timeout=budget, **kwargs)
+        except Exception:
+            if time.perf_counter() - start >= budget:
+                raise self._exceeded(stage, budget) from None
+            raise
+        # Los clientes que se tragan el error (embed_text, generate_answer) devuelven None o un mensaje
+        if time.perf_counter() - start >= budget:
+            raise self._exceeded(stage, budget)
+        return result
+
+    def first(self, stage: str, items: Iterator[T]) -> Iterator[T]:
+        """items con el primer elemento esperado dentro del presupuesto de la etapa; DeadlineExceeded si no llega
+        a tiempo o si no hay hilo libre para esperarlo. El resto se consume en el hilo del llamador."""
+        budget = self.budget(stage)
+        if budget is None:
+            return items
+        if stage in self.timed_out or budget <= 0 or not _stream_slots.acquire(blocking=False):
+            raise self._exceeded(stage, max(budget, 0.0))
+        future = _stream_executor.submit(contextvars.copy_context().run, next, items, _END)
+        future.add_done_callback(lambda _: _stream_slots.release())
+        try:
+            first = future.result(timeout=budget)
+        except FutureTimeout:
+            # Se cierra el generador cuando su next() termine (no se puede cerrar mientras corre)
+            future.add_done_callback(lambda _: items.close() if hasattr(items, "close") else None)
+            raise self._exceeded(stage, budget) from None
+        return iter(()) if first is _END else itertools.chain([first], items)
+
+    async def arun(self, stage: str, awaitable: Awaitable[T]) -> T:
+        budget = self.budget(stage)
+        if budget is None:
+            return await awaitable
+        if stage in self.timed_out or budget <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise self._exceeded(stage, max(budget, 0.0))
+        try:
+            return await asyncio.wait_for(awaitable, timeout=budget)
+        except asyncio.TimeoutError:
+            raise self._exceeded(stage, budget) from None
+
+    @contextmanager
+    def mongo(self, stage: str) -> Iterator[Optional[float]]:
+        """pymongo.timeout con el presupuesto de la etapa: el servidor corta la consulta (maxTimeMS)."""
+        budget = self.budget(stage)
+        start = time.perf_counter()
+        with pymongo.timeout(None if budget is None else max(budget, 0.001)):
+            yield budget
+        if budget is not None and time.perf_counter() - start >= budget:
+            self.timed_out.add(stage)
+
+    def report(self) -> Dict:
+        elapsed = self.elapsed()
+        return {
+            "budget_ms": None if self.total is None else round(self.total * 1000),
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "exceeded": self.total is not None and elapsed > self.total,
+            "degraded": bool(self.degradations),
+            "degradations": self.degradations
+        }
@@ -0,0 +1,113 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class EmbeddingBatcher:
+    """Agrupa llamadas concurrentes a embed_text en un solo client.embed(texts=[...])."""
+
+    def __init__(self, client, model: str, window_ms: float = 5.0, max_batch_size: int = 32,
+                 max_inflight: int = 4, timeout: float = 30.0, sample_size: int = 2000):
+        self.client = client
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        self._queue: "queue.Queue[tuple[str, float, Future]]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="embed-batch")
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=sample_size)
+        self._queue_waits = deque(maxlen=sample_size)
+        self._call_times = deque(maxlen=sample_size)
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+
+    def _ensure_started(self):
+        # Se arranca en el primer uso para que sobreviva a un fork del worker
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._thread.start()
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        """timeout: espera máxima de este llamador (presupuesto de la request); por defecto self.timeout."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text[:24000], time.perf_counter(), future))
+        return future.result(timeout=self.timeout if timeout is None else timeout)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = first[1] + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._flush, batch)
+
+    def _flush(self, batch: list):
+        dispatched = time.perf_counter()
+        # Textos repetidos dentro del mismo batch se envían una sola vez
+        unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            embeddings = self.client.embed(texts=unique_texts, model=self.model).embeddings
+            by_text = dict(zip(unique_texts, embeddings))
+            for text, _, future in batch:
+                future.set_result(by_text[text])
+            failed = False
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            failed = True
+        elapsed = time.perf_counter() - dispatched
+
+        with self._stats_lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.errors += int(failed)
+            self._batch_sizes.append(len(unique_texts))
+            self._call_times.append(elapsed)
+            self._queue_waits.extend(dispatched - enqueued for _, enqueued, _ in batch)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            waits = list(self._queue_waits)
+            calls = list(self._call_times)
+            return {
+                "enabled": True,
+                "window_ms": self.window * 1000,
+                "max_batch_size": self.max_batch_size,
+                "requests": self.requests,
+                "batches": self.batches,
+                "errors": self.errors,
+                "avg_batch_size": sum(sizes) / len(sizes) if sizes else 0.0,
+                "max_batch_size_seen": max(sizes) if sizes else 0,
+                "queue_wait_ms_p50": _percentile(waits, 50) * 1000,
+                "queue_wait_ms_p95": _percentile(waits, 95) * 1000,
+                "queue_wait_ms_p99": _percentile(waits, 99) * 1000,
+                "embed_call_ms_p50": _percentile(calls, 50) * 1000,
+                "embed_call_ms_p99": _percentile(calls, 99) * 1000,
+            }
@@ -0,0 +1,212 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Mismo límite que se usa al llamar a client.embed
+MAX_EMBED_CHARS = 24000
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text[:MAX_EMBED_CHARS].split()).lower()
+
+
+def cache_key(text: str, model: str, normalize: bool = True) -> str:
+    body = normalize_text(text) if normalize else text[:MAX_EMBED_CHARS]
+    return hashlib.sha256(f"{model}\x00{body}".encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class DiskEmbeddingStore:
+    """SQLite key → float32 vector store, namespaced by model."""
+
+    def __init__(self, path: str, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_accessed ON embeddings(accessed)")
+        self._conn.commit()
+        self.evictions = 0
+        # Accesos pendientes de guardar (key → timestamp); a lo sumo una entrada por fila de la tabla
+        self._touched: Dict[str, float] = {}
+
+    def get_entries(self, keys: Iterable[str]) -> Dict[str, Tuple[float, List[float]]]:
+        """key → (created, vector) de las claves vigentes. Una lectura no escribe: el acceso queda
+        anotado en memoria y se guarda junto con la próxima escritura, antes de podar por LRU."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector, created FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part
+                ).fetchall()
+                for key, blob, created in rows:
+                    if self.ttl is not None and now - created > self.ttl:
+                        continue
+                    found[key] = (created, unpack_vector(blob))
+                    self._touched[key] = now
+        return found
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        return {key: vector for key, (_, vector) in self.get_entries(keys).items()}
+
+    def get(self, key: str) -> Optional[List[float]]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, List[float]], model: str):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                [(key, model, pack_vector(vec), now, now) for key, vec in items.items()]
+            )
+            self._flush_touched()
+            self._prune()
+            self._conn.commit()
+
+    def put(self, key: str, vector: List[float], model: str):
+        self.put_many({key: vector}, model)
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany("UPDATE embeddings SET accessed = ? WHERE key = ?",
+                                   [(at, key) for key, at in self._touched.items()])
+            self._touched.clear()
+
+    def _prune(self):
+        if self.ttl is not None:
+            cur = self._conn.execute("DELETE FROM embeddings WHERE created < ?", (time.time() - self.ttl,))
+            self.evictions += cur.rowcount
+        if self.max_entries is None:
+            return
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            cur = self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY accessed LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += cur.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return count
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+
+class EmbeddingCache:
+    """LRU en memoria con TTL, respaldado opcionalmente por un DiskEmbeddingStore."""
+
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = 3600,
+                 disk_path: Optional[str] = None, disk_max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk = DiskEmbeddingStore(disk_path, max_entries=disk_max_entries, ttl=ttl) if disk_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        key = cache_key(text, model)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, vector = entry
+                if self.ttl is None or now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.disk is not None:
+            entry = self.disk.get_entries([key]).get(key)
+            if entry is not None:
+                # Conserva el momento en que se guardó: subir a memoria no renueva el TTL
+                created, vector = entry
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, vector, created)
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text: str, model: str, vector: List[float]):
+        key = cache_key(text, model)
+        with self._lock:
+            self._store(key, vector, time.time())
+        if self.disk is not None:
+            self.disk.put(key, vector, model)
+
+    def _store(self, key: str, vector: List[float], stored_at: float):
+        self._entries[key] = (stored_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "disk_enabled": self.disk is not None,
+                "disk_entries": len(self.disk) if self.disk is not None else 0,
+            }
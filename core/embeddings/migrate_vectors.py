@@ -0,0 +1,67 @@
+import argparse
+import logging
+import time
+from pymongo import UpdateOne
+from core.embeddings.vector_codec import VECTOR_STORAGES, decode_vector, encode_vector, vector_storage_of
+
+logger = logging.getLogger(__name__)
+
+# Migración del campo embedding entre formatos: python -m core.embeddings.migrate_vectors --storage float32
+
+
+def migrate_vectors(collection, storage: str, batch_size: int = 500) -> dict:
+    start = time.time()
+    converted = 0
+    skipped = 0
+    ops = []
+    cursor = collection.find({"embedding": {"$exists": True}}, {"embedding": 1}, batch_size=batch_size)
+    for doc in cursor:
+        if vector_storage_of(doc["embedding"]) == storage:
+            skipped += 1
+            continue
+        vector = encode_vector(decode_vector(doc["embedding"]), storage)
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"embedding": vector}}))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            converted += len(ops)
+            ops = []
+            logger.info("Converted %d vectors (%d already %s)", converted, skipped, storage)
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        converted += len(ops)
+    return {"converted": converted, "skipped": skipped, "elapsed": time.time() - start}
+
+
+def main():
+    from config.config import COLL_NAME, VECTOR_STORAGE
+    from core.database import db_manager
+    from core.observability import configure_logging
+
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Convert stored embeddings between array, float32 and int8 formats")
+    parser.add_argument("--storage", choices=VECTOR_STORAGES, default=VECTOR_STORAGE)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--compact", action="store_true", help="run compact afterwards so storageSize reflects the savings")
+    args = parser.parse_args()
+
+    before = db_manager.storage_stats()
+    result = migrate_vectors(db_manager.collection, args.storage, args.batch_size)
+    if args.compact:
+        try:
+            db_manager.db.command("compact", COLL_NAME)
+        except Exception as e:
+            logger.warning("compact failed (not available on every tier): %s", e)
+    after = db_manager.storage_stats()
+
+    logger.info("Converted %d vectors to %s in %.1fs (%d already converted)",
+                result["converted"], args.storage, result["elapsed"], result["skipped"])
+    for key in ("storage_size", "avg_obj_size", "total_index_size"):
+        b, a = before.get(key, 0), after.get(key, 0)
+        change = f" ({(a - b) / b * 100:+.1f}%)" if b else ""
+        logger.info("%s: %d → %d bytes%s", key, b, a, change)
+    if args.storage != VECTOR_STORAGE:
+        logger.warning("VECTOR_STORAGE is '%s': set it to '%s' so new chunks and queries match", VECTOR_STORAGE, args.storage)
+
+# ─── EXECUTE ───
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from typing import List, Sequence, Union
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype, VECTOR_SUBTYPE
+
+# Formatos de almacenamiento del campo embedding:
+#   "array"   → lista de doubles BSON (~9 bytes por dimensión)
+#   "float32" → binData vector float32 (4 bytes por dimensión, sin pérdida práctica)
+#   "int8"    → binData vector int8 cuantizado (1 byte por dimensión)
+VECTOR_STORAGES = ("array", "float32", "int8")
+
+StoredVector = Union[List[float], Binary]
+
+
+def quantize_int8(vector: Sequence[float]) -> List[int]:
+    # Escala por vector: el coseno no cambia al multiplicar por una constante
+    peak = max((abs(v) for v in vector), default=0.0)
+    if peak == 0:
+        return [0] * len(vector)
+    scale = 127.0 / peak
+    return [max(-127, min(127, round(v * scale))) for v in vector]
+
+
+def encode_vector(vector: Sequence[float], storage: str = "array") -> StoredVector:
+    if storage == "float32":
+        return Binary.from_vector(list(vector), BinaryVectorDtype.FLOAT32)
+    if storage == "int8":
+        return Binary.from_vector(quantize_int8(vector), BinaryVectorDtype.INT8)
+    if storage == "array":
+        return list(vector)
+    raise ValueError(f"Unknown vector storage '{storage}', expected one of {VECTOR_STORAGES}")
+
+
+def encode_query_vector(vector: Sequence[float], storage: str = "array") -> StoredVector:
+    # Atlas acepta arrays contra vectores float32; los int8 se consultan con el mismo tipo
+    return encode_vector(vector, "int8") if storage == "int8" else list(vector)
+
+
+def decode_vector(value: StoredVector) -> List[float]:
+    if isinstance(value, Binary) and value.subtype == VECTOR_SUBTYPE:
+        return [float(v) for v in value.as_vector().data]
+    return list(value)
+
+
+def decode_vector_array(value: StoredVector) -> np.ndarray:
+    """Como decode_vector pero a float32 sin listas intermedias: binData se lee directo del buffer (2 bytes de cabecera)."""
+    if isinstance(value, Binary) and value.subtype == VECTOR_SUBTYPE:
+        dtype = np.int8 if value[:1] == BinaryVectorDtype.INT8.value else np.dtype("<f4")
+        return np.frombuffer(value, dtype=dtype, offset=2).astype(np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def vector_storage_of(value) -> str:
+    if isinstance(value, Binary) and value.subtype == VECTOR_SUBTYPE:
+        return "int8" if value.as_vector().dtype == BinaryVectorDtype.INT8 else "float32"
+    return "array"
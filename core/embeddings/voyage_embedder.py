@@ -1,38 +1,239 @@
-from typing import List, Tuple
-from voyageai import Client as VoyageClient
-from config.config import VOYAGE_API_KEY, EMBED_MODEL
+import logging
+import math
+import threading
+from collections import OrderedDict
+from typing import List, Tuple, Optional
+from config.config import (
+    VOYAGE_API_KEY,
+    EMBED_MODEL,
+    EMBED_CACHE_ENABLED,
+    EMBED_CACHE_SIZE,
+    EMBED_CACHE_TTL,
+    EMBED_CACHE_PATH,
+    EMBED_CACHE_DISK_SIZE,
+    EMBED_BATCH_ENABLED,
+    EMBED_BATCH_WINDOW_MS,
+    EMBED_BATCH_MAX_SIZE,
+    EMBED_BATCH_MAX_INFLIGHT
+)
+from core.embeddings.cache import EmbeddingCache
+from core.embeddings.batcher import EmbeddingBatcher
+from core.aio import LoopLocal
+from core.lazy import lazy_property
+from core.observability import record_error, span
+
+logger = logging.getLogger(__name__)
 
 class VoyageEmbedder:
-    def __init__(self, api_key: str = VOYAGE_API_KEY, model: str = EMBED_MODEL):
-        self.client = VoyageClient(api_key=api_key)
+    # Textos por llamada en embed_texts (la API acepta hasta 1000; las preguntas son cortas)
+    MAX_TEXTS_PER_CALL = 128
+    # Clientes con timeout: uno por tramo (cada tramo es un 25% mayor que el anterior), como mucho MAX_TIMED_CLIENTS
+    TIMEOUT_STEP = 1.25
+    MIN_TIMEOUT = 0.05
+    MAX_TIMED_CLIENTS = 32
+
+    def __init__(self, api_key: str = VOYAGE_API_KEY, model: str = EMBED_MODEL,
+                 cache: Optional[EmbeddingCache] = None, batching: bool = False):
+        self.api_key = api_key
         self.model = model
-        print(f"[DEBUG] VoyageAI client initialized with model: {model}")
-    
-    def embed_text(self, text: str) -> List[float] | None:
-        print(f"[DEBUG] Embedding text of length {len(text)} with model {self.model}")
-        try:
-            result = self.client.embed(texts=[text[:24000]], model=self.model).embeddings[0]
-            print(f"[DEBUG] Embedding successful, vector dimension: {len(result)}")
-            return result
-        except Exception as e:
-            print(f"[EMBED ERROR] {e}")
+        self.cache = cache
+        self.batching = batching
+        self.async_client = LoopLocal(self._new_async_client)
+        self._timed_clients: "OrderedDict[float, object]" = OrderedDict()
+        self._timed_lock = threading.Lock()
+
+    # Los clientes se crean en el primer uso: importar voyageai tarda ~1s y no hace falta para arrancar
+    @lazy_property
+    def client(self):
+        from voyageai import Client as VoyageClient
+
+        logger.debug("VoyageAI client initialized with model: %s", self.model)
+        return VoyageClient(api_key=self.api_key)
+
+    def _timed_client(self, timeout: Optional[float] = None):
+        # Cliente con el presupuesto de la etapa como timeout de la petición HTTP y sin reintentos:
+        # al agotarse el plazo la llamada se corta en vez de seguir ocupando un hilo.
+        # voyageai no acepta timeout por llamada, así que se reutiliza un cliente por tramo de timeout,
+        # redondeando hacia abajo para no pasarse del plazo
+        if timeout is None:
+            return self.client
+        bucket = self._timeout_bucket(timeout)
+        with self._timed_lock:
+            client = self._timed_clients.get(bucket)
+            if client is not None:
+                self._timed_clients.move_to_end(bucket)
+                return client
+        from voyageai import Client as VoyageClient
+
+        client = VoyageClient(api_key=self.api_key, max_retries=0, timeout=bucket)
+        with self._timed_lock:
+            client = self._timed_clients.setdefault(bucket, client)
+            while len(self._timed_clients) > self.MAX_TIMED_CLIENTS:
+                self._timed_clients.popitem(last=False)
+        return client
+
+    def _timeout_bucket(self, timeout: float) -> float:
+        if timeout <= self.MIN_TIMEOUT:
+            return self.MIN_TIMEOUT
+        steps = math.floor(math.log(timeout / self.MIN_TIMEOUT, self.TIMEOUT_STEP) + 1e-9)
+        return round(self.MIN_TIMEOUT * self.TIMEOUT_STEP ** steps, 3)
+
+    def _new_async_client(self):
+        from voyageai import AsyncClient as AsyncVoyageClient
+
+        return AsyncVoyageClient(api_key=self.api_key)
+
+    @lazy_property
+    def batcher(self) -> Optional[EmbeddingBatcher]:
+        if not self.batching:
             return None
-    
-    def rerank(self, query: str, documents: List[str], top_k: int) -> List[Tuple[int,float]]:
-        try:
-            print(f"[DEBUG] Reranking {len(documents)} documents, requesting top {top_k}")
-            response = self.client.rerank(
+        return EmbeddingBatcher(
+            self.client,
+            self.model,
+            window_ms=EMBED_BATCH_WINDOW_MS,
+            max_batch_size=EMBED_BATCH_MAX_SIZE,
+            max_inflight=EMBED_BATCH_MAX_INFLIGHT
+        )
+
+    def warmup(self):
+        self.client
+        self.batcher
+
+    def embed_text(self, text: str, timeout: Optional[float] = None) -> List[float] | None:
+        with span("embed", items=1, text_chars=len(text), cache_hit=False) as attrs:
+            if self.cache is not None:
+                cached = self.cache.get(text, self.model)
+                if cached is not None:
+                    attrs["cache_hit"] = True
+                    return cached
+
+            try:
+                if self.batcher is not None:
+                    result = self.batcher.embed(text, timeout=timeout)
+                else:
+                    result = self._timed_client(timeout).embed(texts=[text[:24000]], model=self.model).embeddings[0]
+                attrs["dimensions"] = len(result)
+                if self.cache is not None:
+                    self.cache.put(text, self.model, result)
+                return result
+            except Exception as e:
+                record_error("embed", e)
+                logger.error("Embedding failed: %s", e)
+                return None
+
+    async def aembed_text(self, text: str) -> List[float] | None:
+        with span("embed", items=1, text_chars=len(text), cache_hit=False) as attrs:
+            if self.cache is not None:
+                cached = self.cache.get(text, self.model)
+                if cached is not None:
+                    attrs["cache_hit"] = True
+                    return cached
+
+            try:
+                response = await self.async_client.get().embed(texts=[text[:24000]], model=self.model)
+                result = response.embeddings[0]
+                attrs["dimensions"] = len(result)
+                if self.cache is not None:
+                    self.cache.put(text, self.model, result)
+                return result
+            except Exception as e:
+                record_error("embed", e)
+                logger.error("Embedding failed: %s", e)
+                return None
+
+    def _cached(self, texts: List[str]) -> Tuple[List[Optional[List[float]]], List[int]]:
+        # Vectores ya cacheados y posiciones que hay que embeber
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        missing = []
+        for i, text in enumerate(texts):
+            cached = self.cache.get(text, self.model) if self.cache is not None else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                missing.append(i)
+        return results, missing
+
+    def _store(self, texts: List[str], results: List[Optional[List[float]]], positions: List[int], embeddings):
+        for i, vector in zip(positions, embeddings):
+            results[i] = vector
+            if self.cache is not None:
+                self.cache.put(texts[i], self.model, vector)
+
+    def embed_texts(self, texts: List[str]) -> List[List[float] | None]:
+        """Varias preguntas en una sola llamada a client.embed (en tandas de MAX_TEXTS_PER_CALL); None si falla."""
+        with span("embed", items=len(texts), text_chars=sum(map(len, texts))) as attrs:
+            results, missing = self._cached(texts)
+            attrs["cache_hits"] = len(texts) - len(missing)
+            for start in range(0, len(missing), self.MAX_TEXTS_PER_CALL):
+                positions = missing[start:start + self.MAX_TEXTS_PER_CALL]
+                try:
+                    response = self.client.embed(texts=[texts[i][:24000] for i in positions], model=self.model)
+                    self._store(texts, results, positions, response.embeddings)
+                except Exception as e:
+                    record_error("embed", e)
+                    logger.error("Batch embedding of %d texts failed: %s", len(positions), e)
+            attrs["calls"] = -(-len(missing) // self.MAX_TEXTS_PER_CALL)
+            return results
+
+    async def aembed_texts(self, texts: List[str]) -> List[List[float] | None]:
+        with span("embed", items=len(texts), text_chars=sum(map(len, texts))) as attrs:
+            results, missing = self._cached(texts)
+            attrs["cache_hits"] = len(texts) - len(missing)
+            for start in range(0, len(missing), self.MAX_TEXTS_PER_CALL):
+                positions = missing[start:start + self.MAX_TEXTS_PER_CALL]
+                try:
+                    response = await self.async_client.get().embed(texts=[texts[i][:24000] for i in positions], model=self.model)
+                    self._store(texts, results, positions, response.embeddings)
+                except Exception as e:
+                    record_error("embed", e)
+                    logger.error("Batch embedding of %d texts failed: %s", len(positions), e)
+            attrs["calls"] = -(-len(missing) // self.MAX_TEXTS_PER_CALL)
+            return results
+
+    def rerank(self, query: str, documents: List[str], top_k: int,
+               timeout: Optional[float] = None) -> List[Tuple[int,float]]:
+        """(índice, score) de rerank-2; si la llamada falla lanza la excepción: el fallback (coseno + MMR
+        o el orden de la búsqueda) lo decide el retriever."""
+        with span("rerank", items=len(documents), payload_chars=sum(map(len, documents)), top_k=top_k) as attrs:
+            response = self._timed_client(timeout).rerank(
+                query=query,
+                documents=documents,
+                model="rerank-2",
+                top_k=top_k
+            )
+            results = [(r.index, r.relevance_score) for r in response.results]
+            attrs["results"] = len(results)
+            return results
+
+    async def arerank(self, query: str, documents: List[str], top_k: int) -> List[Tuple[int,float]]:
+        with span("rerank", items=len(documents), payload_chars=sum(map(len, documents)), top_k=top_k) as attrs:
+            response = await self.async_client.get().rerank(
                 query=query,
                 documents=documents,
                 model="rerank-2",
                 top_k=top_k
             )
             results = [(r.index, r.relevance_score) for r in response.results]
-            print(f"[DEBUG] Reranking successful, returned {len(results)} indices")
+            attrs["results"] = len(results)
             return results
-        except Exception as e:
-            fallback_count = min(top_k, len(documents))
-            return [(i, 0.5) for i in range(fallback_count)]
+
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+    def batcher_stats(self) -> dict:
+        if not self.batching:
+            return {"enabled": False}
+        return self.batcher.stats()
 
 # Instancia global
-voyage_embedder = VoyageEmbedder()
\ No newline at end of file
+voyage_embedder = VoyageEmbedder(
+    cache=EmbeddingCache(
+        max_entries=EMBED_CACHE_SIZE,
+        ttl=EMBED_CACHE_TTL,
+        disk_path=EMBED_CACHE_PATH,
+        disk_max_entries=EMBED_CACHE_DISK_SIZE
+    ) if EMBED_CACHE_ENABLED else None,
+    batching=EMBED_BATCH_ENABLED
+)
@@ -0,0 +1,34 @@
+import threading
+from typing import Any, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class lazy_property(Generic[T]):
+    """Como functools.cached_property, pero con lock: el recurso se crea una sola vez, en el primer uso.
+
+    Se puede reemplazar asignando el atributo (obj.client = otro) y reiniciar con del obj.client.
+    """
+
+    def __init__(self, factory: Callable[[Any], T]):
+        self._factory = factory
+        self._name = factory.__name__
+        self._lock = threading.RLock()
+        self.__doc__ = factory.__doc__
+
+    def __set_name__(self, owner, name: str):
+        self._name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        # Sin __set__: una vez creado, el valor del __dict__ tiene prioridad y no se vuelve a pasar por aquí
+        with self._lock:
+            if self._name not in instance.__dict__:
+                instance.__dict__[self._name] = self._factory(instance)
+            return instance.__dict__[self._name]
+
+
+def is_loaded(instance, name: str) -> bool:
+    """True si el lazy_property ya se creó (para no abrir conexiones solo por consultarlo)."""
+    return name in instance.__dict__
@@ -0,0 +1,87 @@
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from config.config import LOG_LEVEL
+
+# Logging con niveles + spans por etapa (embed, vectorSearch, rerank, prompt, llm) + métricas Prometheus.
+# Los mensajes usan formato perezoso (logger.debug("... %s", x)): con el nivel desactivado no se formatea nada.
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds", "Duration of each RAG pipeline stage", ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+REQUEST_SECONDS = Histogram(
+    "rag_request_duration_seconds", "End-to-end RAG request duration", ["mode", "cache"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+)
+STAGE_ERRORS = Counter("rag_stage_errors_total", "Errors per RAG pipeline stage", ["stage", "error"])
+STAGE_ITEMS = Counter("rag_stage_items_total", "Items processed per stage (texts, documents, tokens)", ["stage"])
+DEGRADATIONS = Counter("rag_degradations_total", "Pipeline degradations taken to meet the request deadline", ["step"])
+PROMPT_TOKENS = Counter("rag_prompt_context_tokens_total", "Context tokens sent to the LLM and saved by packing", ["kind"])
+
+_current_trace: contextvars.ContextVar[Optional[List[Dict]]] = contextvars.ContextVar("rag_trace", default=None)
+_configured = False
+
+logger = logging.getLogger("rag.trace")
+
+
+def configure_logging(level: str = LOG_LEVEL):
+    """Configura el logging raíz una sola vez (lo llaman los puntos de entrada: app, asgi, scripts)."""
+    global _configured
+    if _configured:
+        return
+    logging.basicConfig(level=getattr(logging, level.upper(), logging.INFO), format=LOG_FORMAT)
+    _configured = True
+
+
+def record_error(stage: str, exc: BaseException):
+    STAGE_ERRORS.labels(stage, type(exc).__name__).inc()
+
+
+@contextmanager
+def span(stage: str, **attrs) -> Iterator[Dict]:
+    """Mide una etapa; el dict que entrega admite atributos (conteos, tamaños) durante la etapa."""
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except Exception as e:
+        attrs["error"] = type(e).__name__
+        record_error(stage, e)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(duration)
+        if "items" in attrs:
+            STAGE_ITEMS.labels(stage).inc(attrs["items"])
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append({"stage": stage, "duration_ms": round(duration * 1000, 3), **attrs})
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("span %s %.1fms %s", stage, duration * 1000, attrs)
+
+
+@contextmanager
+def trace_request(mode: str) -> Iterator[Dict]:
+    """Agrupa los spans de una pregunta; el dict entregado termina con "spans" y se puede marcar cache_hit."""
+    spans: List[Dict] = []
+    token = _current_trace.set(spans)
+    info = {"spans": spans, "cache_hit": False}
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # Un generador de streaming cerrado desde otro contexto
+            pass
+        REQUEST_SECONDS.labels(mode, "hit" if info["cache_hit"] else "miss").observe(time.perf_counter() - start)
+
+
+def metrics_payload() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,154 @@
+import logging
+from typing import Dict, List, Tuple
+from langchain.schema import Document
+from core.lazy import lazy_property
+
+logger = logging.getLogger(__name__)
+
+# Arma el contexto del prompt con un presupuesto de tokens:
+#   - chunks vecinos de la misma fuente (chunk_idx consecutivos) se unen en un solo bloque
+#   - el solapamiento del splitter (CHUNK_OVERLAP) entre vecinos se quita, y la línea (Source: ...) va una vez por bloque
+#   - los chunks entran en orden de rerank mientras quepan en el presupuesto
+
+
+def format_context(text: str, source: str) -> str:
+    return f"{text}\n(Source: {source})"
+
+
+def overlap_length(left: str, right: str, min_overlap: int = 16) -> int:
+    """Largo del sufijo de left que es prefijo de right (0 si es menor que min_overlap)."""
+    if len(right) < min_overlap or len(left) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    pos = left.find(probe, max(0, len(left) - len(right)))
+    while pos != -1:
+        # La primera coincidencia que sigue hasta el final de left es el solapamiento más largo
+        if right.startswith(left[pos:]):
+            return len(left) - pos
+        pos = left.find(probe, pos + 1)
+    return 0
+
+
+def _source(doc: Document) -> str:
+    return doc.metadata.get("source", "https://unknown-source")
+
+
+class ContextPacker:
+    def __init__(self, token_budget: int = 0, model: str = "gpt-4o", min_overlap: int = 16):
+        self.token_budget = token_budget
+        self.model = model
+        self.min_overlap = min_overlap
+
+    @lazy_property
+    def _encoding(self):
+        # tiktoken descarga el vocabulario la primera vez; sin él se estima con ~4 caracteres por token
+        try:
+            import tiktoken
+
+            return tiktoken.encoding_for_model(self.model)
+        except Exception as e:
+            logger.warning("tiktoken unavailable for %s (%s); estimating 4 characters per token", self.model, e)
+            return None
+
+    def count_tokens(self, text: str) -> int:
+        if self._encoding is None:
+            return (len(text) + 3) // 4
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is None:
+            return text[:max_tokens * 4]
+        return self._encoding.decode(self._encoding.encode(text, disallowed_special=())[:max_tokens])
+
+    def warmup(self):
+        self._encoding
+
+    # ─── Bloques por fuente ───
+    def _blocks(self, documents: List[Document], positions: List[int]) -> Tuple[List[Tuple[str, List[int]]], int]:
+        """Une corridas de chunk_idx consecutivos de una misma fuente; devuelve [(texto, posiciones)] y caracteres quitados."""
+        indexed = sorted((p for p in positions if documents[p].metadata.get("chunk_idx") is not None),
+                         key=lambda p: documents[p].metadata["chunk_idx"])
+        blocks: List[Tuple[str, List[int]]] = [(documents[p].page_content.strip(), [p])
+                                               for p in positions if documents[p].metadata.get("chunk_idx") is None]
+        removed = 0
+        text, members, last_idx = None, [], None
+        for p in indexed:
+            chunk = documents[p].page_content.strip()
+            idx = documents[p].metadata["chunk_idx"]
+            if text is not None and idx == last_idx:
+                continue  # mismo chunk dos veces
+            if text is not None and idx == last_idx + 1:
+                cut = overlap_length(text, chunk, self.min_overlap)
+                removed += cut
+                text = f"{text}{chunk[cut:]}" if cut else f"{text}\n{chunk}"
+                members.append(p)
+            else:
+                if text is not None:
+                    blocks.append((text, members))
+                text, members = chunk, [p]
+            last_idx = idx
+        if text is not None:
+            blocks.append((text, members))
+        return blocks, removed
+
+    def pack(self, documents: List[Document]) -> Tuple[List[Document], Dict]:
+        """Documentos del prompt (en orden de rerank) y estadísticas de tokens."""
+        count = self.count_tokens
+        doc_tokens = [count(format_context(d.page_content.strip(), _source(d))) for d in documents]
+
+        selected: Dict[str, List[int]] = {}
+        source_tokens: Dict[str, int] = {}
+        total = 0
+        dropped: List[int] = []
+        for pos, doc in enumerate(documents):
+            source = _source(doc)
+            candidate = selected.get(source, []) + [pos]
+            blocks, _ = self._blocks(documents, candidate)
+            tokens = sum(count(format_context(text, source)) for text, _ in blocks)
+            new_total = total - source_tokens.get(source, 0) + tokens
+            if self.token_budget and new_total > self.token_budget and total > 0:
+                dropped.append(pos)
+                continue
+            selected[source] = candidate
+            source_tokens[source] = tokens
+            total = new_total
+
+        packed: List[Tuple[int, Document]] = []
+        overlap_removed = 0
+        for source, positions in selected.items():
+            blocks, removed = self._blocks(documents, positions)
+            overlap_removed += removed
+            for text, members in blocks:
+                best = min(members)
+                metadata = dict(documents[best].metadata)
+                if len(members) > 1:
+                    metadata["packed_chunks"] = sorted(documents[p].metadata["chunk_idx"] for p in members)
+                packed.append((best, Document(page_content=text, metadata=metadata)))
+        packed.sort(key=lambda item: item[0])
+        result = [doc for _, doc in packed]
+
+        over_budget = sum(doc_tokens[p] for p in dropped)
+        if self.token_budget and total > self.token_budget and result:
+            # Ni el primer chunk cabe: se recorta para respetar el presupuesto
+            first = result[0]
+            source_line = count(format_context("", _source(first)))
+            result[0] = Document(page_content=self.truncate(first.page_content, self.token_budget - source_line),
+                                 metadata={**first.metadata, "truncated": True})
+            truncated = count(format_context(result[0].page_content, _source(first)))
+            over_budget += total - truncated
+            total = truncated
+
+        # saved: lo que ahorra unir vecinos y quitar solapamiento; over_budget: lo que no entró
+        stats = {
+            "context_tokens": total,
+            "context_tokens_saved": max(0, sum(doc_tokens) - over_budget - total),
+            "context_tokens_over_budget": over_budget,
+            "context_chunks": len(documents),
+            "context_blocks": len(result),
+            "context_chunks_dropped": len(dropped),
+            "context_overlap_chars_removed": overlap_removed,
+            "context_token_budget": self.token_budget
+        }
+        return result, stats
@@ -1,9 +1,14 @@
-from typing import List
-from langchain_openai import ChatOpenAI
+import logging
+from typing import Dict, List, Iterator, Optional
 from langchain.schema import Document
 from langchain.prompts import PromptTemplate
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from config.config import OPENAI_API_KEY, LLM_MODEL
+from config.config import OPENAI_API_KEY, LLM_MODEL, CONTEXT_PACKING_ENABLED, CONTEXT_TOKEN_BUDGET
+from core.observability import PROMPT_TOKENS, record_error, span
+from core.rag.context_packer import ContextPacker, format_context
+from core.lazy import lazy_property
+
+logger = logging.getLogger(__name__)
 
 RAG_PROMPT = PromptTemplate(
     input_variables=["context", "question"],
@@ -37,37 +42,134 @@ RAG_PROMPT = PromptTemplate(
 
 class RAGGenerator:
     def __init__(self):
-        self.llm = ChatOpenAI(
+        self.packer = ContextPacker(CONTEXT_TOKEN_BUDGET, model=LLM_MODEL) if CONTEXT_PACKING_ENABLED else None
+
+    # El cliente de OpenAI se crea en el primer uso (langchain_openai tarda ~2s en importarse)
+    @lazy_property
+    def llm(self):
+        from langchain_openai import ChatOpenAI
+
+        logger.debug("OpenAI client initialized with model: %s", LLM_MODEL)
+        return ChatOpenAI(
             model_name=LLM_MODEL,
             api_key=OPENAI_API_KEY,
             temperature=0.4
         )
-        print(f"[DEBUG] OpenAI client initialized with model: {LLM_MODEL}")
+
+    @lazy_property
+    def qa_chain(self):
+        return create_stuff_documents_chain(self.llm, RAG_PROMPT)
+
+    # Para llamadas con presupuesto: sin reintentos (un reintento no cabe en el plazo) y el timeout va por llamada
+    @lazy_property
+    def deadline_llm(self):
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(
+            model_name=LLM_MODEL,
+            api_key=OPENAI_API_KEY,
+            temperature=0.4,
+            max_retries=0
+        )
+
+    def _chain(self, timeout: Optional[float] = None):
+        """qa_chain; con timeout, la misma cadena con un timeout de httpx por petición: al agotarse el
+        presupuesto el cliente de OpenAI corta la llamada (o el stream que deja de mandar tokens)."""
+        if timeout is None:
+            return self.qa_chain
+        import httpx
+
+        llm = self.deadline_llm.bind(timeout=httpx.Timeout(max(timeout, 0.001)))
+        return create_stuff_documents_chain(llm, RAG_PROMPT)
+
+    def warmup(self):
+        self.qa_chain
+        if self.packer is not None:
+            self.packer.warmup()
     
-    def generate_answer(self, query: str, documents: List[Document]) -> str:
-        print(f"[INFO] Generating answer for query with {len(documents)} documents")
-        
+    def _prepare_documents(self, documents: List[Document], stats: Optional[Dict] = None) -> List[Document]:
         # Preparar documentos con fuentes
-        stuff_docs = [
-            Document(
-                page_content=f"{doc.page_content.strip()}\n(Source: {doc.metadata.get('source', 'https://unknown-source')})",
-                metadata=doc.metadata
-            )
-            for doc in documents
-        ]
-        try:
-            qa_chain = create_stuff_documents_chain(self.llm, RAG_PROMPT)
-            final_answer = qa_chain.invoke({
-                "context": stuff_docs,
-                "question": query
-            })
-            print(stuff_docs)
-            print(f"[DEBUG] Answer generated successfully, length: {len(final_answer)} characters")
-            
-            return final_answer
-        except Exception as e:
-            print(f"[QA ERROR] Chain invocation failed: {e}")
-            return "Error generating answer"
+        with span("prompt_build", items=len(documents)) as attrs:
+            if self.packer is not None:
+                documents, pack_stats = self.packer.pack(documents)
+                attrs.update(tokens=pack_stats["context_tokens"], tokens_saved=pack_stats["context_tokens_saved"],
+                             blocks=pack_stats["context_blocks"], dropped=pack_stats["context_chunks_dropped"])
+                PROMPT_TOKENS.labels("sent").inc(pack_stats["context_tokens"])
+                PROMPT_TOKENS.labels("saved").inc(pack_stats["context_tokens_saved"])
+                if stats is not None:
+                    stats.update(pack_stats)
+            stuff_docs = [
+                Document(
+                    page_content=format_context(doc.page_content.strip(), doc.metadata.get('source', 'https://unknown-source')),
+                    metadata=doc.metadata
+                )
+                for doc in documents
+            ]
+            attrs["context_chars"] = sum(len(doc.page_content) for doc in stuff_docs)
+        return stuff_docs
+
+    def generate_answer(self, query: str, documents: List[Document], stats: Optional[Dict] = None,
+                        timeout: Optional[float] = None) -> str:
+        logger.debug("Generating answer for query with %s documents", len(documents))
+        
+        stuff_docs = self._prepare_documents(documents, stats)
+        with span("llm", model=LLM_MODEL, documents=len(documents)) as attrs:
+            try:
+                final_answer = self._chain(timeout).invoke({
+                    "context": stuff_docs,
+                    "question": query
+                })
+                attrs["answer_chars"] = len(final_answer)
+                return final_answer
+            except Exception as e:
+                record_error("llm", e)
+                logger.error("QA chain invocation failed: %s", e)
+                if stats is not None:
+                    stats["llm_error"] = True
+                return "Error generating answer"
+
+    def stream_answer(self, query: str, documents: List[Document], stats: Optional[Dict] = None,
+                      timeout: Optional[float] = None) -> Iterator[str]:
+        logger.debug("Streaming answer for query with %s documents", len(documents))
+
+        stuff_docs = self._prepare_documents(documents, stats)
+        with span("llm", model=LLM_MODEL, documents=len(documents), streaming=True) as attrs:
+            chunks = 0
+            try:
+                for token in self._chain(timeout).stream({
+                    "context": stuff_docs,
+                    "question": query
+                }):
+                    if token:
+                        chunks += 1
+                        yield token
+            except Exception as e:
+                record_error("llm", e)
+                logger.error("QA chain streaming failed: %s", e)
+                # El fallo puede llegar después de algunos tokens: quien guarda la respuesta mira el flag, no el texto
+                if stats is not None:
+                    stats["llm_error"] = True
+                yield "Error generating answer"
+            attrs["items"] = chunks
+
+    async def agenerate_answer(self, query: str, documents: List[Document], stats: Optional[Dict] = None) -> str:
+        logger.debug("Generating answer (async) for query with %s documents", len(documents))
+
+        stuff_docs = self._prepare_documents(documents, stats)
+        with span("llm", model=LLM_MODEL, documents=len(documents)) as attrs:
+            try:
+                final_answer = await self.qa_chain.ainvoke({
+                    "context": stuff_docs,
+                    "question": query
+                })
+                attrs["answer_chars"] = len(final_answer)
+                return final_answer
+            except Exception as e:
+                record_error("llm", e)
+                logger.error("QA chain invocation failed: %s", e)
+                if stats is not None:
+                    stats["llm_error"] = True
+                return "Error generating answer"
 
 # Instancia global
-rag_generator = RAGGenerator()
\ No newline at end of file
+rag_generator = RAGGenerator()
@@ -0,0 +1,40 @@
+from typing import List, Sequence, Tuple
+import numpy as np
+
+# Rerank local, sin red: coseno exacto entre la pregunta y el embedding guardado de cada candidato,
+# y Maximal Marginal Relevance para no llenar el contexto con chunks casi iguales:
+#   mmr(d) = λ · cos(q, d) − (1 − λ) · max cos(d, elegidos)
+# Un candidato con coseno >= duplicate_threshold contra uno ya elegido se descarta directamente.
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_rerank(query_vector: Sequence[float], vectors: np.ndarray, top_k: int, lambda_mult: float = 0.7,
+               duplicate_threshold: float = 0.97) -> Tuple[List[Tuple[int, float]], int]:
+    """[(índice, coseno con la pregunta)] en orden MMR y cuántos candidatos se descartaron por duplicados."""
+    n = len(vectors)
+    if n == 0 or top_k <= 0:
+        return [], 0
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+    docs = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+    relevance = docs @ query
+
+    available = np.ones(n, dtype=bool)
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    chosen: List[int] = []
+    dropped = 0
+    while len(chosen) < top_k and available.any():
+        scores = relevance if not chosen else lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        i = int(np.argmax(np.where(available, scores, -np.inf)))
+        chosen.append(i)
+        available[i] = False
+        similarity = docs @ docs[i]
+        np.maximum(redundancy, similarity, out=redundancy)
+        duplicates = available & (similarity >= duplicate_threshold)
+        dropped += int(duplicates.sum())
+        available &= ~duplicates
+    return [(i, float(relevance[i])) for i in chosen], dropped
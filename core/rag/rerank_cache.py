@@ -0,0 +1,62 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional
+from core.embeddings.cache import normalize_text
+
+def query_hash(query: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_text(query)}".encode("utf-8")).hexdigest()
+
+class RerankCache:
+    """(hash de la pregunta, _id del chunk) → relevance_score, LRU con TTL."""
+
+    def __init__(self, max_entries: int = 100000, ttl: Optional[float] = 86400, model: str = "rerank-2"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.model = model
+        self._entries: "OrderedDict[tuple, tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, query: str, chunk_ids: Iterable[Hashable]) -> Dict[Hashable, float]:
+        qh = query_hash(query, self.model)
+        now = time.time()
+        found = {}
+        with self._lock:
+            for chunk_id in chunk_ids:
+                key = (qh, chunk_id)
+                entry = self._entries.get(key)
+                if entry is not None and (self.ttl is None or now - entry[0] <= self.ttl):
+                    self._entries.move_to_end(key)
+                    found[chunk_id] = entry[1]
+                    self.hits += 1
+                else:
+                    if entry is not None:
+                        del self._entries[key]
+                    self.misses += 1
+        return found
+
+    def put_many(self, query: str, scores: Dict[Hashable, float]):
+        qh = query_hash(query, self.model)
+        now = time.time()
+        with self._lock:
+            for chunk_id, score in scores.items():
+                self._entries[(qh, chunk_id)] = (now, score)
+                self._entries.move_to_end((qh, chunk_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
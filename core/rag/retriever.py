@@ -1,57 +1,326 @@
-from typing import List, Tuple
+import logging
+from typing import Any, Dict, Generator, List, Optional, Tuple
 from langchain.schema import Document
 from core.embeddings.voyage_embedder import voyage_embedder
 from core.search.vector_search import vector_search
+from core.rag.rerank_cache import RerankCache
+from core.rag.local_rerank import mmr_rerank
+from core.deadline import Deadline, DeadlineExceeded
+from core.observability import span
+from config.config import (
+    RERANK_MODE,
+    RERANK_LOCAL_FALLBACK,
+    RERANK_MMR_LAMBDA,
+    RERANK_DUPLICATE_THRESHOLD,
+    RERANK_CACHE_ENABLED,
+    RERANK_CACHE_SIZE,
+    RERANK_CACHE_TTL,
+    RERANK_ADAPTIVE,
+    RERANK_MIN_CANDIDATES,
+    RERANK_SCORE_MARGIN,
+    RERANK_GAP_THRESHOLD
+)
+
+logger = logging.getLogger(__name__)
 
 class RAGRetriever:
     def __init__(self):
         self.embedder = voyage_embedder
         self.search_engine = vector_search
-    
-    def retrieve_documents(self, query: str, context_k: int, ann_k: int = 100) -> Tuple[List[Document], str, str]:
+        self.rerank_cache = RerankCache(RERANK_CACHE_SIZE, RERANK_CACHE_TTL) if RERANK_CACHE_ENABLED else None
+        self.adaptive_rerank = RERANK_ADAPTIVE
+        # voyage: rerank-2 remoto; local: coseno exacto sobre el embedding guardado + MMR
+        self.rerank_mode = RERANK_MODE
+        self.local_fallback = RERANK_LOCAL_FALLBACK
+        self.mmr_lambda = RERANK_MMR_LAMBDA
+        self.duplicate_threshold = RERANK_DUPLICATE_THRESHOLD
+
+    def embed_query(self, query: str, deadline: Optional[Deadline] = None) -> Optional[List[float]]:
+        """Vector de la pregunta dentro del presupuesto de embed; None si falla o no llega a tiempo."""
+        deadline = deadline or Deadline()
+        try:
+            return deadline.run("embed", self.embedder.embed_text, query)
+        except DeadlineExceeded:
+            deadline.degrade("no_results", "embed")
+            return None
+
+    async def aembed_query(self, query: str, deadline: Optional[Deadline] = None) -> Optional[List[float]]:
+        deadline = deadline or Deadline()
+        try:
+            return await deadline.arun("embed", self.embedder.aembed_text(query))
+        except DeadlineExceeded:
+            deadline.degrade("no_results", "embed")
+            return None
 
-        print(f"[INFO] Starting RAG retrieval for query: '{query}'")
-        q_vec = self.embedder.embed_text(query)
+    def retrieve_documents(self, query: str, context_k: int, ann_k: int = 100,
+                           query_vector: Optional[List[float]] = None,
+                           stats: Optional[Dict] = None, filters: Optional[Dict] = None,
+                           deadline: Optional[Deadline] = None,
+                           rerank_mode: Optional[str] = None) -> Tuple[List[Document], str, str]:
+
+        logger.debug("Starting RAG retrieval for query: '%s'", query)
+        deadline = deadline or Deadline()
+        q_vec = query_vector if query_vector is not None else self.embed_query(query, deadline)
         if q_vec is None:
-            print("[ERROR] Failed to generate embedding for the query")
+            logger.error("Failed to generate embedding for the query")
             return [], "Embedding error", ""
-        
-        results = self.search_engine.search(q_vec, limit=ann_k)
-        
+
+        mode = rerank_mode or self.rerank_mode
+        with deadline.mongo("search"):
+            results = self.search_engine.search(q_vec, limit=ann_k, filters=filters, query=query,
+                                                with_embeddings=mode == "local")
+        self._check_search(results, deadline)
+
         docs = self.search_engine.results_to_documents(results)
-        
+        before = self._format_before(docs)
+
+        top_docs = self._rerank_documents(query, docs, context_k, stats, deadline,
+                                          query_vector=q_vec, search_results=results, mode=mode)
+        after = self._format_after(top_docs)
+
+        return top_docs, before, after
+
+    async def aretrieve_documents(self, query: str, context_k: int, ann_k: int = 100,
+                                  query_vector: Optional[List[float]] = None,
+                                  stats: Optional[Dict] = None, filters: Optional[Dict] = None,
+                                  deadline: Optional[Deadline] = None,
+                                  rerank_mode: Optional[str] = None) -> Tuple[List[Document], str, str]:
+
+        logger.debug("Starting async RAG retrieval for query: '%s'", query)
+        deadline = deadline or Deadline()
+        q_vec = query_vector if query_vector is not None else await self.aembed_query(query, deadline)
+        if q_vec is None:
+            logger.error("Failed to generate embedding for the query")
+            return [], "Embedding error", ""
+
+        mode = rerank_mode or self.rerank_mode
+        with deadline.mongo("search"):
+            search_results = await self.search_engine.asearch(q_vec, limit=ann_k, filters=filters, query=query,
+                                                              with_embeddings=mode == "local")
+        self._check_search(search_results, deadline)
+
+        docs = self.search_engine.results_to_documents(search_results)
+        before = self._format_before(docs)
+
+        top_docs = await self._arerank_documents(query, docs, context_k, stats, deadline,
+                                                 query_vector=q_vec, search_results=search_results, mode=mode)
+        after = self._format_after(top_docs)
+
+        return top_docs, before, after
+
+    def _check_search(self, results: List[Dict], deadline: Deadline):
+        # La búsqueda se tragó el timeout de pymongo: sin resultados por falta de tiempo
+        if not results and "search" in deadline.timed_out:
+            deadline.degrade("no_results", "search")
+
+    def _can_rerank(self, deadline: Deadline) -> bool:
+        if deadline.can_run("rerank"):
+            return True
+        deadline.degrade("skip_rerank", "rerank", reason="no budget")
+        return False
+
+    def _format_before(self, docs: List[Document]) -> str:
         before = "\n".join(
             f"{i+1}. {d.metadata['source']} | {d.metadata['score']:.4f} | _id:{d.metadata['id']}"
             for i, d in enumerate(docs[:10])
         )
-        print(f"[INFO] Top 10 documents BEFORE rerank:\n{before or '(no results)'}")
-        
-        top_docs = self._rerank_documents(query, docs, context_k)
-        
+        logger.debug("Top 10 documents BEFORE rerank:\n%s", before or '(no results)')
+        return before
+
+    def _format_after(self, top_docs: List[Document]) -> str:
         after = "\n".join(
-            f"{i+1}. {d.metadata['source']} | {d.metadata['rerank_score']:.4f} | was:{d.metadata['original_position']} | _id:{d.metadata['id']}"
+            f"{i+1}. {d.metadata['source']} | {self._format_score(d.metadata['rerank_score'])} | was:{d.metadata['original_position']} | _id:{d.metadata['id']}"
             for i, d in enumerate(top_docs[:10])
         )
-        print(f"[INFO] Top 10 documents AFTER rerank:\n{after or '(no results)'}")
-        
-        return top_docs, before, after
-    
-    def _rerank_documents(self, query: str, docs: List[Document], top_k: int) -> List[Document]:
+        logger.debug("Top 10 documents AFTER rerank:\n%s", after or '(no results)')
+        return after
+
+    def _format_score(self, score: Optional[float]) -> str:
+        # Sin score de rerank cuando se quedó el orden de la búsqueda
+        return "-" if score is None else f"{score:.4f}"
+
+    # ─── Rerank: los pasos son los mismos en sync y async; solo cambia cómo se hacen las llamadas ───
+    def _rerank_steps(self, query: str, docs: List[Document], top_k: int, stats: Optional[Dict],
+                      deadline: Deadline, mode: str) -> Generator[tuple, Any, List[Document]]:
+        """Entrega ("local", fallback) o ("voyage", textos, k) cuando necesita una llamada, recibe su resultado
+        (vacío/None si no se pudo) y termina devolviendo los documentos rerankeados."""
+        if mode == "local":
+            top_docs = yield ("local", False)
+            if top_docs:
+                return top_docs
+        candidates, scores, missing = self._prepare_rerank(query, docs, top_k)
+        if missing:
+            results = None
+            if mode == "voyage" and self._can_rerank(deadline):
+                results = yield ("voyage", [candidates[i].page_content for i in missing], self._rerank_request_k(missing, top_k))
+            if results is None and mode == "voyage" and self.local_fallback:
+                # rerank-2 falló o no llegó a tiempo: coseno + MMR en vez del orden de la búsqueda
+                top_docs = yield ("local", True)
+                if top_docs:
+                    return top_docs
+            scores = self._merge_rerank(query, candidates, scores, missing, results)
+        return self._finish_rerank(query, docs, candidates, scores, missing, top_k, stats)
+
+    def _rerank_failed(self, deadline: Deadline, error: Exception) -> None:
+        if isinstance(error, DeadlineExceeded):
+            deadline.degrade("skip_rerank", "rerank", reason="timeout")
+        else:
+            logger.error("Rerank error: %s", error)
+
+    def _rerank_documents(self, query: str, docs: List[Document], top_k: int, stats: Optional[Dict] = None,
+                          deadline: Optional[Deadline] = None, query_vector: Optional[List[float]] = None,
+                          search_results: Optional[List[Dict]] = None, mode: str = "voyage") -> List[Document]:
         if not docs:
             return []
-        
-        document_texts = [d.page_content for d in docs]
-        rerank_results = self.embedder.rerank(query, document_texts, top_k)
+        deadline = deadline or Deadline()
+        steps, result = self._rerank_steps(query, docs, top_k, stats, deadline, mode), None
+        while True:
+            try:
+                call = steps.send(result)
+            except StopIteration as done:
+                return done.value
+            if call[0] == "local":
+                result = self._local_rerank(query, docs, top_k, stats, query_vector, search_results, fallback=call[1])
+                continue
+            try:
+                result = deadline.run("rerank", self.embedder.rerank, query, call[1], call[2])
+            except Exception as e:
+                result = self._rerank_failed(deadline, e)
+
+    async def _arerank_documents(self, query: str, docs: List[Document], top_k: int, stats: Optional[Dict] = None,
+                                 deadline: Optional[Deadline] = None, query_vector: Optional[List[float]] = None,
+                                 search_results: Optional[List[Dict]] = None, mode: str = "voyage") -> List[Document]:
+        if not docs:
+            return []
+        deadline = deadline or Deadline()
+        steps, result = self._rerank_steps(query, docs, top_k, stats, deadline, mode), None
+        while True:
+            try:
+                call = steps.send(result)
+            except StopIteration as done:
+                return done.value
+            if call[0] == "local":
+                result = await self._alocal_rerank(query, docs, top_k, stats, query_vector, search_results, fallback=call[1])
+                continue
+            try:
+                result = await deadline.arun("rerank", self.embedder.arerank(query, call[1], call[2]))
+            except Exception as e:
+                result = self._rerank_failed(deadline, e)
+
+    # ─── Rerank local: coseno exacto + MMR sobre los embeddings guardados ───
+    def _local_rerank(self, query: str, docs: List[Document], top_k: int, stats: Optional[Dict],
+                      query_vector: Optional[List[float]], search_results: Optional[List[Dict]],
+                      fallback: bool = False) -> List[Document]:
+        """Vacío si no se puede (sin vector de la pregunta o sin embeddings): el llamador usa el orden de la búsqueda."""
+        if query_vector is None or not search_results:
+            return []
+        candidates = self._select_candidates(docs, top_k) if self.adaptive_rerank else docs
+        try:
+            vectors = self.search_engine.result_vectors(search_results[:len(candidates)])
+        except Exception as e:
+            logger.error("Local rerank could not load embeddings: %s", e)
+            return []
+        return self._mmr(query, docs, candidates, query_vector, vectors, top_k, stats, fallback)
+
+    async def _alocal_rerank(self, query: str, docs: List[Document], top_k: int, stats: Optional[Dict],
+                             query_vector: Optional[List[float]], search_results: Optional[List[Dict]],
+                             fallback: bool = False) -> List[Document]:
+        if query_vector is None or not search_results:
+            return []
+        candidates = self._select_candidates(docs, top_k) if self.adaptive_rerank else docs
+        try:
+            vectors = await self.search_engine.aresult_vectors(search_results[:len(candidates)])
+        except Exception as e:
+            logger.error("Local rerank could not load embeddings: %s", e)
+            return []
+        return self._mmr(query, docs, candidates, query_vector, vectors, top_k, stats, fallback)
+
+    def _mmr(self, query: str, docs: List[Document], candidates: List[Document], query_vector: List[float],
+             vectors, top_k: int, stats: Optional[Dict], fallback: bool) -> List[Document]:
+        with span("rerank", mode="local", items=len(candidates), top_k=top_k, fallback=fallback) as attrs:
+            ranked, dropped = mmr_rerank(query_vector, vectors, top_k, self.mmr_lambda, self.duplicate_threshold)
+            attrs["duplicates_dropped"] = dropped
+        if stats is not None:
+            stats["rerank_mode"] = "local"
+            stats["rerank_fallback"] = fallback
+            stats["rerank_candidates"] = len(docs)
+            stats["rerank_considered"] = len(candidates)
+            stats["rerank_sent"] = 0
+            stats["rerank_cache_hits"] = 0
+            stats["rerank_duplicates_dropped"] = dropped
+        logger.debug("Local rerank: %s considered, %s near-duplicates dropped", len(candidates), dropped)
+        return self._apply_rerank(query, candidates, ranked)
+
+    def _select_candidates(self, docs: List[Document], top_k: int) -> List[Document]:
+        # Corta la cola cuando los vectorSearchScore muestran que ya no es relevante
+        n = min(len(docs), max(top_k, RERANK_MIN_CANDIDATES))
+        if self.search_engine.mode == "hybrid":
+            # Los scores RRF no están en la escala de los márgenes: solo se aplica el piso
+            return docs[:n]
+        best = docs[0].metadata["score"]
+        while n < len(docs):
+            score = docs[n].metadata["score"]
+            if best - score > RERANK_SCORE_MARGIN:
+                break
+            if docs[n - 1].metadata["score"] - score > RERANK_GAP_THRESHOLD:
+                break
+            n += 1
+        return docs[:n]
+
+    def _prepare_rerank(self, query: str, docs: List[Document], top_k: int) -> Tuple[List[Document], Dict[int, float], List[int]]:
+        candidates = self._select_candidates(docs, top_k) if self.adaptive_rerank else docs
+        scores: Dict[int, float] = {}
+        if self.rerank_cache is not None:
+            cached = self.rerank_cache.get_many(query, [d.metadata["id"] for d in candidates])
+            scores = {i: cached[d.metadata["id"]] for i, d in enumerate(candidates) if d.metadata["id"] in cached}
+        missing = [i for i in range(len(candidates)) if i not in scores]
+        return candidates, scores, missing
+
+    def _rerank_request_k(self, missing: List[int], top_k: int) -> int:
+        # Con cache hacen falta los scores de todos los enviados para mezclarlos con los cacheados
+        return len(missing) if self.rerank_cache is not None else top_k
+
+    def _merge_rerank(self, query: str, candidates: List[Document], scores: Dict[int, float],
+                      missing: List[int], results: Optional[List[Tuple[int, float]]]) -> Optional[Dict[int, float]]:
+        if results is None:
+            # Sin scores de rerank-2 para los que faltan: no se mezclan con los cacheados (orden de la búsqueda)
+            return None
+        fresh = {missing[j]: score for j, score in results}
+        scores.update(fresh)
+        if self.rerank_cache is not None:
+            self.rerank_cache.put_many(query, {candidates[i].metadata["id"]: score for i, score in fresh.items()})
+        return scores
+
+    def _finish_rerank(self, query: str, docs: List[Document], candidates: List[Document], scores: Optional[Dict[int, float]],
+                       missing: List[int], top_k: int, stats: Optional[Dict]) -> List[Document]:
+        if scores is None:
+            # Fallback: orden de la búsqueda vectorial; sin rerank_score (el de la búsqueda sigue en "score")
+            ranked = [(i, None) for i in range(min(top_k, len(candidates)))]
+        else:
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        # Solo cuentan como enviados los de una llamada a rerank-2 que devolvió scores
+        sent = len(missing) if scores is not None else 0
+        if stats is not None:
+            stats["rerank_mode"] = "voyage"
+            stats["rerank_fallback"] = scores is None
+            stats["rerank_candidates"] = len(docs)
+            stats["rerank_considered"] = len(candidates)
+            stats["rerank_sent"] = sent
+            stats["rerank_cache_hits"] = len(candidates) - len(missing)
+        logger.debug("Rerank: %s candidates, %s considered, %s sent to Voyage", len(docs), len(candidates), sent)
+        return self._apply_rerank(query, candidates, ranked)
+
+    def _apply_rerank(self, query: str, docs: List[Document], rerank_results: List[Tuple[int, Optional[float]]]) -> List[Document]:
         reranked_docs = []
-        
+
         for index, relevance_score in rerank_results:
             doc = docs[index]
             doc.metadata['rerank_score']= relevance_score
             doc.metadata['rerank_query'] = query
             doc.metadata['original_position']= index + 1
             reranked_docs.append(doc)
-        
+
         return reranked_docs
 
 # Instancia global
-rag_retriever = RAGRetriever()
\ No newline at end of file
+rag_retriever = RAGRetriever()
@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from core.database import db_manager
+from core.collection_stats import collection_stats
+from core.lazy import lazy_property
+from core.search.filters import filters_key
+from config.config import (
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_SIZE,
+    SEMANTIC_CACHE_TTL,
+    SEMANTIC_CACHE_CHECK_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+class SemanticCache:
+    """Cache de respuestas por similitud de embedding de la pregunta."""
+
+    def __init__(self, collection=None, threshold: float = 0.95, max_entries: int = 1000, ttl: Optional[float] = 3600,
+                 check_interval: float = 30, version_fn: Optional[Callable[[], Any]] = None):
+        if collection is not None:
+            self.collection = collection
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.check_interval = check_interval
+        # Firma barata de la colección: si cambia, se invalida todo. La generación cambia con cada escritura
+        # de los ingesters (también re-ingestas con el mismo conteo); el conteo cubre borrados hechos a mano
+        self.version_fn = version_fn or (
+            lambda: (collection_stats.generation(), self.collection.estimated_document_count())
+        )
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[int] = []
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale = 0
+
+    @lazy_property
+    def collection(self):
+        # Por defecto la colección global, resuelta en el primer uso
+        return db_manager.collection
+
+    def _check_version(self):
+        # Las consultas a MongoDB van fuera del lock: bajo el lock solo se compara y se cambia la versión
+        now = time.time()
+        with self._lock:
+            if now - self._version_checked_at < self.check_interval:
+                return
+            self._version_checked_at = now
+        try:
+            version = self.version_fn()
+        except Exception as e:
+            logger.warning("Semantic cache could not read collection version: %s", e)
+            return
+        with self._lock:
+            if self._version is not None and version != self._version:
+                logger.info("Collection changed; invalidating semantic cache")
+                self._clear()
+            self._version = version
+
+    def _rebuild_matrix(self):
+        self._matrix_keys = list(self._entries.keys())
+        self._matrix = np.stack([self._entries[k]["vector"] for k in self._matrix_keys]) if self._matrix_keys else None
+
+    def _docs_exist(self, doc_ids: List) -> bool:
+        try:
+            return self.collection.count_documents({"_id": {"$in": doc_ids}}) == len(doc_ids)
+        except Exception as e:
+            logger.warning("Semantic cache could not verify cited chunks: %s", e)
+            return False
+
+    def lookup(self, query_vector: List[float], context_k: int, ann_k: int, filters: Optional[Dict] = None,
+               rerank_mode: Optional[str] = None) -> Optional[Dict]:
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        now = time.time()
+        key = filters_key(filters)
+
+        self._check_version()
+        with self._lock:
+            if self._matrix is None and self._entries:
+                self._rebuild_matrix()
+            if self._matrix is None:
+                self.misses += 1
+                return None
+
+            similarities = self._matrix @ query
+            best_key, best_entry, best_sim = None, None, -1.0
+            for i in np.argsort(-similarities):
+                sim = float(similarities[i])
+                if sim < self.threshold:
+                    break
+                entry = self._entries.get(self._matrix_keys[i])
+                if entry is None or entry["context_k"] != context_k or entry["ann_k"] != ann_k or entry["filters"] != key:
+                    continue
+                if entry["rerank_mode"] != rerank_mode:
+                    # Otro reranker elige otras fuentes
+                    continue
+                if self.ttl is not None and now - entry["created"] > self.ttl:
+                    continue
+                best_key, best_entry, best_sim = self._matrix_keys[i], entry, sim
+                break
+
+        if best_entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Las fuentes citadas deben seguir existiendo
+        if not self._docs_exist(best_entry["doc_ids"]):
+            with self._lock:
+                self._drop(best_key)
+                self.stale += 1
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if best_key in self._entries:
+                self._entries.move_to_end(best_key)
+            self.hits += 1
+        return {**best_entry, "similarity": best_sim}
+
+    def store(self, query: str, query_vector: List[float], context_k: int, ann_k: int,
+              doc_ids: List, answer: str, before: str, after: str, filters: Optional[Dict] = None,
+              rerank_mode: Optional[str] = None):
+        vector = np.asarray(query_vector, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = {
+                "query": query,
+                "vector": vector,
+                "context_k": context_k,
+                "ann_k": ann_k,
+                "filters": filters_key(filters),
+                "rerank_mode": rerank_mode,
+                "doc_ids": list(doc_ids),
+                "answer": answer,
+                "before": before,
+                "after": after,
+                "created": time.time()
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def _drop(self, key: int):
+        if self._entries.pop(key, None) is not None:
+            self._matrix = None
+
+    def _clear(self):
+        self._entries.clear()
+        self._matrix = None
+        self.invalidations += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "stale": self.stale,
+            "invalidations": self.invalidations,
+            "threshold": self.threshold
+        }
+
+# Instancia global
+semantic_cache = SemanticCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    max_entries=SEMANTIC_CACHE_SIZE,
+    ttl=SEMANTIC_CACHE_TTL,
+    check_interval=SEMANTIC_CACHE_CHECK_INTERVAL
+) if SEMANTIC_CACHE_ENABLED else None
@@ -0,0 +1,155 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional
+import numpy as np
+
+# Filtros de búsqueda sobre los campos declarados como "filter" en el índice vectorial.
+# Se escriben en MQL (el subconjunto que acepta $vectorSearch.filter) y se traducen para $search
+# y para los backends en memoria (índice local, bench), así los tres filtran igual.
+
+FILTER_FIELDS = ("type", "source", "username", "ts")
+RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+SUPPORTED_OPERATORS = ("$eq", "$ne", "$in", "$nin") + RANGE_OPERATORS
+
+
+def build_filters(source_type: Optional[str] = None, sources: Optional[List[str]] = None,
+                  username: Optional[str] = None, since: Optional[int] = None,
+                  until: Optional[int] = None) -> Optional[Dict]:
+    """Arma el filtro a partir de los parámetros de la request (None = sin filtro)."""
+    filters: Dict[str, Any] = {}
+    if source_type:
+        filters["type"] = source_type
+    if sources:
+        filters["source"] = sources[0] if len(sources) == 1 else {"$in": list(sources)}
+    if username:
+        filters["username"] = username
+    ts: Dict[str, int] = {}
+    if since is not None:
+        ts["$gte"] = int(since)
+    if until is not None:
+        ts["$lte"] = int(until)
+    if ts:
+        filters["ts"] = ts
+    return filters or None
+
+
+def _date_ts(value: Optional[str], end_of_day: bool = False) -> Optional[int]:
+    if not value:
+        return None
+    ts = int(datetime.strptime(value.strip(), "%Y-%m-%d").timestamp())
+    return ts + 86399 if end_of_day else ts
+
+
+def filters_from_params(params: Mapping[str, str]) -> Optional[Dict]:
+    """Filtros desde un formulario o query string: source_type, source (separadas por coma),
+    username, since/until (YYYY-MM-DD, se comparan contra ts de ingesta)."""
+    sources = [s.strip() for s in (params.get("source") or "").split(",") if s.strip()]
+    return build_filters(
+        source_type=(params.get("source_type") or "").strip() or None,
+        sources=sources or None,
+        username=(params.get("username") or "").strip() or None,
+        since=_date_ts(params.get("since")),
+        until=_date_ts(params.get("until"), end_of_day=True)
+    )
+
+
+def _conditions(value: Any) -> Dict[str, Any]:
+    return value if isinstance(value, dict) else {"$eq": value}
+
+
+def validate_filters(filters: Optional[Dict]) -> Optional[Dict]:
+    """Rechaza campos que no están en el índice y operadores que $vectorSearch no acepta."""
+    if not filters:
+        return None
+    for field, value in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unsupported filter field '{field}'; allowed: {', '.join(FILTER_FIELDS)}")
+        for op, operand in _conditions(value).items():
+            if op not in SUPPORTED_OPERATORS:
+                raise ValueError(f"Unsupported filter operator '{op}' on '{field}'")
+            if op in ("$in", "$nin") and not isinstance(operand, (list, tuple)):
+                raise ValueError(f"'{op}' on '{field}' needs a list")
+    return filters
+
+
+def filters_key(filters: Optional[Dict]) -> str:
+    # Forma canónica para comparar filtros (cache semántico)
+    return json.dumps(filters or {}, sort_keys=True, default=str)
+
+
+def matches(doc: Dict, filters: Optional[Dict]) -> bool:
+    if not filters:
+        return True
+    for field, value in filters.items():
+        actual = doc.get(field)
+        for op, operand in _conditions(value).items():
+            if op == "$eq" and actual != operand:
+                return False
+            if op == "$ne" and actual == operand:
+                return False
+            if op == "$in" and actual not in operand:
+                return False
+            if op == "$nin" and actual in operand:
+                return False
+            if op in RANGE_OPERATORS:
+                if actual is None:
+                    return False
+                if (op == "$gt" and not actual > operand) or (op == "$gte" and not actual >= operand) \
+                        or (op == "$lt" and not actual < operand) or (op == "$lte" and not actual <= operand):
+                    return False
+    return True
+
+
+def column_mask(columns: Dict[str, np.ndarray], filters: Optional[Dict], size: int) -> Optional[np.ndarray]:
+    """Máscara booleana vectorizada sobre columnas (una por campo de filtro); None = sin filtro."""
+    if not filters:
+        return None
+    mask = np.ones(size, dtype=bool)
+    for field, value in filters.items():
+        column = columns.get(field)
+        if column is None:
+            return np.zeros(size, dtype=bool)
+        for op, operand in _conditions(value).items():
+            if op == "$eq":
+                mask &= column == operand
+            elif op == "$ne":
+                mask &= column != operand
+            elif op in ("$in", "$nin"):
+                hit = np.isin(column, np.asarray(list(operand), dtype=column.dtype))
+                mask &= hit if op == "$in" else ~hit
+            else:
+                # Rangos solo sobre columnas numéricas; NaN (campo ausente) nunca cumple
+                compare = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}[op]
+                mask &= compare(column, operand) if column.dtype.kind == "f" else False
+    return mask
+
+
+def filter_columns(docs: List[Dict]) -> Dict[str, np.ndarray]:
+    """Columnas para column_mask: ts como float (NaN si falta), el resto como objetos."""
+    columns = {}
+    for field in FILTER_FIELDS:
+        values = [doc.get(field) for doc in docs]
+        if field == "ts":
+            columns[field] = np.asarray([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+        else:
+            columns[field] = np.asarray(values, dtype=object)
+    return columns
+
+
+def to_search_filter(filters: Optional[Dict]) -> List[Dict]:
+    """Traduce el filtro MQL a cláusulas compound.filter de Atlas Search ($search)."""
+    clauses: List[Dict] = []
+    for field, value in (filters or {}).items():
+        conditions = _conditions(value)
+        bounds = {op[1:]: operand for op, operand in conditions.items() if op in RANGE_OPERATORS}
+        if bounds:
+            clauses.append({"range": {"path": field, **bounds}})
+        for op, operand in conditions.items():
+            if op == "$eq":
+                clauses.append({"equals": {"path": field, "value": operand}})
+            elif op == "$in":
+                clauses.append({"in": {"path": field, "value": list(operand)}})
+            elif op in ("$ne", "$nin"):
+                values = [operand] if op == "$ne" else list(operand)
+                clauses.append({"compound": {"mustNot": [{"in": {"path": field, "value": values}}]}})
+    return clauses
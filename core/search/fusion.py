@@ -0,0 +1,26 @@
+from typing import Any, Dict, List, Optional
+
+# Reciprocal rank fusion: score = Σ peso / (k + rank). Solo usa posiciones, así que mezcla
+# vectorSearchScore y searchScore (BM25) sin tener que normalizar escalas.
+
+
+def reciprocal_rank_fusion(ranked: Dict[str, List[Dict]], weights: Optional[Dict[str, float]] = None,
+                           k: int = 60, limit: Optional[int] = None) -> List[Dict]:
+    weights = weights or {}
+    fused: Dict[Any, Dict] = {}
+    for name, results in ranked.items():
+        weight = weights.get(name, 1.0)
+        if weight <= 0:
+            continue
+        for rank, result in enumerate(results, start=1):
+            entry = fused.get(result["_id"])
+            if entry is None:
+                entry = fused[result["_id"]] = {key: value for key, value in result.items() if key != "score"}
+                entry["score"] = 0.0
+            entry["score"] += weight / (k + rank)
+            entry[f"{name}_score"] = result.get("score")
+            entry[f"{name}_rank"] = rank
+
+    # Orden estable: ante empate gana el que apareció primero (la lista vectorial va primero)
+    merged = sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)
+    return merged[:limit] if limit is not None else merged
@@ -0,0 +1,228 @@
+import json
+import logging
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from bson import json_util
+from core.embeddings.vector_codec import decode_vector
+from core.search.filters import column_mask, filter_columns
+
+logger = logging.getLogger(__name__)
+
+MATRIX_FILE = "vectors.npy"
+DOCS_FILE = "docs.jsonl"
+CENTROIDS_FILE = "centroids.npy"
+LISTS_FILE = "lists.npy"
+OFFSETS_FILE = "offsets.npy"
+META_FILE = "meta.json"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= len(scores):
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+class LocalVectorIndex:
+    """Snapshot en disco de la colección servido con NumPy (exacto o IVF)."""
+
+    def __init__(self, index_dir: str, nprobe: int = 8):
+        self.index_dir = Path(index_dir)
+        self.nprobe = nprobe
+        self.matrix: Optional[np.ndarray] = None
+        self.docs: List[Dict] = []
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+        self.columns: Dict[str, np.ndarray] = {}
+        self.rows: Dict = {}
+
+    # ─── BUILD ───
+    def build(self, collection, nlist: int = 0, batch_size: int = 1000, kmeans_iters: int = 10) -> dict:
+        start = time.time()
+        query = {"embedding": {"$exists": True}}
+        expected = collection.count_documents(query)
+        if expected == 0:
+            raise RuntimeError("No documents with embeddings to snapshot")
+
+        tmp_dir = self.index_dir.with_name(self.index_dir.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        matrix = None
+        count = 0
+        projection = {"embedding": 1, "text": 1, "source": 1, "chunk_idx": 1, "type": 1, "username": 1, "ts": 1}
+        with open(tmp_dir / DOCS_FILE, "w", encoding="utf-8") as docs_out:
+            cursor = collection.find(query, projection, batch_size=batch_size)
+            for doc in cursor:
+                # Documentos insertados durante el snapshot quedan para el próximo build
+                if count >= expected:
+                    break
+                vector = np.asarray(decode_vector(doc["embedding"]), dtype=np.float32)
+                if matrix is None:
+                    matrix = np.lib.format.open_memmap(
+                        tmp_dir / MATRIX_FILE, mode="w+", dtype=np.float32, shape=(expected, len(vector))
+                    )
+                matrix[count] = vector
+                docs_out.write(json_util.dumps({
+                    "_id": doc["_id"],
+                    "text": doc.get("text", ""),
+                    "source": doc.get("source", "https://unknown-source"),
+                    "chunk_idx": doc.get("chunk_idx"),
+                    # Campos de filtro (mismos que el índice de Atlas)
+                    "type": doc.get("type"),
+                    "username": doc.get("username"),
+                    "ts": doc.get("ts")
+                }) + "\n")
+                count += 1
+
+        if matrix is None:
+            raise RuntimeError("Collection emptied during snapshot")
+        for offset in range(0, count, 65536):
+            matrix[offset:offset + 65536] = _normalize_rows(matrix[offset:offset + 65536])
+        matrix.flush()
+        dim = matrix.shape[1]
+        del matrix
+
+        if count < expected:
+            # Compactar la matriz si la colección se encogió durante el snapshot
+            full = np.load(tmp_dir / MATRIX_FILE, mmap_mode="r")
+            np.save(tmp_dir / "compact.npy", np.asarray(full[:count]))
+            del full
+            (tmp_dir / "compact.npy").replace(tmp_dir / MATRIX_FILE)
+
+        if nlist:
+            self._build_ivf(tmp_dir, min(nlist, count), kmeans_iters)
+
+        meta = {"count": count, "dim": dim, "nlist": min(nlist, count) if nlist else 0, "built_at": int(time.time())}
+        (tmp_dir / META_FILE).write_text(json.dumps(meta))
+
+        shutil.rmtree(self.index_dir, ignore_errors=True)
+        tmp_dir.replace(self.index_dir)
+        meta["build_time"] = time.time() - start
+        logger.info("Local index built: %d vectors, dim=%s, nlist=%s in %.1fs", count, dim, meta['nlist'], meta['build_time'])
+        return meta
+
+    def _build_ivf(self, index_dir: Path, nlist: int, iters: int, sample_size: int = 100000):
+        matrix = np.load(index_dir / MATRIX_FILE, mmap_mode="r")
+        rng = np.random.default_rng(0)
+        sample_idx = np.sort(rng.choice(len(matrix), size=min(sample_size, len(matrix)), replace=False))
+        sample = np.asarray(matrix[sample_idx])
+
+        # k-means esférico sobre una muestra
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize_rows(centroids)
+
+        assign = np.empty(len(matrix), dtype=np.int32)
+        for offset in range(0, len(matrix), 65536):
+            block = np.asarray(matrix[offset:offset + 65536])
+            assign[offset:offset + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        lists = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assign[lists], np.arange(nlist + 1)).astype(np.int64)
+        np.save(index_dir / CENTROIDS_FILE, centroids.astype(np.float32))
+        np.save(index_dir / LISTS_FILE, lists)
+        np.save(index_dir / OFFSETS_FILE, offsets)
+
+    # ─── LOAD ───
+    def load(self) -> "LocalVectorIndex":
+        if not (self.index_dir / META_FILE).exists():
+            raise FileNotFoundError(f"Local index not found in {self.index_dir}; build it first")
+        self.matrix = np.load(self.index_dir / MATRIX_FILE, mmap_mode="r")
+        with open(self.index_dir / DOCS_FILE, encoding="utf-8") as f:
+            self.docs = [json_util.loads(line) for line in f]
+        self.columns = filter_columns(self.docs)
+        self.rows = {doc["_id"]: row for row, doc in enumerate(self.docs)}
+        if (self.index_dir / CENTROIDS_FILE).exists():
+            self.centroids = np.load(self.index_dir / CENTROIDS_FILE)
+            self.lists = np.load(self.index_dir / LISTS_FILE, mmap_mode="r")
+            self.offsets = np.load(self.index_dir / OFFSETS_FILE)
+        logger.info("Local index loaded: %d vectors from %s", len(self.docs), self.index_dir)
+        return self
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.matrix is not None
+
+    # ─── SEARCH ───
+    def _candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        if self.centroids is None:
+            return None
+        probe = _top_k(self.centroids @ query, min(self.nprobe, len(self.centroids)))
+        return np.concatenate([self.lists[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+
+    def vectors(self, ids: List) -> Dict:
+        # Embeddings (normalizados) por _id, para el rerank local
+        return {_id: self.matrix[self.rows[_id]] for _id in ids if _id in self.rows}
+
+    def search(self, query_vector: List[float], limit: int = 100, filters: Optional[Dict] = None,
+               with_embeddings: bool = False) -> List[Dict]:
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        # Pre-filtro como $vectorSearch.filter: se buscan solo las filas que cumplen
+        mask = column_mask(self.columns, filters, len(self.docs))
+        rows = self._candidates(query)
+        if rows is not None and mask is not None:
+            rows = rows[mask[rows]]
+            if len(rows) < limit:
+                # Filtro selectivo: los clusters sondeados no alcanzan, se recorre todo lo que cumple
+                rows = np.flatnonzero(mask)
+        elif mask is not None:
+            rows = np.flatnonzero(mask)
+
+        if rows is None:
+            scores = self.matrix @ query
+        else:
+            rows = np.sort(rows)
+            scores = self.matrix[rows] @ query
+
+        best = _top_k(scores, limit)
+        results = []
+        for i in best:
+            row = int(rows[i]) if rows is not None else int(i)
+            doc = self.docs[row]
+            result = {
+                "_id": doc["_id"],
+                "text": doc["text"],
+                "source": doc["source"],
+                "chunk_idx": doc.get("chunk_idx"),
+                # Misma escala que vectorSearchScore para similarity "cosine"
+                "score": float((1 + scores[i]) / 2)
+            }
+            if with_embeddings:
+                result["embedding"] = self.matrix[row]
+            results.append(result)
+        return results
+
+
+def main():
+    from config.config import LOCAL_INDEX_DIR, LOCAL_INDEX_NLIST, LOCAL_INDEX_NPROBE
+    from core.database import db_manager
+    from core.observability import configure_logging
+
+    configure_logging()
+    LocalVectorIndex(LOCAL_INDEX_DIR, nprobe=LOCAL_INDEX_NPROBE).build(db_manager.collection, nlist=LOCAL_INDEX_NLIST)
+
+# ─── EXECUTE ───
+if __name__ == "__main__":
+    main()
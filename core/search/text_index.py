@@ -0,0 +1,66 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from core.search.filters import column_mask, filter_columns
+
+# BM25 en memoria: sustituto local de Atlas Search ($search) para el backend local y el bench.
+# Tokenización simple (minúsculas, \w+), parecida al analizador estándar de Lucene.
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    def __init__(self, docs: Iterable[Dict], k1: float = 1.2, b: float = 0.75):
+        self.docs = list(docs)
+        self.columns = filter_columns(self.docs)
+        counts = [Counter(tokenize(doc.get("text", ""))) for doc in self.docs]
+        lengths = np.asarray([sum(c.values()) for c in counts], dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        norm = k1 * (1 - b + b * lengths / (avg_length or 1.0))
+
+        rows: Dict[str, List[int]] = {}
+        freqs: Dict[str, List[int]] = {}
+        for row, c in enumerate(counts):
+            for term, tf in c.items():
+                rows.setdefault(term, []).append(row)
+                freqs.setdefault(term, []).append(tf)
+
+        # Por término: filas y peso BM25 ya calculado (idf * tf saturado), así buscar es solo sumar
+        n = len(self.docs)
+        self.postings: Dict[str, tuple] = {}
+        for term, term_rows in rows.items():
+            ids = np.asarray(term_rows, dtype=np.int64)
+            tf = np.asarray(freqs[term], dtype=np.float32)
+            idf = np.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            self.postings[term] = (ids, (idf * tf * (k1 + 1) / (tf + norm[ids])).astype(np.float32))
+
+    def search(self, query: str, limit: int = 100, filters: Optional[Dict] = None) -> List[Dict]:
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                ids, weights = posting
+                scores[ids] += weights
+        mask = column_mask(self.columns, filters, len(self.docs))
+        if mask is not None:
+            scores[~mask] = 0
+
+        matched = np.flatnonzero(scores)
+        if limit < len(matched):
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        order = matched[np.argsort(-scores[matched], kind="stable")]
+        return [
+            {
+                "_id": self.docs[i]["_id"],
+                "text": self.docs[i].get("text", ""),
+                "source": self.docs[i].get("source", "https://unknown-source"),
+                "chunk_idx": self.docs[i].get("chunk_idx"),
+                "score": float(scores[i])
+            }
+            for i in order
+        ]
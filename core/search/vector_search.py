@@ -1,57 +1,313 @@
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
+import numpy as np
 from langchain.schema import Document
+from pymongo import AsyncMongoClient
 from core.database import db_manager
-from config.config import INDEX_NAME
+from core.search.local_index import LocalVectorIndex
+from core.search.text_index import BM25Index
+from core.search.fusion import reciprocal_rank_fusion
+from core.search.filters import to_search_filter, validate_filters
+from core.aio import LoopLocal
+from core.lazy import lazy_property
+from core.embeddings.vector_codec import decode_vector_array, encode_query_vector
+from core.observability import record_error, span
+from config.config import (
+    MONGODB_URI,
+    DB_NAME,
+    COLL_NAME,
+    INDEX_NAME,
+    TEXT_INDEX_NAME,
+    SEARCH_BACKEND,
+    SEARCH_MODE,
+    HYBRID_VECTOR_WEIGHT,
+    HYBRID_TEXT_WEIGHT,
+    HYBRID_RRF_K,
+    HYBRID_TEXT_WORKERS,
+    LOCAL_INDEX_DIR,
+    LOCAL_INDEX_NPROBE,
+    VECTOR_STORAGE,
+    NUM_CANDIDATES_FACTOR
+)
+
+logger = logging.getLogger(__name__)
 
 class VectorSearchEngine:
-    def __init__(self):
-        self.collection = db_manager.collection
+    def __init__(self, backend: str = SEARCH_BACKEND, mode: str = SEARCH_MODE):
         self.index_name = INDEX_NAME
+        self.text_index_name = TEXT_INDEX_NAME
+        self.backend = backend
+        self.mode = mode
+        self.hybrid_weights = {"vector": HYBRID_VECTOR_WEIGHT, "text": HYBRID_TEXT_WEIGHT}
+        self.rrf_k = HYBRID_RRF_K
+        self.vector_storage = VECTOR_STORAGE
+        self.num_candidates_factor = NUM_CANDIDATES_FACTOR
+        self.async_collection = LoopLocal(lambda: AsyncMongoClient(MONGODB_URI)[DB_NAME][COLL_NAME])
+        logger.debug("Vector search backend: %s", backend)
+
+    # Colección e índice local se resuelven en el primer uso, no al importar
+    @lazy_property
+    def collection(self):
+        return db_manager.collection
+
+    @lazy_property
+    def local_index(self) -> Optional[LocalVectorIndex]:
+        if self.backend != "local":
+            return None
+        return LocalVectorIndex(LOCAL_INDEX_DIR, nprobe=LOCAL_INDEX_NPROBE).load()
+
+    @lazy_property
+    def text_index(self) -> Optional[BM25Index]:
+        # Sustituto local de $search, construido sobre el mismo snapshot que el índice vectorial
+        if self.backend != "local":
+            return None
+        return BM25Index(self.local_index.docs)
+
+    @lazy_property
+    def _text_pool(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=HYBRID_TEXT_WORKERS, thread_name_prefix="text-search")
+
+    def warmup(self):
+        if self.backend == "local":
+            self.local_index
+            if self.mode == "hybrid":
+                self.text_index
+        else:
+            self.collection.database.command("ping")
+
+    async def awarmup(self):
+        # El cliente async es uno por event loop: hay que abrirlo desde el loop que atenderá las requests
+        if self.backend != "local":
+            await self.async_collection.get().database.command("ping")
     
-    def search(self, query_vector: List[float], limit: int = 100 , filters: Optional[Dict] = None) -> List[Dict]:
-        print(f"[INFO] Running vector search with {limit} results limit")
-        
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": self.index_name,
-                    "path": "embedding",
-                    "queryVector": query_vector,
-                    "numCandidates": limit*5,
-                    "limit": limit
-                }
-            }
-        ]
+    def search(self, query_vector: List[float], limit: int = 100 , filters: Optional[Dict] = None,
+               query: Optional[str] = None, with_embeddings: bool = False) -> List[Dict]:
+        """with_embeddings: proyecta el embedding guardado de cada resultado (rerank local)."""
+        filters = validate_filters(filters)
+        if self.mode == "hybrid" and query:
+            return self._search_hybrid(query, query_vector, limit, filters, with_embeddings)
+        return self._search_vector(query_vector, limit, filters, with_embeddings)
+
+    def _search_vector(self, query_vector: List[float], limit: int, filters: Optional[Dict],
+                       with_embeddings: bool = False) -> List[Dict]:
+        if self.backend == "local":
+            return self._search_local(query_vector, limit, filters, with_embeddings)
+        return self._search_atlas(query_vector, limit, filters, with_embeddings)
+
+    # ─── Híbrido: full-text + vectorial, fusionados con RRF ───
+    def _search_hybrid(self, query: str, query_vector: List[float], limit: int, filters: Optional[Dict],
+                       with_embeddings: bool = False) -> List[Dict]:
+        if self.backend == "local":
+            vector_results = self._search_vector(query_vector, limit, filters, with_embeddings)
+            text_results = self._search_text(query, limit, filters)
+        else:
+            # Las dos consultas a Atlas van en paralelo; copy_context conserva la traza de la request
+            text_future = self._text_pool.submit(contextvars.copy_context().run, self._search_text, query, limit, filters)
+            vector_results = self._search_vector(query_vector, limit, filters, with_embeddings)
+            text_results = text_future.result()
+        return self._fuse(vector_results, text_results, limit)
+
+    def _fuse(self, vector_results: List[Dict], text_results: List[Dict], limit: int) -> List[Dict]:
+        with span("fusion", vector=len(vector_results), text=len(text_results), rrf_k=self.rrf_k) as attrs:
+            results = reciprocal_rank_fusion(
+                {"vector": vector_results, "text": text_results}, self.hybrid_weights, k=self.rrf_k, limit=limit
+            )
+            attrs["items"] = len(results)
+            attrs["text_only"] = sum(1 for r in results if "vector_rank" not in r)
+        return results
+
+    def _build_text_pipeline(self, query: str, limit: int, filters: Optional[Dict]) -> List[Dict]:
+        text = {"query": query, "path": "text"}
         if filters:
-            pipeline.append({"$match": filters})
+            # Filtro dentro de $search (compound.filter): no afecta el score y no descarta después del $limit
+            search = {"index": self.text_index_name, "compound": {"must": [{"text": text}], "filter": to_search_filter(filters)}}
+        else:
+            search = {"index": self.text_index_name, "text": text}
+        pipeline = [{"$search": search}, {"$limit": limit}]
         pipeline.append({
             "$project": {
                 "text": 1,
                 "source": 1,
-                "score": {"$meta": "vectorSearchScore"},
+                "chunk_idx": 1,
+                "score": {"$meta": "searchScore"},
                 "_id": 1
             }
         })
+        return pipeline
+
+    def _search_text(self, query: str, limit: int, filters: Optional[Dict]) -> List[Dict]:
+        with span("text_search", backend=self.backend, limit=limit) as attrs:
+            try:
+                if self.backend == "local":
+                    results = self.text_index.search(query, limit=limit, filters=filters)
+                else:
+                    results = list(self.collection.aggregate(self._build_text_pipeline(query, limit, filters)))
+                attrs["items"] = len(results)
+                logger.debug("Retrieved %s documents from full-text search", len(results))
+                return results
+            except Exception as e:
+                # Sin full-text la búsqueda sigue siendo vectorial
+                record_error("text_search", e)
+                logger.error("Full-text search failed: %s", e)
+                return []
+
+    async def _asearch_text(self, query: str, limit: int, filters: Optional[Dict]) -> List[Dict]:
+        if self.backend == "local":
+            return await asyncio.to_thread(self._search_text, query, limit, filters)
+
+        with span("text_search", backend="atlas", limit=limit) as attrs:
+            try:
+                cursor = await self.async_collection.get().aggregate(self._build_text_pipeline(query, limit, filters))
+                results = await cursor.to_list(None)
+                attrs["items"] = len(results)
+                logger.debug("Retrieved %s documents from full-text search", len(results))
+                return results
+            except Exception as e:
+                record_error("text_search", e)
+                logger.error("Full-text search failed: %s", e)
+                return []
+
+    def _search_local(self, query_vector: List[float], limit: int, filters: Optional[Dict],
+                      with_embeddings: bool = False) -> List[Dict]:
+        with span("vector_search", backend="local", limit=limit, filtered=bool(filters)) as attrs:
+            try:
+                results = self.local_index.search(query_vector, limit=limit, filters=filters, with_embeddings=with_embeddings)
+                attrs["items"] = len(results)
+                logger.debug("Retrieved %s documents from local index", len(results))
+                return results
+            except Exception as e:
+                record_error("vector_search", e)
+                logger.error("Local index search failed: %s", e)
+                return []
+
+    def num_candidates(self, limit: int) -> int:
+        # $vectorSearch admite como máximo 10000 candidatos
+        return min(max(limit * self.num_candidates_factor, limit), 10000)
+
+    def _build_pipeline(self, query_vector: List[float], limit: int, filters: Optional[Dict],
+                        with_embeddings: bool = False) -> List[Dict]:
+        vector_search = {
+            "index": self.index_name,
+            "path": "embedding",
+            "queryVector": encode_query_vector(query_vector, self.vector_storage),
+            "numCandidates": self.num_candidates(limit),
+            "limit": limit
+        }
+        if filters:
+            # Pre-filtro del ANN (campos "filter" del índice): devuelve limit resultados que ya cumplen
+            vector_search["filter"] = filters
+        pipeline = [{"$vectorSearch": vector_search}]
+        project = {
+            "text": 1,
+            "source": 1,
+            "chunk_idx": 1,
+            "score": {"$meta": "vectorSearchScore"},
+            "_id": 1
+        }
+        if with_embeddings:
+            # ~4 KB por resultado en float32: solo cuando el rerank local lo necesita
+            project["embedding"] = 1
+        pipeline.append({"$project": project})
+        return pipeline
+
+    def _search_atlas(self, query_vector: List[float], limit: int, filters: Optional[Dict],
+                      with_embeddings: bool = False) -> List[Dict]:
+        pipeline = self._build_pipeline(query_vector, limit, filters, with_embeddings)
         
-        try:
-            results = list(self.collection.aggregate(pipeline))
-            print(f"[INFO] Retrieved {len(results)} documents from vector search")
-            return results
-        except Exception as e:
-            print(f"[SEARCH ERROR] MongoDB aggregation failed: {e}")
-            return []
+        with span("vector_search", backend="atlas", limit=limit, num_candidates=self.num_candidates(limit),
+                  filtered=bool(filters)) as attrs:
+            try:
+                results = list(self.collection.aggregate(pipeline))
+                attrs["items"] = len(results)
+                logger.debug("Retrieved %s documents from vector search", len(results))
+                return results
+            except Exception as e:
+                record_error("vector_search", e)
+                logger.error("MongoDB aggregation failed: %s", e)
+                return []
+
+    async def asearch(self, query_vector: List[float], limit: int = 100, filters: Optional[Dict] = None,
+                      query: Optional[str] = None, with_embeddings: bool = False) -> List[Dict]:
+        filters = validate_filters(filters)
+        if self.mode == "hybrid" and query:
+            vector_results, text_results = await asyncio.gather(
+                self._asearch_vector(query_vector, limit, filters, with_embeddings),
+                self._asearch_text(query, limit, filters)
+            )
+            return self._fuse(vector_results, text_results, limit)
+        return await self._asearch_vector(query_vector, limit, filters, with_embeddings)
+
+    async def _asearch_vector(self, query_vector: List[float], limit: int, filters: Optional[Dict],
+                              with_embeddings: bool = False) -> List[Dict]:
+        if self.backend == "local":
+            # La búsqueda local es CPU-bound: se saca del event loop
+            return await asyncio.to_thread(self._search_local, query_vector, limit, filters, with_embeddings)
+
+        pipeline = self._build_pipeline(query_vector, limit, filters, with_embeddings)
+        with span("vector_search", backend="atlas", limit=limit, num_candidates=self.num_candidates(limit),
+                  filtered=bool(filters)) as attrs:
+            try:
+                cursor = await self.async_collection.get().aggregate(pipeline)
+                results = await cursor.to_list(None)
+                attrs["items"] = len(results)
+                logger.debug("Retrieved %s documents from vector search", len(results))
+                return results
+            except Exception as e:
+                record_error("vector_search", e)
+                logger.error("MongoDB aggregation failed: %s", e)
+                return []
     
+    # ─── Embeddings de los resultados (rerank local) ───
+    def fetch_embeddings(self, ids: List) -> Dict:
+        if not ids:
+            return {}
+        if self.backend == "local":
+            return self.local_index.vectors(ids)
+        cursor = self.collection.find({"_id": {"$in": ids}}, {"embedding": 1})
+        return {doc["_id"]: doc["embedding"] for doc in cursor if "embedding" in doc}
+
+    async def afetch_embeddings(self, ids: List) -> Dict:
+        if not ids or self.backend == "local":
+            return self.fetch_embeddings(ids)
+        cursor = self.async_collection.get().find({"_id": {"$in": ids}}, {"embedding": 1})
+        return {doc["_id"]: doc["embedding"] async for doc in cursor if "embedding" in doc}
+
+    def _missing_embeddings(self, results: List[Dict]) -> List:
+        # Sin proyección (fallback) o solo en full-text (híbrido): hay que leerlos por _id
+        return [r["_id"] for r in results if r.get("embedding") is None]
+
+    def _vector_matrix(self, results: List[Dict], fetched: Dict) -> np.ndarray:
+        vectors = [r.get("embedding") if r.get("embedding") is not None else fetched.get(r["_id"]) for r in results]
+        known = next((decode_vector_array(v) for v in vectors if v is not None), None)
+        if known is None:
+            raise ValueError("No stored embeddings for the search results")
+        # Un resultado sin embedding queda en cero: coseno 0, al final del rerank
+        zeros = np.zeros(len(known), dtype=np.float32)
+        return np.vstack([decode_vector_array(v) if v is not None else zeros for v in vectors])
+
+    def result_vectors(self, results: List[Dict]) -> np.ndarray:
+        """Matriz (len(results), dim) con el embedding de cada resultado, en el mismo orden."""
+        return self._vector_matrix(results, self.fetch_embeddings(self._missing_embeddings(results)))
+
+    async def aresult_vectors(self, results: List[Dict]) -> np.ndarray:
+        return self._vector_matrix(results, await self.afetch_embeddings(self._missing_embeddings(results)))
+
     def results_to_documents(self, results: List[Dict]) -> List[Document]:
-        return [
-            Document(
-                page_content=r["text"],
-                metadata={
-                    "id": r["_id"],
-                    "source": r.get("source", "https://unknown-source"),
-                    "score": r["score"]
-                }
-            )
-            for r in results
-        ]
+        docs = []
+        for r in results:
+            metadata = {
+                "id": r["_id"],
+                "source": r.get("source", "https://unknown-source"),
+                "score": r["score"]
+            }
+            # chunk_idx: para unir vecinos al armar el prompt; en modo híbrido, posición en cada lista
+            for key in ("chunk_idx", "vector_rank", "text_rank"):
+                if key in r:
+                    metadata[key] = r[key]
+            docs.append(Document(page_content=r["text"], metadata=metadata))
+        return docs
 
 vector_search = VectorSearchEngine()
\ No newline at end of file
@@ -0,0 +1,180 @@
+import re
+from collections import deque
+from itertools import accumulate
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from config.config import CHUNKER, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS
+
+# Chunker propio, intercambiable con RecursiveCharacterTextSplitter (split_text), pero:
+#   - mide en tokens aproximados (Voyage limita por tokens, no por caracteres)
+#   - es un generador: los chunks salen a medida que se producen, también sobre un flujo de páginas (stream)
+#   - trabaja con offsets sobre el texto: sin listas de substrings ni joins, y el largo de cualquier
+#     tramo sale de una suma prefija calculada una vez por texto
+# Misma jerarquía de separadores y misma semántica de solapamiento: con length_function=len
+# produce exactamente los mismos chunks que RecursiveCharacterTextSplitter (ver bench/chunking.py).
+
+SEPARATORS = ("\n\n", "\n", " ", "")
+
+# Un token por cada tramo de hasta 6 letras/dígitos o por signo de puntuación:
+# en texto en inglés o español da ~4 caracteres por token, como los tokenizadores BPE
+WORD_PIECE = 6
+_TOKEN_RE = re.compile(r"\w{1,%d}|[^\w\s]" % WORD_PIECE)
+
+# Clases de carácter para la versión vectorizada: 0 espacio, 1 letra/dígito (\w), 2 puntuación.
+# La tabla cubre Latin, griego, cirílico y la puntuación general; lo que queda por encima cuenta como letra
+_TABLE_SIZE = 0x2070
+_CLASSES = np.array(
+    [0 if chr(c).isspace() else 1 if chr(c).isalnum() or c == 95 else 2 for c in range(_TABLE_SIZE)] + [1],
+    dtype=np.int8
+)
+
+
+def approx_tokens(text: str) -> int:
+    return len(_TOKEN_RE.findall(text))
+
+
+def _char_codes(text: str) -> np.ndarray:
+    try:
+        return np.frombuffer(text.encode("latin-1"), dtype=np.uint8)
+    except UnicodeEncodeError:
+        return np.minimum(np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32), _TABLE_SIZE)
+
+
+def token_prefix(text: str) -> np.ndarray:
+    """prefix[i] = tokens aproximados que empiezan antes del carácter i; los de text[a:b] son prefix[b] - prefix[a].
+    Cuenta lo mismo que approx_tokens, sin recorrer el texto con una regex por cada trozo."""
+    classes = _CLASSES.take(_char_codes(text))
+    word = classes == 1
+    starts = classes == 2
+    run_start = word.copy()
+    run_start[1:] &= ~word[:-1]
+    run_end = word.copy()
+    run_end[:-1] &= ~word[1:]
+    starts |= run_start
+    # Una palabra de más de WORD_PIECE caracteres suma un token cada WORD_PIECE
+    first, length = np.flatnonzero(run_start), np.flatnonzero(run_end) + 1
+    length -= first
+    long = length > WORD_PIECE
+    if long.any():
+        extra = (length[long] - 1) // WORD_PIECE
+        step = np.arange(int(extra.sum())) - np.repeat(np.cumsum(extra) - extra, extra) + 1
+        starts[np.repeat(first[long], extra) + step * WORD_PIECE] = True
+    prefix = np.zeros(len(classes) + 1, dtype=np.int32)
+    np.cumsum(starts, out=prefix[1:])
+    return prefix
+
+
+class StreamingChunker:
+    def __init__(self, chunk_size: int = 200, chunk_overlap: int = 25,
+                 length_function: Optional[Callable[[str], int]] = None,
+                 separators: Sequence[str] = SEPARATORS):
+        """length_function: None = tokens aproximados (token_prefix); len = caracteres, como el splitter de LangChain."""
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) is larger than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_function = length_function
+        self.separators = list(separators)
+
+    def split_text(self, text: str) -> List[str]:
+        """Igual que RecursiveCharacterTextSplitter.split_text."""
+        return list(self.iter_chunks(text))
+
+    def iter_chunks(self, text: str) -> Iterator[str]:
+        if not text:
+            return iter(())
+        return self._split(text, 0, len(text), self.separators, self._sizer(text))
+
+    def stream(self, parts: Iterable[str], joiner: str = "\n\n") -> Iterator[str]:
+        """Chunks de un texto que llega por partes (páginas, rangos de páginas) sin tenerlo entero en memoria.
+        El último chunk de cada parte se retiene y se vuelve a partir junto con la siguiente."""
+        carry = ""
+        for part in parts:
+            buffer = f"{carry}{joiner}{part}" if carry else part
+            previous: Optional[str] = None
+            for chunk in self.iter_chunks(buffer):
+                if previous is not None:
+                    yield previous
+                previous = chunk
+            carry = previous or ""
+        if carry:
+            yield carry
+
+    def _sizer(self, text: str) -> Callable[[List[int]], List[int]]:
+        # Largo de cada tramo [bounds[i], bounds[i+1]) del texto
+        if self.length_function is None:
+            prefix = token_prefix(text)
+            return lambda bounds: np.diff(prefix[bounds]).tolist()
+        if self.length_function is len:
+            return lambda bounds: np.diff(bounds).tolist()
+        fn = self.length_function
+        return lambda bounds: [fn(text[a:b]) for a, b in zip(bounds, bounds[1:])]
+
+    # ─── Partición recursiva ───
+    def _bounds(self, text: str, start: int, end: int, separators: List[str]) -> Tuple[List[int], List[str]]:
+        # Primer separador presente; el separador queda al inicio del trozo siguiente (keep_separator)
+        separator, rest = separators[-1], []
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator, rest = candidate, separators[i + 1:]
+                break
+        if separator == "":
+            return list(range(start, end + 1)), rest
+        first, *others = text[start:end].split(separator)
+        step = len(separator)
+        bounds = list(accumulate([len(piece) + step for piece in others], initial=start + len(first)))
+        # Un texto que empieza con el separador no deja un primer trozo vacío
+        return ([start] + bounds if first else bounds), rest
+
+    def _split(self, text: str, start: int, end: int, separators: List[str], sizer) -> Iterator[str]:
+        bounds, rest = self._bounds(text, start, end, separators)
+        if len(bounds) < 2:
+            return
+        sizes = sizer(bounds)
+        good = None  # primer trozo de la corrida actual de trozos menores que chunk_size (siempre contiguos)
+        for i, size in enumerate(sizes):
+            if size < self.chunk_size:
+                if good is None:
+                    good = i
+                continue
+            if good is not None:
+                yield from self._merge(text, bounds, sizes, good, i)
+                good = None
+            if rest:
+                yield from self._split(text, bounds[i], bounds[i + 1], rest, sizer)
+            else:
+                yield text[bounds[i]:bounds[i + 1]]
+        if good is not None:
+            yield from self._merge(text, bounds, sizes, good, len(sizes))
+
+    def _merge(self, text: str, bounds: List[int], sizes: List[int], first: int, last: int) -> Iterator[str]:
+        # Junta trozos hasta chunk_size; al cerrar un chunk conserva la cola de hasta chunk_overlap como inicio del siguiente
+        window: deque = deque()
+        total = 0
+        for i in range(first, last):
+            size = sizes[i]
+            if window and total + size > self.chunk_size:
+                chunk = text[bounds[window[0]]:bounds[i]].strip()
+                if chunk:
+                    yield chunk
+                while total > self.chunk_overlap or (total > 0 and total + size > self.chunk_size):
+                    total -= sizes[window.popleft()]
+            window.append(i)
+            total += size
+        if window:
+            chunk = text[bounds[window[0]]:bounds[last]].strip()
+            if chunk:
+                yield chunk
+
+
+def make_splitter(kind: str = CHUNKER) -> StreamingChunker:
+    """tokens: CHUNK_TOKENS/CHUNK_OVERLAP_TOKENS tokens aproximados; characters: CHUNK_SIZE/CHUNK_OVERLAP
+    caracteres, los mismos chunks que RecursiveCharacterTextSplitter. Los dos exponen split_text y stream."""
+    if kind == "tokens":
+        return StreamingChunker(CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+    if kind != "characters":
+        raise ValueError(f"Unknown CHUNKER '{kind}'; use 'characters' or 'tokens'")
+    return StreamingChunker(CHUNK_SIZE, CHUNK_OVERLAP, length_function=len)
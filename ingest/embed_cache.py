@@ -0,0 +1,60 @@
+import threading
+from typing import Callable, List, Optional
+from core.embeddings.cache import DiskEmbeddingStore, MAX_EMBED_CHARS, cache_key
+
+
+class IngestEmbeddingCache:
+    """Cache persistente por contenido: sha256(modelo + texto truncado) → vector float32.
+
+    Se consulta antes de llamar a Voyage y se llena con cada respuesta, así los textos repetidos
+    (footers, avisos de cookies, intros) y las re-ingestas no se vuelven a pagar.
+    """
+
+    def __init__(self, path: str, model: str, max_entries: Optional[int] = None):
+        self.model = model
+        self.store = DiskEmbeddingStore(path, max_entries=max_entries)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+
+    def embed(self, texts: List[str], embed_fn: Callable[[List[str]], List[Optional[List[float]]]]) -> List[Optional[List[float]]]:
+        keys = [cache_key(text, self.model, normalize=False) for text in texts]
+        found = self.store.get_many(set(keys))
+
+        # Textos repetidos dentro del mismo batch se embeben una sola vez
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text[:MAX_EMBED_CHARS]
+
+        if pending:
+            vectors = embed_fn(list(pending.values()))
+            fresh = {key: vec for key, vec in zip(pending, vectors) if vec is not None}
+            self.store.put_many(fresh, self.model)
+            found.update(fresh)
+
+        with self._lock:
+            self.hits += sum(1 for key in keys if key not in pending)
+            self.misses += len(pending)
+            self.duplicates += sum(1 for key in keys if key in pending) - len(pending)
+        return [found.get(key) for key in keys]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.duplicates
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "duplicates": self.duplicates,
+                "hit_rate": (self.hits + self.duplicates) / lookups if lookups else 0.0,
+                "entries": len(self.store),
+                "evictions": self.store.evictions
+            }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (
+            f"hit rate {stats['hit_rate'] * 100:.1f}% | hits={stats['hits']:,} in-batch duplicates={stats['duplicates']:,} "
+            f"embedded={stats['misses']:,} | entries={stats['entries']:,} evictions={stats['evictions']:,}"
+        )
@@ -0,0 +1,159 @@
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Tuple, TypeVar
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+T = TypeVar("T")
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+
+def error_class(exc: Exception) -> str:
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return f"http_{exc.response.status_code}"
+    if isinstance(exc, requests.Timeout):
+        return "timeout"
+    if isinstance(exc, requests.ConnectionError):
+        return "connection"
+    return type(exc).__name__
+
+
+class FetchStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start = time.time()
+        self.requests = 0
+        self.ok = 0
+        self.retries = 0
+        self.bytes = 0
+        self.errors = Counter()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_ok(self, size: int):
+        with self._lock:
+            self.ok += 1
+            self.bytes += size
+
+    def record_error(self, kind: str):
+        with self._lock:
+            self.errors[kind] += 1
+
+    def report(self) -> dict:
+        elapsed = max(time.time() - self.start, 1e-9)
+        with self._lock:
+            return {
+                "elapsed": elapsed,
+                "requests": self.requests,
+                "ok": self.ok,
+                "retries": self.retries,
+                "bytes": self.bytes,
+                "urls_per_sec": (self.ok + sum(self.errors.values())) / elapsed,
+                "bytes_per_sec": self.bytes / elapsed,
+                "errors": dict(self.errors)
+            }
+
+
+class ConcurrentFetcher:
+    """Sesión keep-alive compartida con límite por host, cortesía y reintentos en 429/5xx."""
+
+    def __init__(self, max_workers: int = 16, per_host: int = 4, min_delay: float = 0.0,
+                 max_retries: int = 3, timeout: float = 15, backoff: float = 1.0, max_backoff: float = 60):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.min_delay = min_delay
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self._next_request_at = {}
+        self.stats = FetchStats()
+
+    def _host_slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return slot
+
+    def _wait_turn(self, host: str):
+        if not self.min_delay:
+            return
+        with self._lock:
+            now = time.monotonic()
+            turn = max(now, self._next_request_at.get(host, 0.0))
+            self._next_request_at[host] = turn + self.min_delay
+        if turn > now:
+            time.sleep(turn - now)
+
+    def _retry_delay(self, attempt: int, resp=None) -> float:
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+        # Un Retry-After enorme no bloquea la URL indefinidamente
+        return min(delay, self.max_backoff)
+
+    def get(self, url: str) -> requests.Response:
+        host = urlparse(url).netloc
+        slot = self._host_slot(host)
+        for attempt in range(self.max_retries + 1):
+            # El hueco del host se libera durante la espera entre reintentos: otras URLs del host siguen
+            with slot:
+                self._wait_turn(host)
+                self.stats.record_request()
+                try:
+                    resp = self.session.get(url, timeout=self.timeout)
+                except (requests.Timeout, requests.ConnectionError):
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self._retry_delay(attempt)
+                else:
+                    if resp.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                        resp.raise_for_status()
+                        self.stats.record_ok(len(resp.content))
+                        return resp
+                    delay = self._retry_delay(attempt, resp)
+                    resp.close()
+            self.stats.record_retry()
+            time.sleep(delay)
+        raise RuntimeError(f"Unreachable retry loop for {url}")
+
+    def map_ordered(self, fn: Callable[[str], T], urls: Iterable[str]) -> Iterator[Tuple[str, T]]:
+        """Aplica fn a cada URL en paralelo y entrega los resultados en el orden de entrada."""
+        window = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scrape") as pool:
+            for url in urls:
+                window.append((url, pool.submit(fn, url)))
+                # Ventana acotada: la memoria no crece con el tamaño del sitemap
+                if len(window) >= self.max_workers * 2:
+                    head_url, future = window.popleft()
+                    yield head_url, future.result()
+            while window:
+                head_url, future = window.popleft()
+                yield head_url, future.result()
+
+    def close(self):
+        self.session.close()
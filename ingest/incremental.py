@@ -0,0 +1,170 @@
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Optional
+
+# Re-ingesta incremental:
+#   _id = sha1(source, chunk_idx, hash del contenido) → el mismo chunk siempre tiene el mismo _id
+#   cada chunk guarda source_hash (huella de la fuente completa), source_chunks y lastmod
+#   una fuente está "completa" si todos sus chunks comparten source_hash y están todos presentes
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, chunk_idx: int, text: str) -> str:
+    return hashlib.sha1(f"{source}\x00{chunk_idx}\x00{content_hash(text)}".encode("utf-8")).hexdigest()
+
+
+def load_fingerprints(collection, sources: List[str], batch_size: int = 1000) -> Dict[str, dict]:
+    """Huella por fuente en una agregación por lote de fuentes (usa el índice de source)."""
+    fingerprints = {}
+    for i in range(0, len(sources), batch_size):
+        pipeline = [
+            {"$match": {"source": {"$in": sources[i:i + batch_size]}}},
+            {"$group": {
+                "_id": "$source",
+                "hashes": {"$addToSet": "$source_hash"},
+                "lastmod": {"$max": "$lastmod"},
+                "expected": {"$max": "$source_chunks"},
+                "count": {"$sum": 1}
+            }}
+        ]
+        for row in collection.aggregate(pipeline):
+            hashes = [h for h in row["hashes"] if h]
+            # Documentos sin source_hash (ingestas antiguas) dejan la fuente como incompleta
+            complete = len(hashes) == 1 and row["expected"] == row["count"]
+            fingerprints[row["_id"]] = {
+                "source_hash": hashes[0] if complete else None,
+                "lastmod": row.get("lastmod"),
+                "count": row["count"],
+                "complete": complete
+            }
+    return fingerprints
+
+
+def is_unchanged(fingerprint: Optional[dict], source_hash: str) -> bool:
+    return bool(fingerprint and fingerprint["complete"] and fingerprint["source_hash"] == source_hash)
+
+
+class IncrementalStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sources_unchanged = 0
+        self.sources_changed = 0
+        self.sources_new = 0
+        self.chunks_reused = 0
+        self.chunks_new = 0
+        self.chunks_deleted = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def summary(self) -> str:
+        return (
+            f"sources unchanged={self.sources_unchanged:,} changed={self.sources_changed:,} new={self.sources_new:,} | "
+            f"chunks reused={self.chunks_reused:,} embedded={self.chunks_new:,} deleted={self.chunks_deleted:,}"
+        )
+
+
+class SourceSync:
+    """Sincroniza una fuente chunk a chunk, para ingesters que no tienen el texto completo en memoria.
+
+    Los chunks nuevos salen sin source_chunks (el total se conoce al final) y llevan la sync en "sync".
+    Borrar los obsoletos y marcar los conservados con el total queda pendiente hasta que finish() cerró
+    la fuente y el pipeline escribió todos sus chunks nuevos (written): si el embedding o la escritura
+    fallan, la fuente conserva su contenido anterior y se reintenta en la próxima ingesta.
+    """
+
+    def __init__(self, collection, source: str, source_hash: str, fingerprint: Optional[dict],
+                 stats: IncrementalStats, extra: Optional[dict] = None):
+        self.collection = collection
+        self.source = source
+        self.fingerprint = fingerprint
+        self.stats = stats
+        self.fields = {"source_hash": source_hash, **(extra or {})}
+        self.existing = set(collection.distinct("_id", {"source": source})) if fingerprint else set()
+        self.kept: List[str] = []
+        self.count = 0
+        self.fresh = 0
+        self.stale: List[str] = []
+        self._lock = threading.Lock()
+        self._written = 0
+        self._finished = False
+        self._failed = False
+        self._applied = False
+
+    def add(self, text: str) -> Optional[dict]:
+        """Devuelve el chunk si hay que embeberlo, None si ya existe con el mismo contenido."""
+        cid = chunk_id(self.source, self.count, text)
+        chunk = {"_id": cid, "text": text, "chunk_idx": self.count, "sync": self, **self.fields}
+        self.count += 1
+        if cid in self.existing:
+            self.kept.append(cid)
+            return None
+        self.fresh += 1
+        return chunk
+
+    def finish(self) -> int:
+        self.stale = list(self.existing.difference(self.kept))
+        self.stats.add(
+            sources_changed=1 if self.fingerprint else 0,
+            sources_new=0 if self.fingerprint else 1,
+            chunks_reused=len(self.kept),
+            chunks_new=self.fresh
+        )
+        with self._lock:
+            self._finished = True
+        self._apply_if_ready()
+        return self.count
+
+    def written(self, ok: bool = True):
+        """Un chunk nuevo de la fuente terminó en el pipeline: escrito (ok) o fallido."""
+        with self._lock:
+            self._written += 1
+            self._failed |= not ok
+        self._apply_if_ready()
+
+    def _apply_if_ready(self):
+        with self._lock:
+            ready = self._finished and not self._failed and not self._applied and self._written == self.fresh
+            self._applied |= ready
+        if not ready:
+            return
+        if self.stale:
+            self.collection.delete_many({"_id": {"$in": self.stale}})
+        if self.kept:
+            self.collection.update_many(
+                {"_id": {"$in": self.kept}},
+                {"$set": {**self.fields, "source_chunks": self.count}}
+            )
+        self.stats.add(chunks_deleted=len(self.stale))
+
+
+def track_writes(chunks: List[dict], ok: bool):
+    """on_written de IngestPipeline: avisa a la SourceSync de cada chunk que su escritura terminó."""
+    for chunk in chunks:
+        sync = chunk.get("sync")
+        if sync is not None:
+            sync.written(ok)
+
+
+def sync_source(collection, source: str, texts: Iterable[str], source_hash: str,
+                fingerprint: Optional[dict], stats: IncrementalStats, extra: Optional[dict] = None) -> List[dict]:
+    """Devuelve solo los chunks nuevos o modificados (los únicos que hay que embeber). Los borrados
+    y la huella de los conservados quedan pendientes en la SourceSync que lleva cada chunk ("sync"):
+    corren cuando el pipeline los escribió todos (track_writes), o ya si no hay nada que escribir."""
+    sync = SourceSync(collection, source, source_hash, fingerprint, stats, extra)
+    fresh = [chunk for chunk in map(sync.add, texts) if chunk is not None]
+    total = sync.finish()
+    return [{**chunk, "source_chunks": total} for chunk in fresh]
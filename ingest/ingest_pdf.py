@@ -1,11 +1,12 @@
+import multiprocessing
 import os
 import time
-import uuid
-from typing import List
+from collections import deque
+from itertools import chain, groupby
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Generator, Iterator, List
 from pymongo import MongoClient, UpdateOne
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from voyageai import Client as VoyageClient
-from PyPDF2 import PdfReader
 from pathlib import Path
 import sys
 project_root = Path(__file__).parent.parent
@@ -17,11 +18,27 @@ from config.config import (
     DB_NAME,
     COLL_NAME,
     PDF_DIR,
-    CHUNK_SIZE,
-    CHUNK_OVERLAP,
+    CHUNKER,
     BATCH_SIZE,
-    EMBED_MODEL
+    EMBED_MODEL,
+    PIPELINE_EMBED_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_LOG_INTERVAL,
+    VECTOR_STORAGE,
+    INGEST_EMBED_CACHE_ENABLED,
+    INGEST_EMBED_CACHE_PATH,
+    INGEST_EMBED_CACHE_SIZE,
+    PDF_BACKEND,
+    PDF_WORKERS,
+    PDF_PAGES_PER_TASK
 )
+from ingest.pipeline import IngestPipeline
+from ingest.chunker import make_splitter
+from core.embeddings.vector_codec import encode_vector
+from ingest.embed_cache import IngestEmbeddingCache
+from ingest.incremental import IncrementalStats, SourceSync, file_hash, is_unchanged, load_fingerprints, track_writes
+from core.collection_stats import increment_counts
+from ingest.pdf_extract import ExtractStats, extract_range, page_count, page_ranges, resolve_backend
 
 # # ─── CONFIG ───
 # MONGODB_URI = os.getenv("MONGODB_URI", "your-mongodb-uri")
@@ -35,43 +52,120 @@ from config.config import (
 # BATCH_SIZE = 32
 # MODEL = "voyage-3.5-lite"
 
-print("[INFO] Starting PDF ingestion script")
-
-# ─── MONGODB INIT ───
-mongo_client = MongoClient(MONGODB_URI)
-try:
-    mongo_client.admin.command("ping")
-    print("[INFO] Connected to MongoDB Atlas")
-except Exception as e:
-    raise RuntimeError(f"[ERROR] MongoDB Connection Error: {e}")
-mongo_coll = mongo_client[DB_NAME][COLL_NAME]
-
-# ─── VECTOR CLIENT ───
-client_voy = VoyageClient(api_key=VOYAGE_API_KEY)
-print("[INFO] VoyageAI client initialized")
-
-# ─── TEXT SPLITTER ───
-splitter = RecursiveCharacterTextSplitter(
-    chunk_size=CHUNK_SIZE,
-    chunk_overlap=CHUNK_OVERLAP,
-)
-print("[INFO] Text splitter configured")
+# ─── INIT ───
+# Clientes, índice y splitter se crean en main(), no al importar: con spawn/forkserver cada proceso
+# de extracción vuelve a importar este módulo, y solo necesita ingest.pdf_extract
+mongo_client = mongo_coll = client_voy = embed_cache = splitter = pdf_backend = None
 
-# ─── HELPERS ───
-def extract_text_from_pdf(pdf_path: str) -> str:
-    print(f"[INFO] Reading PDF: {pdf_path}")
+def init():
+    global mongo_client, mongo_coll, client_voy, embed_cache, splitter, pdf_backend
+
+    # ─── MONGODB INIT ───
+    mongo_client = MongoClient(MONGODB_URI)
     try:
-        reader = PdfReader(pdf_path)
-        text = " ".join(page.extract_text() or "" for page in reader.pages)
-        return text.strip()
+        mongo_client.admin.command("ping")
+        print("[INFO] Connected to MongoDB Atlas")
     except Exception as e:
-        print(f"[ERROR] Failed to read {pdf_path}: {e}")
-        return ""
+        raise RuntimeError(f"[ERROR] MongoDB Connection Error: {e}")
+    mongo_coll = mongo_client[DB_NAME][COLL_NAME]
+    # Índice regular sobre source para búsquedas por documento de origen
+    mongo_coll.create_index("source")
+
+    # ─── VECTOR CLIENT ───
+    client_voy = VoyageClient(api_key=VOYAGE_API_KEY)
+    print("[INFO] VoyageAI client initialized")
 
-def chunk_text(text: str, source_name: str) -> List[dict]:
-    chunks = splitter.split_text(text)
-    print(f"[INFO] Split {len(chunks)} chunks from {source_name}")
-    return [{"text": chunk, "source_pdf": source_name, "chunk_idx": idx} for idx, chunk in enumerate(chunks)]
+    # ─── EMBEDDING CACHE ───
+    # Compartida con el otro ingester: el mismo texto con el mismo modelo no se vuelve a embeber
+    if INGEST_EMBED_CACHE_ENABLED:
+        embed_cache = IngestEmbeddingCache(str(project_root / INGEST_EMBED_CACHE_PATH), EMBED_MODEL, INGEST_EMBED_CACHE_SIZE)
+        print(f"[INFO] Ingest embedding cache: {len(embed_cache.store):,} vectors in {INGEST_EMBED_CACHE_PATH}")
+
+    # ─── TEXT SPLITTER ───
+    # ingest.chunker en caracteres (CHUNK_SIZE, los chunks de RecursiveCharacterTextSplitter) o tokens (CHUNK_TOKENS)
+    splitter = make_splitter(CHUNKER)
+    print(f"[INFO] Text splitter configured: {CHUNKER}")
+
+    # ─── PDF BACKEND ───
+    pdf_backend = resolve_backend(PDF_BACKEND)
+    print(f"[INFO] PDF backend: {pdf_backend}, {PDF_WORKERS} extraction workers, {PDF_PAGES_PER_TASK} pages per task")
+
+# ─── HELPERS ───
+def extraction_tasks(pdf_files: List[str], fingerprints: Dict[str, dict],
+                     stats: IncrementalStats) -> Iterator[dict]:
+    # Un PDF con el mismo hash de fichero no se vuelve a leer; los demás se parten en rangos de páginas
+    for pdf_path in pdf_files:
+        source_name = os.path.basename(pdf_path)
+        fp = fingerprints.get(source_name)
+        pdf_hash = file_hash(pdf_path)
+        if is_unchanged(fp, pdf_hash):
+            print(f"[INFO] Skipping unchanged PDF: {source_name}")
+            stats.add(sources_unchanged=1)
+            continue
+        try:
+            total_pages = page_count(pdf_path, pdf_backend)
+        except Exception as e:
+            print(f"[ERROR] Failed to read {pdf_path}: {e}")
+            continue
+        print(f"[INFO] Reading PDF: {pdf_path} ({total_pages} pages)")
+        for start, end in page_ranges(total_pages, PDF_PAGES_PER_TASK):
+            yield {
+                "path": pdf_path, "source": source_name, "hash": pdf_hash, "fingerprint": fp,
+                "size": os.path.getsize(pdf_path), "total_pages": total_pages, "start": start, "end": end
+            }
+
+def extracted_ranges(tasks: Iterator[dict]) -> Iterator[tuple]:
+    # Pool de procesos con ventana acotada; los rangos salen en orden de fichero y página.
+    # spawn y no fork: init() ya abrió MongoClient, que no se puede heredar por fork
+    window = deque()
+    with ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for task in tasks:
+            window.append((task, pool.submit(extract_range, task["path"], task["start"], task["end"], pdf_backend)))
+            if len(window) >= PDF_WORKERS * 2:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
+
+def pdf_chunk_generator(pdf_files: List[str], fingerprints: Dict[str, dict], stats: IncrementalStats,
+                        extract_stats: ExtractStats) -> Generator[dict, None, None]:
+    # Los chunks salen rango a rango (splitter.stream): solo se retiene el último trozo, que puede continuar en el siguiente
+    for source, ranges in groupby(extracted_ranges(extraction_tasks(pdf_files, fingerprints, stats)),
+                                  key=lambda item: item[0]["source"]):
+        first = next(ranges)
+        task = first[0]
+        sync = SourceSync(mongo_coll, source, task["hash"], task["fingerprint"], stats)
+        failed = []
+
+        def texts():
+            for task, future in chain([first], ranges):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # La fuente queda incompleta y se reintenta en la próxima ingesta
+                    print(f"[ERROR] Failed to read {task['path']} pages {task['start']}-{task['end']}: {e}")
+                    failed.append(task)
+                    return
+                extract_stats.add(result, task["size"], task["total_pages"])
+                yield result["text"]
+
+        pending = None
+        for piece in splitter.stream(texts(), joiner=" "):
+            if failed:
+                break
+            chunk = sync.add(piece)
+            if chunk is None:
+                continue
+            if pending is not None:
+                yield pending
+            pending = {**chunk, "source_pdf": source}
+        if failed:
+            continue
+
+        # El total de chunks solo se conoce al final: lo lleva el último chunk nuevo
+        total = sync.finish()
+        if pending is not None:
+            yield {**pending, "source_chunks": total}
+        print(f"[INFO] Split {total} chunks from {source} ({sync.fresh} new or changed)")
 
 def embed_batch(texts: List[str], model: str = EMBED_MODEL) -> List[List[float]]:
     try:
@@ -83,8 +177,43 @@ def embed_batch(texts: List[str], model: str = EMBED_MODEL) -> List[List[float]]
         print(f"[EMBED ERROR] {e}")
         return [None] * len(texts)
 
+def embed_batch_cached(texts: List[str]) -> List[List[float]]:
+    if embed_cache is None:
+        return embed_batch(texts)
+    return embed_cache.embed(texts, embed_batch)
+
+def build_pdf_op(chunk: dict, vector: List[float]) -> UpdateOne:
+    doc = {
+        "_id": chunk["_id"],
+        "text": chunk["text"],
+        "type": "PDF",
+        "source": chunk["source_pdf"],
+        "chunk_idx": chunk["chunk_idx"],
+        "embedding": encode_vector(vector, VECTOR_STORAGE),
+        "username": USERNAME,
+        "ts": int(time.time()),
+        # Huella del fichero para la re-ingesta incremental
+        "source_hash": chunk["source_hash"]
+    }
+    if chunk.get("source_chunks") is not None:
+        doc["source_chunks"] = chunk["source_chunks"]
+    return UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True)
+
+def write_ops(ops: List[UpdateOne]):
+    try:
+        result = mongo_coll.bulk_write(ops, ordered=False)
+        print(f"[INFO] Bulk write executed for {len(ops)} operations")
+        # Contadores de /stats: solo los chunks nuevos cambian el total
+        increment_counts(mongo_client[DB_NAME], "PDF", result.upserted_count)
+    except Exception as e:
+        print(f"[ERROR] MongoDB bulk write failed: {e}")
+        # Continuar con el siguiente batch; sus fuentes conservan el contenido anterior
+        return False
+
 # ─── MAIN INGESTION ───
 def main(interactive: bool = True):
+    print("[INFO] Starting PDF ingestion script")
+    init()
     print("[INFO] Starting ingestion pipeline")
     pdf_files = [os.path.join(PDF_DIR, f) for f in os.listdir(PDF_DIR) if f.endswith(".pdf")]
     print(f"[INFO] Found {len(pdf_files)} PDF files")
@@ -96,52 +225,36 @@ def main(interactive: bool = True):
             print("[INFO] Ingesta cancelada por el usuario.")
             return
 
-    raw_chunks = []
-    for pdf_path in pdf_files:
-        text = extract_text_from_pdf(pdf_path)
-        if text:
-            raw_chunks.extend(chunk_text(text, os.path.basename(pdf_path)))
-
-    print(f"[INFO] Total chunks to process: {len(raw_chunks)}")
-
-    bulk_ops = []
-    total_ok = total_fail = 0
-
-    for i in range(0, len(raw_chunks), BATCH_SIZE):
-        print(f"[INFO] Processing batch {i // BATCH_SIZE + 1}")
-        batch = raw_chunks[i:i + BATCH_SIZE]
-        texts = [b["text"] for b in batch]
-        vectors = embed_batch(texts)
-
-        for chunk, vector in zip(batch, vectors):
-            if vector is None:
-                total_fail += 1
-                continue
-            doc = {
-                "_id": str(uuid.uuid4()),
-                "text": chunk["text"],
-                "type": "PDF",
-                "source": chunk["source_pdf"],
-                "chunk_idx": chunk["chunk_idx"],
-                "embedding": vector,
-                "username": USERNAME,
-                "ts": int(time.time())
-            }
-            bulk_ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True))
-            total_ok += 1
-
-        if len(bulk_ops) >= 200:
-            mongo_coll.bulk_write(bulk_ops, ordered=False)
-            print("[INFO] Bulk write executed for 200+ operations")
-            bulk_ops.clear()
+    fingerprints = load_fingerprints(mongo_coll, [os.path.basename(p) for p in pdf_files])
+    incremental = IncrementalStats()
+    extract_stats = ExtractStats()
 
-    if bulk_ops:
-        mongo_coll.bulk_write(bulk_ops, ordered=False)
-        print("[INFO] Final bulk write executed")
+    # Embedding y escritura corren en paralelo con colas acotadas
+    pipeline = IngestPipeline(
+        embed_fn=embed_batch_cached,
+        build_op=build_pdf_op,
+        write_fn=write_ops,
+        batch_size=BATCH_SIZE,
+        embed_workers=PIPELINE_EMBED_WORKERS,
+        queue_size=PIPELINE_QUEUE_SIZE,
+        log_interval=PIPELINE_LOG_INTERVAL,
+        # Los obsoletos de cada fuente se borran cuando sus chunks nuevos ya están escritos
+        on_written=track_writes
+    )
+    results = pipeline.run(pdf_chunk_generator(pdf_files, fingerprints, incremental, extract_stats))
+    total_ok = results["processed"]
+    total_fail = results["failed"]
+    increment_counts(mongo_client[DB_NAME], "PDF", -incremental.chunks_deleted)
 
     print(f"[INFO] Successfully inserted: {total_ok:,} documents")
     print(f"[INFO] Failed embeddings: {total_fail:,}")
-    print(f"[INFO] Collection size: {mongo_coll.count_documents({}):,}")
+    print(f"[INFO] Incremental: {incremental.summary()}")
+    print(f"[INFO] Extraction ({pdf_backend}):")
+    for line in extract_stats.report() or ["no pages extracted"]:
+        print(f"       {line}")
+    if embed_cache is not None:
+        print(f"[INFO] Embedding cache: {embed_cache.summary()}")
+    print(f"[INFO] Collection size: {mongo_coll.estimated_document_count():,}")
 
 # ─── EXECUTE ───
 if __name__ == "__main__":
@@ -1,11 +1,9 @@
 import time
-import uuid
 import requests
 import xml.etree.ElementTree as ET
-from typing import List, Generator, Iterator
+from typing import Dict, List, Generator, Iterator, Optional, Tuple
 from pymongo import MongoClient, UpdateOne
 from bs4 import BeautifulSoup
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from voyageai import Client as VoyageClient
 from pathlib import Path
 import sys
@@ -18,67 +16,104 @@ from config.config import (
     DB_NAME,
     COLL_NAME,
     SITEMAP_INDEX,
-    CHUNK_SIZE,
-    CHUNK_OVERLAP,
+    CHUNKER,
     BATCH_SIZE,
     EMBED_MODEL,
-    MAX_URLS
+    MAX_URLS,
+    SCRAPE_WORKERS,
+    SCRAPE_PER_HOST,
+    SCRAPE_MIN_DELAY,
+    SCRAPE_MAX_RETRIES,
+    SCRAPE_TIMEOUT,
+    SCRAPE_MAX_BACKOFF,
+    PIPELINE_EMBED_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_LOG_INTERVAL,
+    VECTOR_STORAGE,
+    INGEST_EMBED_CACHE_ENABLED,
+    INGEST_EMBED_CACHE_PATH,
+    INGEST_EMBED_CACHE_SIZE
 )
+from ingest.fetcher import ConcurrentFetcher, FetchStats, error_class
+from ingest.pipeline import IngestPipeline
+from ingest.chunker import make_splitter
+from core.embeddings.vector_codec import encode_vector
+from ingest.embed_cache import IngestEmbeddingCache
+from ingest.incremental import IncrementalStats, content_hash, is_unchanged, load_fingerprints, sync_source, track_writes
+from core.collection_stats import increment_counts
 
-print("[INFO] Starting streaming web ingestion script")
+# ─── INIT ───
+# Clientes, índice, splitter y fetcher se crean en main(), no al importar (como en ingest_pdf)
+mongo_client = mongo_coll = client_voy = embed_cache = splitter = fetcher = None
 
-# ─── MONGODB INIT ───
-mongo_client = MongoClient(MONGODB_URI)
-try:
-    mongo_client.admin.command("ping")
-    print("[INFO] Connected to MongoDB Atlas")
-except Exception as e:
-    raise RuntimeError(f"[ERROR] MongoDB Connection Error: {e}")
-mongo_coll = mongo_client[DB_NAME][COLL_NAME]
+def init():
+    global mongo_client, mongo_coll, client_voy, embed_cache, splitter, fetcher
 
-# ─── VECTOR CLIENT ───
-client_voy = VoyageClient(api_key=VOYAGE_API_KEY)
-print("[INFO] VoyageAI client initialized")
+    # ─── MONGODB INIT ───
+    mongo_client = MongoClient(MONGODB_URI)
+    try:
+        mongo_client.admin.command("ping")
+        print("[INFO] Connected to MongoDB Atlas")
+    except Exception as e:
+        raise RuntimeError(f"[ERROR] MongoDB Connection Error: {e}")
+    mongo_coll = mongo_client[DB_NAME][COLL_NAME]
+    # Índice regular sobre source para las huellas por URL y la re-ingesta incremental
+    mongo_coll.create_index("source")
 
-# ─── TEXT SPLITTER ───
-splitter = RecursiveCharacterTextSplitter(
-    chunk_size=CHUNK_SIZE,
-    chunk_overlap=CHUNK_OVERLAP,
-)
-print("[INFO] Text splitter configured")
+    # ─── VECTOR CLIENT ───
+    client_voy = VoyageClient(api_key=VOYAGE_API_KEY)
+    print("[INFO] VoyageAI client initialized")
+
+    # ─── EMBEDDING CACHE ───
+    # Compartida con el otro ingester: el mismo texto con el mismo modelo no se vuelve a embeber
+    if INGEST_EMBED_CACHE_ENABLED:
+        embed_cache = IngestEmbeddingCache(str(project_root / INGEST_EMBED_CACHE_PATH), EMBED_MODEL, INGEST_EMBED_CACHE_SIZE)
+        print(f"[INFO] Ingest embedding cache: {len(embed_cache.store):,} vectors in {INGEST_EMBED_CACHE_PATH}")
+
+    # ─── TEXT SPLITTER ───
+    # ingest.chunker en caracteres (CHUNK_SIZE, los chunks de RecursiveCharacterTextSplitter) o tokens (CHUNK_TOKENS)
+    splitter = make_splitter(CHUNKER)
+    print(f"[INFO] Text splitter configured: {CHUNKER}")
+
+    # ─── HTTP FETCHER ───
+    fetcher = ConcurrentFetcher(
+        max_workers=SCRAPE_WORKERS,
+        per_host=SCRAPE_PER_HOST,
+        min_delay=SCRAPE_MIN_DELAY,
+        max_retries=SCRAPE_MAX_RETRIES,
+        timeout=SCRAPE_TIMEOUT,
+        max_backoff=SCRAPE_MAX_BACKOFF
+    )
+    print(f"[INFO] Concurrent fetcher configured: {SCRAPE_WORKERS} workers, {SCRAPE_PER_HOST} per host")
 
-# Obtener URLs
-def get_urls_from_sitemap(sitemap_url: str) -> List[str]:
+# Obtener URLs con su <lastmod> (None si el sitemap no lo publica)
+def get_sitemap_entries(sitemap_url: str) -> List[Tuple[str, Optional[str]]]:
     print(f"[INFO] Fetching sitemap: {sitemap_url}")
     try:
         resp = requests.get(sitemap_url, timeout=60)
         resp.raise_for_status()
         root = ET.fromstring(resp.content)
         ns = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
-        urls = [loc.text for loc in root.findall(".//ns:loc", ns)]
-        print(f"[INFO] Found {len(urls)} URLs in sitemap")
-        return urls
+        entries = []
+        for node in root.findall("ns:url", ns) + root.findall("ns:sitemap", ns):
+            loc = node.findtext("ns:loc", namespaces=ns)
+            if loc:
+                lastmod = node.findtext("ns:lastmod", namespaces=ns)
+                entries.append((loc.strip(), lastmod.strip() if lastmod else None))
+        print(f"[INFO] Found {len(entries)} URLs in sitemap ({sum(1 for _, lm in entries if lm)} with lastmod)")
+        return entries
     except Exception as e:
         print(f"[ERROR] Failed to fetch sitemap: {e}")
         return []
 
-# verificar url procesada
-def is_url_already_processed(url: str) -> bool:
-    return mongo_coll.find_one({"source": url}, {"_id": 1}) is not None
-
 # scrapping
 def scrape_page(url: str) -> tuple[str, dict]:
 
     try:
         print(f"[INFO] Scraping URL: {url}")
         
-        # Headers para evitar bloqueos
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        resp = requests.get(url, timeout=15, headers=headers)
-        resp.raise_for_status()
+        # Sesión compartida (keep-alive) con reintentos y límites por host
+        resp = fetcher.get(url)
         
         soup = BeautifulSoup(resp.content, "html.parser")
         
@@ -126,6 +161,7 @@ def scrape_page(url: str) -> tuple[str, dict]:
         
     except Exception as e:
         print(f"[WARN] Failed to scrape {url}: {e}")
+        fetcher.stats.record_error(error_class(e))
         return "", {"error": str(e)}
 
 # validate content
@@ -147,37 +183,54 @@ def validate_content(content: str, url: str, min_length: int = 100) -> bool:
 # GENERADORES STREAMING
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def url_chunk_generator(urls: List[str], splitter: RecursiveCharacterTextSplitter) -> Generator[dict, None, None]:
-# Generate chunks
+def url_chunk_generator(urls: List[str], splitter,
+                        fingerprints: Dict[str, dict], stats: IncrementalStats,
+                        lastmods: Optional[Dict[str, Optional[str]]] = None) -> Generator[dict, None, None]:
+# Generate chunks (solo los nuevos o modificados)
+    lastmods = lastmods or {}
     processed_urls = 0
     skipped_urls = 0
-    
-    for url in urls:
-        # Skip 
-        if is_url_already_processed(url):
-            print(f"[INFO] Skipping already processed URL: {url}")
-            skipped_urls += 1
-            continue
-        
-        # Scraping
-        content, metadata = scrape_page(url)
+
+    def pending_urls():
+        nonlocal skipped_urls
+        for url in urls:
+            # Skip sin descargar: ingesta completa y mismo <lastmod> que en el sitemap
+            fp = fingerprints.get(url)
+            lastmod = lastmods.get(url)
+            if lastmod and fp and fp["complete"] and fp["lastmod"] == lastmod:
+                skipped_urls += 1
+                stats.add(sources_unchanged=1)
+                continue
+            yield url
+
+    # Scraping concurrente; los resultados llegan en el orden del sitemap
+    for url, (content, metadata) in fetcher.map_ordered(scrape_page, pending_urls()):
 
         if not validate_content(content, url):
             skipped_urls += 1
             continue
         
+        # Contenido idéntico al ya ingerido: solo se actualiza lastmod, sin embeber
+        fp = fingerprints.get(url)
+        page_hash = content_hash(content)
+        if is_unchanged(fp, page_hash):
+            stats.add(sources_unchanged=1)
+            if lastmods.get(url) and fp["lastmod"] != lastmods[url]:
+                mongo_coll.update_many({"source": url}, {"$set": {"lastmod": lastmods[url]}})
+            continue
+
         # Generate chunks
         try:
             chunks = splitter.split_text(content)
+            fresh = sync_source(mongo_coll, url, chunks, page_hash, fp, stats, extra={"lastmod": lastmods.get(url)})
             processed_urls += 1
             
-            print(f"[INFO] Generated {len(chunks)} chunks from {url}")
+            print(f"[INFO] Generated {len(chunks)} chunks from {url} ({len(fresh)} new or changed)")
             
-            for idx, chunk in enumerate(chunks):
+            for chunk in fresh:
                 yield {
-                    "text": chunk,
+                    **chunk,
                     "source_url": url,
-                    "chunk_idx": idx,
                     "metadata": metadata,
                     "total_chunks": len(chunks)
                 }
@@ -222,102 +275,115 @@ def embed_batch_with_retry(texts: List[str], model: str = EMBED_MODEL, max_retri
                 print(f"[ERROR] All embedding attempts failed")
                 return [None] * len(texts)
 
+def embed_batch_cached(texts: List[str]) -> List[List[float]]:
+    if embed_cache is None:
+        return embed_batch_with_retry(texts)
+    return embed_cache.embed(texts, embed_batch_with_retry)
+
+# documento MongoDB por chunk
+def build_url_op(chunk: dict, embedding: List[float]) -> UpdateOne:
+    doc = {
+        "_id": chunk["_id"],
+        "text": chunk["text"],
+        "type": "URL",
+        "source": chunk["source_url"],
+        "chunk_idx": chunk["chunk_idx"],
+        "embedding": encode_vector(embedding, VECTOR_STORAGE),
+        "username": USERNAME,
+        "ts": int(time.time()),
+        # Huella de la URL para la re-ingesta incremental
+        "source_hash": chunk["source_hash"],
+        "source_chunks": chunk["source_chunks"],
+        "lastmod": chunk["lastmod"],
+        # Metadata adicional
+        "metadata": {
+            "title": chunk["metadata"].get("title", ""),
+            "content_length": chunk["metadata"].get("content_length", 0),
+            "total_chunks": chunk["total_chunks"],
+            "scraping_date": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+    }
+    return UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True)
+
+def write_ops(ops: List[UpdateOne]):
+    try:
+        result = mongo_coll.bulk_write(ops, ordered=False)
+        print(f"[INFO] Bulk write executed: {len(ops)} operations")
+        print(f"[INFO] Inserted: {result.upserted_count}, Modified: {result.modified_count}")
+        # Contadores de /stats: solo los chunks nuevos cambian el total
+        increment_counts(mongo_client[DB_NAME], "URL", result.upserted_count)
+    except Exception as e:
+        print(f"[ERROR] MongoDB bulk write failed: {e}")
+        # Continuar con el siguiente batch; sus fuentes conservan el contenido anterior
+        return False
+
 # streaming for batch
-def main_streaming_web_approach(urls: List[str]):
+def main_streaming_web_approach(urls: List[str], lastmods: Optional[Dict[str, Optional[str]]] = None):
     print(f"[INFO] Starting streaming web ingestion for {len(urls)} URLs")
     
-    # Contadores
-    total_processed = 0
-    total_failed = 0
-    total_urls_processed = 0
-    bulk_ops = []
-    
+    # Huellas en bloque de URLs ya ingeridas
+    dedup_start = time.time()
+    fingerprints = load_fingerprints(mongo_coll, urls)
+    dedup_time = time.time() - dedup_start
+    complete = sum(1 for fp in fingerprints.values() if fp["complete"])
+    print(f"[INFO] Already ingested: {complete:,} of {len(urls):,} URLs, {len(fingerprints) - complete:,} incomplete (checked in {dedup_time:.2f}s)")
+
     # Crear generador de chunks
-    chunk_stream = url_chunk_generator(urls, splitter)
+    incremental = IncrementalStats()
+    chunk_stream = url_chunk_generator(urls, splitter, fingerprints, incremental, lastmods)
     
-    # Procesar en batches
-    for batch_num, chunk_batch in enumerate(batch_generator(chunk_stream, BATCH_SIZE)):
-        print(f"[INFO] Processing batch {batch_num + 1} with {len(chunk_batch)} chunks")
-        
-        # Extraer textos para embedding
-        texts = [chunk["text"] for chunk in chunk_batch]
-        
-        # Generar embeddings con retry
-        embeddings = embed_batch_with_retry(texts)
-        
-        # Preparar documentos para MongoDB
-        for chunk, embedding in zip(chunk_batch, embeddings):
-            if embedding is None:
-                total_failed += 1
-                continue
-            
-            doc = {
-                "_id": str(uuid.uuid4()),
-                "text": chunk["text"],
-                "type": "URL",
-                "source": chunk["source_url"],
-                "chunk_idx": chunk["chunk_idx"],
-                "embedding": embedding,
-                "username": USERNAME,
-                "ts": int(time.time()),
-                # Metadata adicional
-                "metadata": {
-                    "title": chunk["metadata"].get("title", ""),
-                    "content_length": chunk["metadata"].get("content_length", 0),
-                    "total_chunks": chunk["total_chunks"],
-                    "scraping_date": time.strftime("%Y-%m-%d %H:%M:%S")
-                }
-            }
-            bulk_ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True))
-            total_processed += 1
-        
-        # Escribir a MongoDB cuando el buffer esté lleno
-        if len(bulk_ops) >= 200:
-            try:
-                result = mongo_coll.bulk_write(bulk_ops, ordered=False)
-                print(f"[INFO] Bulk write executed: {len(bulk_ops)} operations")
-                print(f"[INFO] Inserted: {result.upserted_count}, Modified: {result.modified_count}")
-                bulk_ops.clear()
-            except Exception as e:
-                print(f"[ERROR] MongoDB bulk write failed: {e}")
-                # Continuar con el siguiente batch
-        
-        # Progreso cada 10 batches
-        if (batch_num + 1) % 10 == 0:
-            current_collection_size = mongo_coll.count_documents({})
-            print(f"[PROGRESS] Processed {batch_num + 1} batches. Collection size: {current_collection_size:,}")
+    # Scraping/chunking, embedding y escritura corren en paralelo con colas acotadas
+    pipeline = IngestPipeline(
+        embed_fn=embed_batch_cached,
+        build_op=build_url_op,
+        write_fn=write_ops,
+        batch_size=BATCH_SIZE,
+        embed_workers=PIPELINE_EMBED_WORKERS,
+        queue_size=PIPELINE_QUEUE_SIZE,
+        log_interval=PIPELINE_LOG_INTERVAL,
+        # Los obsoletos de cada fuente se borran cuando sus chunks nuevos ya están escritos
+        on_written=track_writes
+    )
+    results = pipeline.run(chunk_stream)
+    total_processed = results["processed"]
+    total_failed = results["failed"]
     
-    # Escribir operaciones restantes
-    if bulk_ops:
-        try:
-            result = mongo_coll.bulk_write(bulk_ops, ordered=False)
-            print(f"[INFO] Final bulk write: {len(bulk_ops)} operations")
-            print(f"[INFO] Final - Inserted: {result.upserted_count}, Modified: {result.modified_count}")
-        except Exception as e:
-            print(f"[ERROR] Final MongoDB write failed: {e}")
-    
-    # Estadísticas finales
-    final_collection_size = mongo_coll.count_documents({})
+    increment_counts(mongo_client[DB_NAME], "URL", -incremental.chunks_deleted)
+
+    # Estadísticas finales (conteo estimado: metadatos, sin recorrer la colección)
+    final_collection_size = mongo_coll.estimated_document_count()
     print(f"\n[SUMMARY] Processing Complete!")
     print(f"[SUMMARY] Successfully processed chunks: {total_processed:,}")
     print(f"[SUMMARY] Failed embeddings: {total_failed:,}")
-    print(f"[SUMMARY] Success rate: {(total_processed/(total_processed + total_failed)*100):.1f}%")
+    if total_processed + total_failed:
+        print(f"[SUMMARY] Success rate: {(total_processed/(total_processed + total_failed)*100):.1f}%")
     print(f"[SUMMARY] Final collection size: {final_collection_size:,}")
+    print(f"[SUMMARY] Incremental: {incremental.summary()} (fingerprint check: {dedup_time:.2f}s)")
+    if embed_cache is not None:
+        print(f"[SUMMARY] Embedding cache: {embed_cache.summary()}")
     
     return {
         "processed": total_processed,
         "failed": total_failed,
-        "collection_size": final_collection_size
+        "collection_size": final_collection_size,
+        "skipped_existing": incremental.sources_unchanged,
+        "chunks_reused": incremental.chunks_reused,
+        "chunks_deleted": incremental.chunks_deleted,
+        "dedup_time": dedup_time
     }
 
 #main funciton 
 
 def main(interactive: bool = True):
     """Función principal con estrategia streaming"""
+    print("[INFO] Starting streaming web ingestion script")
+    init()
     print("[INFO] Starting streaming web ingestion pipeline")
     
     # Obtener URLs del sitemap
-    all_urls = get_urls_from_sitemap(SITEMAP_INDEX)
+    entries = get_sitemap_entries(SITEMAP_INDEX)
+    all_urls = [url for url, _ in entries]
+    lastmods = dict(entries)
     if not all_urls:
         print("[ERROR] No URLs found in sitemap. Exiting.")
         return
@@ -343,16 +409,23 @@ def main(interactive: bool = True):
             return
     # Ejecutar procesamiento streaming
     start_time = time.time()
+    fetcher.stats = FetchStats()
     #mongo_coll.delete_many({})
-    print(f"[INFO] Delete Collection, collection count: {mongo_coll.count_documents({})}")
-    results = main_streaming_web_approach(all_urls)
+    print(f"[INFO] Delete Collection, collection count: {mongo_coll.estimated_document_count()}")
+    results = main_streaming_web_approach(all_urls, lastmods)
     end_time = time.time()
     
     # Reporte final con tiempos
     processing_time = end_time - start_time
+    fetch_report = fetcher.stats.report()
     print(f"\n[FINAL REPORT]")
     print(f"Processing time: {processing_time:.1f} seconds ({processing_time/60:.1f} minutes)")
-    print(f"Average time per URL: {processing_time/len(all_urls):.2f} seconds")
+    print(f"Fetch throughput: {fetch_report['urls_per_sec']:.2f} URLs/s, {fetch_report['bytes_per_sec']/1024:.1f} KB/s")
+    print(f"Fetched OK: {fetch_report['ok']:,} | Requests: {fetch_report['requests']:,} | Retries: {fetch_report['retries']:,} | Bytes: {fetch_report['bytes']:,}")
+    if fetch_report["errors"]:
+        print("Errors by class: " + ", ".join(f"{kind}={count}" for kind, count in sorted(fetch_report["errors"].items())))
+    else:
+        print("Errors by class: none")
     if results["processed"] > 0:
         print(f"Average chunks per URL: {results['processed']/len(all_urls):.1f}")
     print(f"Memory usage: Minimal (streaming approach)")
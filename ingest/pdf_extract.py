@@ -0,0 +1,93 @@
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# Extracción de texto de PDFs por rangos de páginas; se ejecuta en los procesos del pool,
+# así que este módulo no debe tener efectos al importarse (conexiones, clientes, etc.)
+
+BACKENDS = ("pymupdf", "pypdf2")
+
+
+def _open_pymupdf(path: str):
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf  # PyMuPDF < 1.24.3
+    return pymupdf.open(path)
+
+
+def resolve_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{backend}', expected one of {BACKENDS}")
+    if backend == "pymupdf":
+        try:
+            import pymupdf  # noqa: F401
+        except ImportError:
+            try:
+                import fitz  # noqa: F401
+            except ImportError:
+                print("[WARN] PyMuPDF not installed, falling back to PyPDF2")
+                return "pypdf2"
+    return backend
+
+
+def page_count(path: str, backend: str) -> int:
+    if backend == "pymupdf":
+        with _open_pymupdf(path) as doc:
+            return doc.page_count
+    from PyPDF2 import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def page_ranges(total_pages: int, pages_per_task: int) -> List[Tuple[int, int]]:
+    return [(start, min(start + pages_per_task, total_pages)) for start in range(0, total_pages, pages_per_task)]
+
+
+def extract_range(path: str, start: int, end: int, backend: str) -> dict:
+    """Texto de las páginas [start, end) de un PDF, con los datos para el reporte por worker."""
+    t0 = time.perf_counter()
+    texts = []
+    if backend == "pymupdf":
+        with _open_pymupdf(path) as doc:
+            for i in range(start, end):
+                texts.append(doc.load_page(i).get_text() or "")
+    else:
+        from PyPDF2 import PdfReader
+        reader = PdfReader(path)
+        for i in range(start, end):
+            texts.append(reader.pages[i].extract_text() or "")
+    return {
+        "path": path,
+        "start": start,
+        "end": end,
+        "text": " ".join(texts).strip(),
+        "pages": end - start,
+        "elapsed": time.perf_counter() - t0,
+        "worker": os.getpid()
+    }
+
+
+class ExtractStats:
+    """Páginas/s y MB/s por proceso del pool (sobre su tiempo ocupado)."""
+
+    def __init__(self):
+        self.workers: Dict[int, dict] = defaultdict(lambda: {"pages": 0, "bytes": 0.0, "busy": 0.0, "tasks": 0})
+
+    def add(self, result: dict, file_size: int, total_pages: int):
+        worker = self.workers[result["worker"]]
+        worker["pages"] += result["pages"]
+        # Bytes del fichero atribuidos en proporción a las páginas del rango
+        worker["bytes"] += file_size * result["pages"] / max(total_pages, 1)
+        worker["busy"] += result["elapsed"]
+        worker["tasks"] += 1
+
+    def report(self) -> List[str]:
+        lines = []
+        for pid, worker in sorted(self.workers.items()):
+            busy = max(worker["busy"], 1e-9)
+            lines.append(
+                f"worker {pid}: {worker['tasks']} tasks, {worker['pages']:,} pages, "
+                f"{worker['pages'] / busy:.1f} pages/s, {worker['bytes'] / busy / 1e6:.2f} MB/s"
+            )
+        return lines
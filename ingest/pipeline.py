@@ -0,0 +1,196 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Optional
+
+_DONE = object()
+
+
+class StageStats:
+    def __init__(self, name: str, workers: int = 1):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, items: int = 1):
+        with self._lock:
+            self.busy += seconds
+            self.items += items
+
+    def utilization(self, elapsed: float) -> float:
+        return self.busy / (elapsed * self.workers) if elapsed > 0 else 0.0
+
+
+class IngestPipeline:
+    """Chunking → embedding (varios batches en vuelo) → escritura, con colas acotadas entre etapas.
+
+    La memoria queda acotada por queue_size * batch_size chunks por cola, igual que el enfoque streaming.
+    on_written(chunks, ok) se llama con los chunks de cada escritura (ok=False si write_fn devolvió False)
+    y con los que fallaron al embeber.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[Optional[List[float]]]],
+                 build_op: Callable[[dict, List[float]], Any],
+                 write_fn: Callable[[List[Any]], Any],
+                 batch_size: int = 64, embed_workers: int = 3, queue_size: int = 4,
+                 write_batch: int = 200, log_interval: float = 10.0,
+                 on_written: Optional[Callable[[List[dict], bool], None]] = None):
+        self.embed_fn = embed_fn
+        self.build_op = build_op
+        self.write_fn = write_fn
+        self.on_written = on_written
+        self.batch_size = batch_size
+        self.embed_workers = embed_workers
+        self.write_batch = write_batch
+        self.log_interval = log_interval
+        self.embed_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.write_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.stats = {
+            "chunk": StageStats("chunk"),
+            "embed": StageStats("embed", embed_workers),
+            "write": StageStats("write"),
+        }
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self._errors: List[BaseException] = []
+        self._stop = threading.Event()
+
+    # ─── STAGES ───
+    def _produce(self, chunks: Iterable[dict]):
+        try:
+            iterator = iter(chunks)
+            batch = []
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    self.stats["chunk"].add(time.perf_counter() - start, 0)
+                batch.append(chunk)
+                if len(batch) >= self.batch_size:
+                    self.stats["chunk"].add(0, len(batch))
+                    self.embed_q.put(batch)
+                    batch = []
+            if batch:
+                self.stats["chunk"].add(0, len(batch))
+                self.embed_q.put(batch)
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            for _ in range(self.embed_workers):
+                self.embed_q.put(_DONE)
+
+    def _embed(self):
+        # Un batch fallido cuenta como chunks fallidos; el worker sigue vivo para no bloquear al productor
+        while True:
+            batch = self.embed_q.get()
+            if batch is _DONE:
+                break
+            if self._stop.is_set():
+                continue
+            start = time.perf_counter()
+            try:
+                vectors = self.embed_fn([chunk["text"] for chunk in batch])
+            except Exception as e:
+                print(f"[EMBED ERROR] Pipeline batch failed: {e}")
+                vectors = [None] * len(batch)
+            self.stats["embed"].add(time.perf_counter() - start, len(batch))
+            self.write_q.put((batch, vectors))
+        self.write_q.put(_DONE)
+
+    def _flush(self, ops: List[Any], chunks: List[dict]):
+        ok = self.write_fn(ops) is not False
+        if self.on_written is not None:
+            self.on_written(chunks, ok)
+
+    def _write(self):
+        finished_workers = 0
+        ops, op_chunks = [], []
+        try:
+            while finished_workers < self.embed_workers:
+                item = self.write_q.get()
+                if item is _DONE:
+                    finished_workers += 1
+                    continue
+                batch, vectors = item
+                start = time.perf_counter()
+                self.batches += 1
+                for chunk, vector in zip(batch, vectors):
+                    if vector is None:
+                        self.failed += 1
+                        if self.on_written is not None:
+                            self.on_written([chunk], False)
+                        continue
+                    op = self.build_op(chunk, vector)
+                    if op is not None:
+                        ops.append(op)
+                        op_chunks.append(chunk)
+                    elif self.on_written is not None:
+                        self.on_written([chunk], True)
+                    self.processed += 1
+                if len(ops) >= self.write_batch:
+                    self._flush(ops, op_chunks)
+                    ops, op_chunks = [], []
+                self.stats["write"].add(time.perf_counter() - start, len(batch))
+            if ops:
+                start = time.perf_counter()
+                self._flush(ops, op_chunks)
+                self.stats["write"].add(time.perf_counter() - start, 0)
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+            # Drenar para no bloquear a los workers de embedding
+            while finished_workers < self.embed_workers:
+                if self.write_q.get() is _DONE:
+                    finished_workers += 1
+
+    # ─── MONITOR ───
+    def _log(self, start: float, final: bool = False):
+        elapsed = time.time() - start
+        parts = [
+            f"{name} {stage.utilization(elapsed) * 100:.0f}%"
+            + (f" ({stage.workers} workers)" if stage.workers > 1 else "")
+            for name, stage in self.stats.items()
+        ]
+        bottleneck = max(self.stats.values(), key=lambda stage: stage.utilization(elapsed)).name
+        label = "[PIPELINE SUMMARY]" if final else "[PIPELINE]"
+        print(
+            f"{label} {elapsed:.0f}s | utilization: {' | '.join(parts)} | "
+            f"queues embed={self.embed_q.qsize()}/{self.embed_q.maxsize} write={self.write_q.qsize()}/{self.write_q.maxsize} | "
+            f"chunks ok={self.processed:,} failed={self.failed:,} | bottleneck: {bottleneck}"
+        )
+
+    def run(self, chunks: Iterable[dict]) -> dict:
+        start = time.time()
+        threads = [threading.Thread(target=self._produce, args=(chunks,), name="pipeline-chunk", daemon=True)]
+        threads += [threading.Thread(target=self._embed, name=f"pipeline-embed-{i}", daemon=True) for i in range(self.embed_workers)]
+        threads += [threading.Thread(target=self._write, name="pipeline-write", daemon=True)]
+        for thread in threads:
+            thread.start()
+
+        writer = threads[-1]
+        while writer.is_alive():
+            writer.join(timeout=self.log_interval)
+            if writer.is_alive():
+                self._log(start)
+        for thread in threads:
+            thread.join()
+
+        self._log(start, final=True)
+        if self._errors:
+            raise self._errors[0]
+
+        elapsed = time.time() - start
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "batches": self.batches,
+            "elapsed": elapsed,
+            "utilization": {name: stage.utilization(elapsed) for name, stage in self.stats.items()}
+        }
@@ -1,34 +1,417 @@
 from core.rag.retriever import rag_retriever
 from core.rag.generator import rag_generator
+from core.rag.semantic_cache import semantic_cache
+from core.observability import trace_request
+from core.search.filters import validate_filters
+from core.deadline import Deadline, DeadlineExceeded
+from config.config import BATCH_CONCURRENCY, BATCH_MAX_QUERIES, REQUEST_DEADLINE_MS, RERANK_MODES
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import math
+import statistics
 import time
 
-def search_rag(query: str, context_k: int, ann_k: int):
-    print(f"[INFO] Starting RAG search for query: '{query}'")
-    print(f"[DEBUG] Parameters: context_k={context_k}, ann_k={ann_k}") 
-    
-    total_start = time.time()   
-    
-    retrieval_start = time.time()
-    documents, before, after = rag_retriever.retrieve_documents(query, context_k, ann_k)
-    retrieval_time = time.time() - retrieval_start
-    
-    generation_start = time.time()
-    final_answer = rag_generator.generate_answer(query, documents)
-    generation_time = time.time() - generation_start
-    
-    total_time = time.time() - total_start
-    
-    performance_metrics = {
+logger = logging.getLogger(__name__)
+
+def _build_metrics(query: str, ann_k: int, documents: list, total_time: float, retrieval_time: float, generation_time: float) -> dict:
+    return {
         "total_time": total_time,
         "retrieval_time": retrieval_time,
         "generation_time": generation_time,
         "documents_processed": len(documents),
         "estimated_cost": len(query.split()) / 1000 * 0.12,  # Estimación simple
         "vector_search_limit": ann_k,
-        "candidates_searched": ann_k*5,
+        "candidates_searched": rag_retriever.search_engine.num_candidates(ann_k),
         "model_used": "voyage-3.5-lite"
     }
-    
-    print(f"[METRICS] Total: {total_time:.3f}s, Retrieval: {retrieval_time:.3f}s, Generation: {generation_time:.3f}s")
-    print("[INFO] RAG pipeline completed")
-    return final_answer, before, after, performance_metrics
\ No newline at end of file
+
+def _semantic_metrics(hit) -> dict:
+    if semantic_cache is None:
+        return {"enabled": False}
+    stats = semantic_cache.stats()
+    return {
+        "enabled": True,
+        "hit": hit is not None,
+        "similarity": hit["similarity"] if hit else None,
+        "matched_query": hit["query"] if hit else None,
+        "hits": stats["hits"],
+        "misses": stats["misses"],
+        "hit_rate": stats["hit_rate"]
+    }
+
+def _deadline(deadline_ms: Optional[int]) -> Deadline:
+    return Deadline.from_ms(REQUEST_DEADLINE_MS if deadline_ms is None else deadline_ms)
+
+def _check_rerank_mode(rerank_mode: Optional[str]) -> Optional[str]:
+    # None: el modo configurado en el retriever (RERANK_MODE)
+    if rerank_mode is not None and rerank_mode not in RERANK_MODES:
+        raise ValueError(f"Unsupported rerank_mode '{rerank_mode}'; allowed: {', '.join(RERANK_MODES)}")
+    return rerank_mode
+
+def _semantic_lookup(query: str, context_k: int, ann_k: int, filters=None, query_vector=None, deadline=None,
+                     rerank_mode: Optional[str] = None):
+    # Devuelve (vector de la pregunta, entrada del cache o None)
+    if semantic_cache is None:
+        return query_vector, None
+    q_vec = query_vector if query_vector is not None else rag_retriever.embed_query(query, deadline)
+    if q_vec is None:
+        return None, None
+    return q_vec, semantic_cache.lookup(q_vec, context_k, ann_k, filters, rerank_mode or rag_retriever.rerank_mode)
+
+def _semantic_store(query: str, q_vec, context_k: int, ann_k: int, documents: list, final_answer: str, before: str, after: str,
+                    filters=None, deadline=None, generation_stats: Optional[Dict] = None, rerank_mode: Optional[str] = None):
+    if semantic_cache is None or q_vec is None or not documents:
+        return
+    if generation_stats and generation_stats.get("llm_error"):
+        # El LLM falló (también a mitad de un stream, con parte de la respuesta ya enviada)
+        return
+    if deadline is not None and deadline.degradations:
+        # Una respuesta degradada (sin rerank, contexto recortado, solo fuentes) no se reutiliza
+        return
+    semantic_cache.store(query, q_vec, context_k, ann_k, [d.metadata["id"] for d in documents], final_answer, before, after,
+                         filters, rerank_mode or rag_retriever.rerank_mode)
+
+def _cached_response(query: str, ann_k: int, hit: dict, total_start: float, trace: dict, deadline: Deadline):
+    total_time = time.time() - total_start
+    performance_metrics = _build_metrics(query, ann_k, hit["doc_ids"], total_time, total_time, 0.0)
+    performance_metrics["semantic_cache"] = _semantic_metrics(hit)
+    performance_metrics["deadline"] = deadline.report()
+    performance_metrics["trace"] = trace["spans"]
+    trace["cache_hit"] = True
+    logger.info("Metrics: Semantic cache hit (similarity %.4f) in %.3fs", hit['similarity'], total_time)
+    return hit["answer"], hit["before"], hit["after"], performance_metrics
+
+# ─── Degradación por deadline en la generación ───
+def _retrieval_only_answer(documents: list) -> str:
+    sources = list(dict.fromkeys(d.metadata.get("source", "https://unknown-source") for d in documents))
+    answer = "The answer could not be generated within the time limit."
+    if sources:
+        answer += " The most relevant sources are:\n" + "\n".join(f"- {source}" for source in sources[:5])
+    return answer
+
+def _fit_context(documents: list, deadline: Deadline) -> list:
+    # Si queda menos tiempo del previsto para el LLM, el prompt lleva proporcionalmente menos chunks
+    budget, planned = deadline.budget("generate"), deadline.planned("generate")
+    if budget is None or not documents or not planned or budget >= planned:
+        return documents
+    keep = max(1, math.ceil(len(documents) * budget / planned))
+    if keep < len(documents):
+        deadline.degrade("shrink_context", "generate", context_k=len(documents), kept=keep)
+    return documents[:keep]
+
+def _generate(query: str, documents: list, stats: dict, deadline: Deadline) -> str:
+    documents = _fit_context(documents, deadline)
+    if not deadline.can_run("generate"):
+        deadline.degrade("retrieval_only", "generate", reason="no budget")
+        return _retrieval_only_answer(documents)
+    try:
+        return deadline.run("generate", rag_generator.generate_answer, query, documents, stats=stats)
+    except DeadlineExceeded:
+        deadline.degrade("retrieval_only", "generate", reason="timeout")
+        return _retrieval_only_answer(documents)
+
+async def _agenerate(query: str, documents: list, stats: dict, deadline: Deadline) -> str:
+    documents = _fit_context(documents, deadline)
+    if not deadline.can_run("generate"):
+        deadline.degrade("retrieval_only", "generate", reason="no budget")
+        return _retrieval_only_answer(documents)
+    try:
+        return await deadline.arun("generate", rag_generator.agenerate_answer(query, documents, stats=stats))
+    except DeadlineExceeded:
+        deadline.degrade("retrieval_only", "generate", reason="timeout")
+        return _retrieval_only_answer(documents)
+
+def warmup() -> dict:
+    """Crea clientes y abre pools antes de la primera pregunta. Llamar después del fork
+    (post_fork de gunicorn, startup ASGI); importar este módulo ya no abre ninguna conexión."""
+    timings = {}
+    steps = (
+        ("embedder", rag_retriever.embedder.warmup),
+        ("vector_search", rag_retriever.search_engine.warmup),
+        ("generator", rag_generator.warmup)
+    )
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning("Warmup of %s failed: %s", name, e)
+        timings[name] = time.perf_counter() - start
+    logger.info("Warmup completed in %.3fs: %s", sum(timings.values()),
+                ", ".join(f"{name}={seconds:.3f}s" for name, seconds in timings.items()))
+    return timings
+
+async def awarmup() -> dict:
+    timings = await asyncio.to_thread(warmup)
+    start = time.perf_counter()
+    try:
+        await rag_retriever.search_engine.awarmup()
+    except Exception as e:
+        logger.warning("Warmup of async vector search failed: %s", e)
+    timings["async_vector_search"] = time.perf_counter() - start
+    return timings
+
+def search_rag(query: str, context_k: int, ann_k: int, filters: Optional[Dict] = None, deadline_ms: Optional[int] = None,
+               rerank_mode: Optional[str] = None):
+    """filters: campos type/source/username/ts (ver core.search.filters), aplicados como pre-filtro del ANN.
+    deadline_ms: presupuesto de latencia (por defecto REQUEST_DEADLINE_MS; 0 = sin límite), ver core.deadline.
+    rerank_mode: voyage (rerank-2) o local (coseno + MMR, sin red); por defecto RERANK_MODE."""
+    deadline = _deadline(deadline_ms)
+    filters = validate_filters(filters)
+    rerank_mode = _check_rerank_mode(rerank_mode)
+    with trace_request("sync") as trace:
+        return _search_rag(query, context_k, ann_k, trace, filters, deadline=deadline, rerank_mode=rerank_mode)
+
+def _search_rag(query: str, context_k: int, ann_k: int, trace: dict, filters: Optional[Dict], query_vector=None,
+                deadline: Optional[Deadline] = None, rerank_mode: Optional[str] = None):
+    logger.debug("Starting RAG search for query: '%s'", query)
+    logger.debug("Parameters: context_k=%s, ann_k=%s", context_k, ann_k)
+
+    total_start = time.time()
+    deadline = deadline or Deadline()
+
+    retrieval_start = time.time()
+    retrieval_stats = {}
+    q_vec, hit = _semantic_lookup(query, context_k, ann_k, filters, query_vector, deadline, rerank_mode)
+    if hit is not None:
+        return _cached_response(query, ann_k, hit, total_start, trace, deadline)
+    documents, before, after = rag_retriever.retrieve_documents(query, context_k, ann_k, query_vector=q_vec, stats=retrieval_stats,
+                                                                filters=filters, deadline=deadline, rerank_mode=rerank_mode)
+    retrieval_time = time.time() - retrieval_start
+
+    generation_start = time.time()
+    generation_stats = {}
+    final_answer = _generate(query, documents, generation_stats, deadline)
+    generation_time = time.time() - generation_start
+
+    total_time = time.time() - total_start
+    _semantic_store(query, q_vec, context_k, ann_k, documents, final_answer, before, after, filters, deadline,
+                    generation_stats, rerank_mode)
+
+    performance_metrics = _build_metrics(query, ann_k, documents, total_time, retrieval_time, generation_time)
+    performance_metrics["semantic_cache"] = _semantic_metrics(None)
+    performance_metrics.update(retrieval_stats)
+    performance_metrics.update(generation_stats)
+    performance_metrics["filters"] = filters
+    performance_metrics["deadline"] = deadline.report()
+    performance_metrics["trace"] = trace["spans"]
+
+    logger.info("Metrics: Total: %.3fs, Retrieval: %.3fs, Generation: %.3fs", total_time, retrieval_time, generation_time)
+    return final_answer, before, after, performance_metrics
+
+async def asearch_rag(query: str, context_k: int, ann_k: int, filters: Optional[Dict] = None, deadline_ms: Optional[int] = None,
+                      rerank_mode: Optional[str] = None):
+    deadline = _deadline(deadline_ms)
+    filters = validate_filters(filters)
+    rerank_mode = _check_rerank_mode(rerank_mode)
+    with trace_request("async") as trace:
+        return await _asearch_rag(query, context_k, ann_k, trace, filters, deadline=deadline, rerank_mode=rerank_mode)
+
+async def _asearch_rag(query: str, context_k: int, ann_k: int, trace: dict, filters: Optional[Dict], query_vector=None,
+                       deadline: Optional[Deadline] = None, rerank_mode: Optional[str] = None):
+    logger.debug("Starting async RAG search for query: '%s'", query)
+
+    total_start = time.time()
+    deadline = deadline or Deadline()
+
+    retrieval_start = time.time()
+    retrieval_stats = {}
+    q_vec, hit = query_vector, None
+    if semantic_cache is not None:
+        if q_vec is None:
+            q_vec = await rag_retriever.aembed_query(query, deadline)
+        if q_vec is not None:
+            hit = await asyncio.to_thread(semantic_cache.lookup, q_vec, context_k, ann_k, filters,
+                                          rerank_mode or rag_retriever.rerank_mode)
+    if hit is not None:
+        return _cached_response(query, ann_k, hit, total_start, trace, deadline)
+    documents, before, after = await rag_retriever.aretrieve_documents(query, context_k, ann_k, query_vector=q_vec, stats=retrieval_stats,
+                                                                       filters=filters, deadline=deadline, rerank_mode=rerank_mode)
+    retrieval_time = time.time() - retrieval_start
+
+    generation_start = time.time()
+    generation_stats = {}
+    final_answer = await _agenerate(query, documents, generation_stats, deadline)
+    generation_time = time.time() - generation_start
+
+    total_time = time.time() - total_start
+    _semantic_store(query, q_vec, context_k, ann_k, documents, final_answer, before, after, filters, deadline,
+                    generation_stats, rerank_mode)
+
+    performance_metrics = _build_metrics(query, ann_k, documents, total_time, retrieval_time, generation_time)
+    performance_metrics["semantic_cache"] = _semantic_metrics(None)
+    performance_metrics.update(retrieval_stats)
+    performance_metrics.update(generation_stats)
+    performance_metrics["filters"] = filters
+    performance_metrics["deadline"] = deadline.report()
+    performance_metrics["trace"] = trace["spans"]
+
+    logger.info("Metrics: Total: %.3fs, Retrieval: %.3fs, Generation: %.3fs", total_time, retrieval_time, generation_time)
+    return final_answer, before, after, performance_metrics
+
+def _batch_item(query: str, result) -> dict:
+    answer, before, after, performance_metrics = result
+    return {"query": query, "answer": answer, "before": before, "after": after, "performance_metrics": performance_metrics}
+
+def _batch_error(query: str, e: Exception) -> dict:
+    logger.error("Batch query failed: '%s': %s", query, e)
+    return {"query": query, "error": str(e)}
+
+def _batch_metrics(results: List[dict], embed_time: float, total_time: float, concurrency: int) -> dict:
+    latencies = [r["performance_metrics"]["total_time"] for r in results if "performance_metrics" in r]
+    return {
+        "queries": len(results),
+        "errors": len(results) - len(latencies),
+        "semantic_cache_hits": sum(1 for r in results if r.get("performance_metrics", {}).get("semantic_cache", {}).get("hit")),
+        "embed_time": embed_time,
+        "total_time": total_time,
+        "queries_per_second": len(results) / total_time if total_time > 0 else 0.0,
+        "latency_mean": statistics.fmean(latencies) if latencies else 0.0,
+        "latency_p50": statistics.median(latencies) if latencies else 0.0,
+        "latency_max": max(latencies, default=0.0),
+        "concurrency": concurrency
+    }
+
+def _check_batch(queries: List[str]):
+    if not queries:
+        raise ValueError("queries must be a non-empty list")
+    if len(queries) > BATCH_MAX_QUERIES:
+        raise ValueError(f"at most {BATCH_MAX_QUERIES} queries per batch")
+    if not all(isinstance(q, str) and q.strip() for q in queries):
+        raise ValueError("every query must be a non-empty string")
+
+def search_rag_batch(queries: List[str], context_k: int, ann_k: int, filters: Optional[Dict] = None,
+                     concurrency: int = BATCH_CONCURRENCY, deadline_ms: Optional[int] = None,
+                     rerank_mode: Optional[str] = None) -> dict:
+    """Muchas preguntas a la vez: un solo embed para todas; búsqueda, rerank y generación en un pool acotado
+    (las búsquedas comparten el pool de conexiones de MongoClient). Devuelve {"results": [...], "metrics": {...}}."""
+    _check_batch(queries)
+    filters = validate_filters(filters)
+    rerank_mode = _check_rerank_mode(rerank_mode)
+    batch_start = time.time()
+    vectors = rag_retriever.embedder.embed_texts(queries)
+    embed_time = time.time() - batch_start
+
+    def run(item):
+        query, q_vec = item
+        try:
+            with trace_request("batch") as trace:
+                # El deadline corre por pregunta, desde que entra al pool
+                return _batch_item(query, _search_rag(query, context_k, ann_k, trace, filters, q_vec, _deadline(deadline_ms), rerank_mode))
+        except Exception as e:
+            return _batch_error(query, e)
+
+    workers = max(1, min(concurrency, len(queries)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-batch") as pool:
+        results = list(pool.map(run, zip(queries, vectors)))
+
+    metrics = _batch_metrics(results, embed_time, time.time() - batch_start, workers)
+    logger.info("Metrics: Batch of %d in %.3fs (%.1f q/s, embed %.3fs)", len(queries), metrics["total_time"],
+                metrics["queries_per_second"], embed_time)
+    return {"results": results, "metrics": metrics}
+
+async def asearch_rag_batch(queries: List[str], context_k: int, ann_k: int, filters: Optional[Dict] = None,
+                            concurrency: int = BATCH_CONCURRENCY, deadline_ms: Optional[int] = None,
+                            rerank_mode: Optional[str] = None) -> dict:
+    _check_batch(queries)
+    filters = validate_filters(filters)
+    rerank_mode = _check_rerank_mode(rerank_mode)
+    batch_start = time.time()
+    vectors = await rag_retriever.embedder.aembed_texts(queries)
+    embed_time = time.time() - batch_start
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(query: str, q_vec):
+        async with semaphore:
+            try:
+                with trace_request("batch") as trace:
+                    return _batch_item(query, await _asearch_rag(query, context_k, ann_k, trace, filters, q_vec, _deadline(deadline_ms), rerank_mode))
+            except Exception as e:
+                return _batch_error(query, e)
+
+    results = await asyncio.gather(*(run(query, q_vec) for query, q_vec in zip(queries, vectors)))
+
+    metrics = _batch_metrics(list(results), embed_time, time.time() - batch_start, max(1, concurrency))
+    logger.info("Metrics: Batch of %d in %.3fs (%.1f q/s, embed %.3fs)", len(queries), metrics["total_time"],
+                metrics["queries_per_second"], embed_time)
+    return {"results": list(results), "metrics": metrics}
+
+def search_rag_stream(query: str, context_k: int, ann_k: int, filters: Optional[Dict] = None, deadline_ms: Optional[int] = None,
+                      rerank_mode: Optional[str] = None):
+    """Genera eventos (nombre, payload): 'retrieval', luego 'token' por cada fragmento y al final 'metrics'."""
+    filters = validate_filters(filters)
+    rerank_mode = _check_rerank_mode(rerank_mode)
+    with trace_request("stream") as trace:
+        # El deadline arranca con el primer next(), cuando empieza el trabajo
+        yield from _search_rag_stream(query, context_k, ann_k, trace, filters, _deadline(deadline_ms), rerank_mode)
+
+def _search_rag_stream(query: str, context_k: int, ann_k: int, trace: dict, filters: Optional[Dict], deadline: Deadline,
+                       rerank_mode: Optional[str] = None):
+    logger.debug("Starting streaming RAG search for query: '%s'", query)
+
+    total_start = time.time()
+
+    retrieval_start = time.time()
+    retrieval_stats = {}
+    q_vec, hit = _semantic_lookup(query, context_k, ann_k, filters, deadline=deadline, rerank_mode=rerank_mode)
+    if hit is not None:
+        final_answer, before, after, performance_metrics = _cached_response(query, ann_k, hit, total_start, trace, deadline)
+        yield "retrieval", {"before": before, "after": after, "retrieval_time": performance_metrics["retrieval_time"]}
+        performance_metrics["time_to_first_token"] = time.time() - total_start
+        yield "token", final_answer
+        performance_metrics["answer_length"] = len(final_answer)
+        yield "metrics", performance_metrics
+        return
+    documents, before, after = rag_retriever.retrieve_documents(query, context_k, ann_k, query_vector=q_vec, stats=retrieval_stats,
+                                                                filters=filters, deadline=deadline, rerank_mode=rerank_mode)
+    retrieval_time = time.time() - retrieval_start
+    yield "retrieval", {"before": before, "after": after, "retrieval_time": retrieval_time}
+
+    generation_start = time.time()
+    time_to_first_token = None
+    answer_parts = []
+    generation_stats = {}
+    documents = _fit_context(documents, deadline)
+    if deadline.can_run("generate"):
+        # Un LLM que no manda el primer token no puede colgar el stream: esa espera también lleva presupuesto
+        try:
+            tokens = deadline.first("generate", rag_generator.stream_answer(
+                query, documents, stats=generation_stats, timeout=deadline.budget("generate")
+            ))
+        except DeadlineExceeded:
+            deadline.degrade("retrieval_only", "generate", reason="timeout")
+            tokens = iter([_retrieval_only_answer(documents)])
+    else:
+        deadline.degrade("retrieval_only", "generate", reason="no budget")
+        tokens = iter([_retrieval_only_answer(documents)])
+    for token in tokens:
+        if time_to_first_token is None:
+            time_to_first_token = time.time() - total_start
+        answer_parts.append(token)
+        yield "token", token
+        if deadline.enabled and deadline.remaining() <= 0:
+            # El streaming no se puede interrumpir a mitad de token: se corta en el siguiente
+            deadline.degrade("truncate_answer", "generate", answer_chars=sum(map(len, answer_parts)))
+            break
+    generation_time = time.time() - generation_start
+    final_answer = "".join(answer_parts)
+    answer_length = len(final_answer)
+
+    total_time = time.time() - total_start
+    _semantic_store(query, q_vec, context_k, ann_k, documents, final_answer, before, after, filters, deadline,
+                    generation_stats, rerank_mode)
+
+    performance_metrics = _build_metrics(query, ann_k, documents, total_time, retrieval_time, generation_time)
+    performance_metrics["semantic_cache"] = _semantic_metrics(None)
+    performance_metrics.update(retrieval_stats)
+    performance_metrics.update(generation_stats)
+    performance_metrics["filters"] = filters
+    performance_metrics["deadline"] = deadline.report()
+    performance_metrics["trace"] = trace["spans"]
+    performance_metrics["time_to_first_token"] = time_to_first_token if time_to_first_token is not None else total_time
+    performance_metrics["answer_length"] = answer_length
+
+    logger.info("Metrics: Total: %.3fs, TTFT: %.3fs, Retrieval: %.3fs, Generation: %.3fs", total_time, performance_metrics['time_to_first_token'], retrieval_time, generation_time)
+    yield "metrics", performance_metrics
@@ -0,0 +1,65 @@
+import random
+import pytest
+from ingest.chunker import StreamingChunker
+
+text_splitters = pytest.importorskip("langchain_text_splitters")
+
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta", "iota", "kappa", "lambda"]
+
+
+def make_text(seed: int, paragraphs: int = 12) -> str:
+    # Párrafos, líneas y palabras de largo variable: ejercita todos los separadores
+    rng = random.Random(seed)
+    out = []
+    for _ in range(paragraphs):
+        lines = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 40))) for _ in range(rng.randint(1, 4))]
+        out.append("\n".join(lines))
+    # Una "palabra" más larga que chunk_size obliga a cortar por caracteres
+    out.append("x" * 300)
+    return "\n\n".join(out)
+
+
+def reference(chunk_size: int, chunk_overlap: int):
+    return text_splitters.RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(120, 20), (200, 0), (64, 32)])
+def test_split_text_matches_langchain(seed, chunk_size, chunk_overlap):
+    text = make_text(seed)
+    chunker = StreamingChunker(chunk_size, chunk_overlap, length_function=len)
+    assert chunker.split_text(text) == reference(chunk_size, chunk_overlap).split_text(text)
+
+
+@pytest.mark.parametrize("joiner", ["\n\n", " "])
+def test_stream_carries_last_chunk_into_next_part(joiner):
+    parts = [make_text(seed, paragraphs=4) for seed in range(4)]
+    splitter = reference(120, 20)
+
+    # El último chunk de cada parte se vuelve a partir junto con la siguiente
+    expected, carry = [], ""
+    for part in parts:
+        chunks = splitter.split_text(f"{carry}{joiner}{part}" if carry else part)
+        expected.extend(chunks[:-1])
+        carry = chunks[-1]
+    expected.append(carry)
+
+    chunker = StreamingChunker(120, 20, length_function=len)
+    assert list(chunker.stream(iter(parts), joiner=joiner)) == expected
+
+
+def test_stream_single_part_is_split_text():
+    text = make_text(7)
+    chunker = StreamingChunker(120, 20, length_function=len)
+    assert list(chunker.stream([text])) == chunker.split_text(text)
+
+
+def test_stream_skips_empty_parts():
+    chunker = StreamingChunker(120, 20, length_function=len)
+    assert list(chunker.stream(["", "short text", ""])) == ["short text"]
+    assert list(chunker.stream([])) == []
+
+
+def test_overlap_larger_than_size_is_rejected():
+    with pytest.raises(ValueError):
+        StreamingChunker(10, 20)
@@ -0,0 +1,94 @@
+import pytest
+import core.embeddings.cache as cache_module
+from core.embeddings.cache import DiskEmbeddingStore, EmbeddingCache
+
+MODEL = "voyage-3.5-lite"
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Reloj controlado: el TTL se comprueba sin esperar
+    fake = FakeClock()
+    monkeypatch.setattr(cache_module, "time", fake)
+    return fake
+
+
+def test_memory_lru_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2, ttl=None)
+    cache.put("a", MODEL, [1.0])
+    cache.put("b", MODEL, [2.0])
+    assert cache.get("a", MODEL) == [1.0]  # "a" pasa a ser la más reciente
+    cache.put("c", MODEL, [3.0])
+
+    assert cache.get("b", MODEL) is None
+    assert cache.get("a", MODEL) == [1.0]
+    assert cache.get("c", MODEL) == [3.0]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_memory_entries_expire_after_ttl(clock):
+    cache = EmbeddingCache(max_entries=10, ttl=60)
+    cache.put("question", MODEL, [0.5])
+    clock.now += 60
+    assert cache.get("question", MODEL) == [0.5]
+    clock.now += 1
+    assert cache.get("question", MODEL) is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["entries"] == 0
+
+
+def test_keys_are_normalized_and_namespaced_by_model():
+    cache = EmbeddingCache(max_entries=10, ttl=None)
+    cache.put("How do I  reset\nmy password?", MODEL, [1.0])
+    assert cache.get("how do i reset my password?", MODEL) == [1.0]
+    assert cache.get("how do i reset my password?", "voyage-3-large") is None
+
+
+def test_disk_tier_keeps_original_ttl(tmp_path, clock):
+    cache = EmbeddingCache(max_entries=10, ttl=60, disk_path=str(tmp_path / "emb.sqlite"))
+    cache.put("question", MODEL, [0.25, -0.5])
+    cache.clear()
+    clock.now += 30
+    # Sube desde disco sin renovar el momento en que se guardó
+    assert cache.get("question", MODEL) == [0.25, -0.5]
+    assert cache.stats()["disk_hits"] == 1
+    clock.now += 31
+    assert cache.get("question", MODEL) is None
+    cache.disk.close()
+
+
+def test_disk_store_prunes_least_recently_accessed(tmp_path, clock):
+    store = DiskEmbeddingStore(str(tmp_path / "emb.sqlite"), max_entries=2)
+    store.put("a", [1.0], MODEL)
+    clock.now += 1
+    store.put("b", [2.0], MODEL)
+    clock.now += 1
+    assert store.get("a") == [1.0]  # el acceso se guarda con la próxima escritura
+    clock.now += 1
+    store.put("c", [3.0], MODEL)
+
+    assert store.get("b") is None
+    assert store.get("a") == [1.0]
+    assert store.get("c") == [3.0]
+    assert store.evictions == 1
+    store.close()
+
+
+def test_disk_store_drops_expired_entries(tmp_path, clock):
+    store = DiskEmbeddingStore(str(tmp_path / "emb.sqlite"), ttl=60)
+    store.put("old", [1.0], MODEL)
+    clock.now += 61
+    assert store.get("old") is None
+    store.put("new", [2.0], MODEL)
+    assert len(store) == 1
+    assert store.evictions == 1
+    store.close()
@@ -0,0 +1,39 @@
+import pytest
+from core.search.fusion import reciprocal_rank_fusion
+
+
+def results(*ids, base: float = 1.0):
+    return [{"_id": _id, "text": f"chunk {_id}", "score": base - i * 0.1} for i, _id in enumerate(ids)]
+
+
+def test_documents_in_both_lists_rank_first():
+    fused = reciprocal_rank_fusion({"vector": results("a", "b", "c"), "text": results("c", "d", "b")}, k=60)
+    assert [r["_id"] for r in fused] == ["c", "b", "a", "d"]
+    assert fused[0]["score"] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_per_list_scores_and_ranks_are_kept():
+    fused = {r["_id"]: r for r in reciprocal_rank_fusion({"vector": results("a", "b"), "text": results("b", base=12.0)})}
+    assert fused["b"]["vector_rank"] == 2 and fused["b"]["text_rank"] == 1
+    assert fused["b"]["vector_score"] == pytest.approx(0.9) and fused["b"]["text_score"] == 12.0
+    assert "text_rank" not in fused["a"]
+    assert fused["a"]["text"] == "chunk a"
+
+
+def test_ties_keep_vector_order():
+    # Mismos rangos en listas distintas: empate, gana el que apareció primero (la lista vectorial)
+    fused = reciprocal_rank_fusion({"vector": results("a"), "text": results("b")})
+    assert [r["_id"] for r in fused] == ["a", "b"]
+
+
+def test_weights_change_the_order_and_zero_drops_a_list():
+    ranked = {"vector": results("a", "b"), "text": results("b", "a")}
+    assert [r["_id"] for r in reciprocal_rank_fusion(ranked, weights={"text": 2.0})] == ["b", "a"]
+    fused = reciprocal_rank_fusion(ranked, weights={"text": 0})
+    assert [r["_id"] for r in fused] == ["a", "b"]
+    assert "text_rank" not in fused[0]
+
+
+def test_limit_truncates_after_fusion():
+    fused = reciprocal_rank_fusion({"vector": results("a", "b", "c"), "text": results("c")}, limit=2)
+    assert [r["_id"] for r in fused] == ["c", "a"]
@@ -0,0 +1,56 @@
+from core.embeddings.cache import pack_vector, unpack_vector
+from ingest.embed_cache import IngestEmbeddingCache
+
+MODEL = "voyage-3.5-lite"
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        # Falla (None) para los textos marcados: no se deben guardar
+        return [None if text.startswith("fail") else [float(len(text)), 0.5] for text in texts]
+
+
+def test_pack_vector_round_trips_float32():
+    assert unpack_vector(pack_vector([0.25, -1.5, 3.0])) == [0.25, -1.5, 3.0]
+
+
+def test_repeated_texts_are_embedded_once(tmp_path):
+    cache = IngestEmbeddingCache(str(tmp_path / "ingest.sqlite"), MODEL)
+    embed = FakeEmbedder()
+
+    assert cache.embed(["footer", "body", "footer"], embed) == [[6.0, 0.5], [4.0, 0.5], [6.0, 0.5]]
+    assert embed.calls == [["footer", "body"]]
+
+    # Segunda ingesta: todo sale de disco
+    assert cache.embed(["body", "footer"], embed) == [[4.0, 0.5], [6.0, 0.5]]
+    assert len(embed.calls) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["duplicates"]) == (2, 2, 1)
+    cache.store.close()
+
+
+def test_failed_embeddings_are_not_cached(tmp_path):
+    cache = IngestEmbeddingCache(str(tmp_path / "ingest.sqlite"), MODEL)
+    embed = FakeEmbedder()
+    assert cache.embed(["fail once"], embed) == [None]
+    cache.embed(["fail once"], embed)
+    assert len(embed.calls) == 2
+    assert len(cache.store) == 0
+    cache.store.close()
+
+
+def test_entries_are_namespaced_by_model(tmp_path):
+    path = str(tmp_path / "ingest.sqlite")
+    first = IngestEmbeddingCache(path, MODEL)
+    first.embed(["same text"], FakeEmbedder())
+    first.store.close()
+
+    other = IngestEmbeddingCache(path, "voyage-3-large")
+    embed = FakeEmbedder()
+    other.embed(["same text"], embed)
+    assert embed.calls == [["same text"]]
+    other.store.close()
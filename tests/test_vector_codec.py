@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from bson import BSON
+from core.embeddings.vector_codec import (
+    VECTOR_STORAGES,
+    decode_vector,
+    decode_vector_array,
+    encode_query_vector,
+    encode_vector,
+    quantize_int8,
+    vector_storage_of
+)
+
+VECTOR = [0.125, -0.5, 0.0, 0.875, -1.0, 0.3333333, 1e-3]
+
+
+def cosine(a, b) -> float:
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+@pytest.mark.parametrize("storage", VECTOR_STORAGES)
+def test_storage_is_detected_after_bson_round_trip(storage):
+    # Lo que se guarda pasa por BSON: el tipo debe reconocerse al leerlo de MongoDB
+    stored = BSON.encode({"embedding": encode_vector(VECTOR, storage)}).decode()["embedding"]
+    assert vector_storage_of(stored) == storage
+    assert len(decode_vector(stored)) == len(VECTOR)
+    np.testing.assert_array_equal(decode_vector_array(stored), np.asarray(decode_vector(stored), dtype=np.float32))
+
+
+def test_array_round_trip_is_exact():
+    assert decode_vector(encode_vector(VECTOR, "array")) == VECTOR
+
+
+def test_float32_round_trip_matches_float32_precision():
+    decoded = decode_vector(encode_vector(VECTOR, "float32"))
+    np.testing.assert_array_equal(np.asarray(decoded, dtype=np.float32), np.asarray(VECTOR, dtype=np.float32))
+
+
+def test_int8_round_trip_keeps_cosine():
+    rng = np.random.default_rng(0)
+    vector = rng.normal(size=1024).tolist()
+    decoded = decode_vector(encode_vector(vector, "int8"))
+    assert max(abs(v) for v in decoded) == 127
+    assert cosine(vector, decoded) > 0.999
+
+
+def test_quantize_int8_handles_zero_vector():
+    assert quantize_int8([0.0, 0.0]) == [0, 0]
+    assert quantize_int8([]) == []
+
+
+def test_query_vector_matches_stored_type():
+    assert encode_query_vector(VECTOR, "array") == VECTOR
+    assert encode_query_vector(VECTOR, "float32") == VECTOR
+    assert vector_storage_of(encode_query_vector(VECTOR, "int8")) == "int8"
+
+
+def test_unknown_storage_is_rejected():
+    with pytest.raises(ValueError):
+        encode_vector(VECTOR, "float16")